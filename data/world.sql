@@ -0,0 +1,17 @@
+-- the part of the MySQL 'world' sample database the tests query, for --db_backend sqlite
+CREATE TABLE city (
+  ID INTEGER PRIMARY KEY,
+  Name TEXT NOT NULL,
+  CountryCode TEXT NOT NULL,
+  District TEXT NOT NULL,
+  Population INTEGER NOT NULL
+);
+CREATE INDEX city_country_code ON city (CountryCode);
+INSERT INTO city VALUES
+  (3315, 'København', 'DNK', 'København', 495699),
+  (3316, 'Århus', 'DNK', 'Århus', 284846),
+  (3317, 'Odense', 'DNK', 'Fyn', 183912),
+  (3318, 'Aalborg', 'DNK', 'Nordjylland', 161161),
+  (3319, 'Frederiksberg', 'DNK', 'Frederiksberg', 90327),
+  (3048, 'Stockholm', 'SWE', 'Stockholms län', 750348),
+  (2331, 'Oslo', 'NOR', 'Oslo', 508726);
@@ -12,8 +12,8 @@ class AboutPage(BasePage):
     LOGIN_LINK: Tuple[str, str] = (By.CSS_SELECTOR, "a[href='https://login.codility.com']")
     FOR_CANDIDATES_LINK: Tuple[str, str] = (By.CSS_SELECTOR, "a[href='https://app.codility.com/programmers']")
 
-    def __init__(self, driver, wait):
-        super().__init__(driver, wait)
+    def __init__(self, driver, wait, wait_engine=None, cache_elements=False):
+        super().__init__(driver, wait, wait_engine, cache_elements)
 
     @allure.step("Click Login link")
     def click_login_link(self) -> None:
@@ -1,22 +1,39 @@
-from typing import Tuple, Union
+from typing import Optional, Tuple, Union
 
 from deprecated import deprecated
 from selenium.common.exceptions import NoSuchElementException
 from selenium.webdriver import ActionChains, Chrome, Edge, Firefox
 from selenium.webdriver.remote.webelement import WebElement
-from selenium.webdriver.support import expected_conditions
 from selenium.webdriver.support.expected_conditions import (
     StaleElementReferenceException,
 )
 from selenium.webdriver.support.wait import WebDriverWait
 
+from utilities.element_cache import ElementCache
+from utilities.page_batch import PageBatch
+from utilities.wait_engine import PollingWaitEngine, Target
 
-class BasePage:
-    """Wrapper for selenium operations."""
 
-    def __init__(self, driver: Union[Chrome, Firefox, Edge], wait: WebDriverWait):
+class BasePage:
+    """Wrapper for selenium operations.
+
+    Waits for elements go through the wait engine, polling with 'wait' unless another
+    engine (e.g. the in-page ObserverWaitEngine) is given. With 'cache_elements' the
+    elements found by locator are kept: clicks, clears and reads of a cached element are
+    checked and run inside the page in a single round trip instead of finding it again.
+    """
+
+    def __init__(
+        self,
+        driver: Union[Chrome, Firefox, Edge],
+        wait: WebDriverWait,
+        wait_engine: Optional[PollingWaitEngine] = None,
+        cache_elements: bool = False,
+    ):
         self.driver = driver
         self.wait = wait
+        self.wait_engine = wait_engine or PollingWaitEngine(wait)
+        self.element_cache = ElementCache(driver) if cache_elements else None
 
     def edit_cookie(self, cookie_key: str, cookie_value: str):
         cookie = self.wait.until(
@@ -57,24 +74,28 @@ class BasePage:
         )
 
     def click(self, locator: Tuple[str, str]) -> None:
-        el: WebElement = self.wait.until(
-            expected_conditions.element_to_be_clickable(locator)
-        )
+        if self.element_cache is not None:
+            self._run_cached(locator, "clickable", "click")
+            return
+        el: WebElement = self._wait_for(locator, "clickable")
         self._highlight_element(el, "green")
         el.click()
 
     def fill_text(self, locator: Tuple[str, str], txt: str) -> None:
-        el: WebElement = self.wait.until(
-            expected_conditions.element_to_be_clickable(locator)
-        )
+        if self.element_cache is not None:
+            el, _ = self._run_cached(locator, "clickable", "clear")
+            el.send_keys(txt)
+            return
+        el: WebElement = self._wait_for(locator, "clickable")
         el.clear()
         self._highlight_element(el, "green")
         el.send_keys(txt)
 
     def clear_text(self, locator: Tuple[str, str]) -> None:
-        el: WebElement = self.wait.until(
-            expected_conditions.element_to_be_clickable(locator)
-        )
+        if self.element_cache is not None:
+            self._run_cached(locator, "clickable", "clear")
+            return
+        el: WebElement = self._wait_for(locator, "clickable")
         el.clear()
 
     def scroll_to_bottom(self) -> None:
@@ -85,15 +106,15 @@ class BasePage:
         webelement.submit()
 
     def get_text(self, locator: Tuple[str, str]) -> str:
-        el: WebElement = self.wait.until(
-            expected_conditions.visibility_of_element_located(locator)
-        )
+        if self.element_cache is not None:
+            return self._run_cached(locator, "visible", "text")[1]
+        el: WebElement = self._wait_for(locator, "visible")
         self._highlight_element(el, "green")
         return el.text
 
     def move_to_element(self, webelement: WebElement) -> None:
         action = ActionChains(self.driver)
-        self.wait.until(expected_conditions.visibility_of(webelement))
+        self._wait_for(webelement, "visible")
         action.move_to_element(webelement).perform()
 
     def is_elem_displayed(self, webelement: WebElement) -> bool:
@@ -104,6 +125,25 @@ class BasePage:
         except NoSuchElementException:
             return False
 
+    def batch(self) -> PageBatch:
+        """Start a sequence of fills, clicks, waits and reads run in as few round trips
+        as possible."""
+        return PageBatch(self, timeout=self.wait_engine.timeout)
+
+    def _wait_for(self, target: Target, condition: str) -> WebElement:
+        """Wait until the element of the locator (or the element itself) is 'present',
+        'visible' or 'clickable' and return it."""
+        return self.wait_engine.until(target, condition)
+
+    def _run_cached(
+        self, locator: Tuple[str, str], condition: str, action: str
+    ) -> Tuple[WebElement, Optional[str]]:
+        """Run the action on the cached element of the locator, waiting for it when
+        none is cached or the cached one changed."""
+        return self.element_cache.run(
+            locator, condition, action, lambda: self._wait_for(locator, condition)
+        )
+
     @deprecated(reason="You should use another function")
     def _highlight_element(self, webelement: WebElement, color: str) -> None:
         original_style = webelement.get_attribute("style")
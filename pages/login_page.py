@@ -21,15 +21,21 @@ class LoginPage(BasePage):
     )
     NEED_HELP_LINK: Tuple[str, str] = (By.CSS_SELECTOR,"a[href='https://support.codility.com/hc/en-us/articles/4403106904599']")
     LOGIN_ARTICLE_LINK: Tuple[str, str] = (By.CSS_SELECTOR,"a[href='https://support.codility.com/hc/en-us/articles/4413298311191-Can-t-log-in-See-what-might-be-the-reason']")
-    def __init__(self, driver, wait):
-        super().__init__(driver, wait)
+    def __init__(self, driver, wait, wait_engine=None, cache_elements=False):
+        super().__init__(driver, wait, wait_engine, cache_elements)
 
     @allure.step("Log in with username: {username} and password: {password}")
     def login(self, username: str, password: str) -> None:
-        self.fill_text(self.COMPANY_EMAIL_FIELD, username)
-        self.click(self.CONTINUE_BUTTON)
-        self.fill_text(self.PASSWORD_FIELD, password)
-        self.click(self.LOGIN_BUTTON)
+        (
+            # credentials are typed with key strokes, like a user does: every field ends a
+            # round trip, the continue click runs with the wait for the password field
+            self.batch()
+            .type_text(self.COMPANY_EMAIL_FIELD, username)
+            .click(self.CONTINUE_BUTTON)
+            .type_text(self.PASSWORD_FIELD, password)
+            .click(self.LOGIN_BUTTON, navigates=True)
+            .run()
+        )
 
     @allure.step("Get error message")
     def get_error_message(self) -> str:
@@ -0,0 +1,40 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import allure
+import pytest
+from assertpy import assert_that
+
+from utilities.baseline_store import _lock
+
+
+def finished_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+@allure.feature("Visual")
+@pytest.mark.no_browser
+class TestBaselineStoreLock:
+    @allure.title("A lock left by a process that is gone is taken over at once")
+    def test_lock_of_finished_process(self, tmp_path):
+        path = tmp_path / "index.json.lock"
+        path.write_text(f"{socket.gethostname()}:{finished_pid()}")
+        started = time.monotonic()
+        with _lock(path, timeout=5):
+            assert_that(path.read_text()).ends_with(f":{os.getpid()}")
+        assert_that(time.monotonic() - started).is_less_than(1)
+        assert_that(path.exists()).is_false()
+
+    @allure.title("A lock of a running process is not taken over")
+    def test_lock_of_running_process(self, tmp_path):
+        path = tmp_path / "index.json.lock"
+        path.write_text(f"{socket.gethostname()}:{os.getppid()}")
+        with pytest.raises(TimeoutError):
+            with _lock(path, timeout=0.2):
+                pass
+        assert_that(path.exists()).is_true()
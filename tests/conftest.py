@@ -1,30 +1,89 @@
-import base64
+import hashlib
 import json
 import logging
 import os
-from collections import defaultdict
-from contextlib import suppress
+import tempfile
+import time
+from collections import Counter, defaultdict
+from dataclasses import asdict, replace
+from pathlib import Path
+from typing import Callable, Iterator, Optional
 
 import allure
 import pytest
-import requests
+from _pytest.config import Config
 from _pytest.config.argparsing import Parser
-from _pytest.fixtures import fixture
+from _pytest.fixtures import FixtureRequest, fixture
 from _pytest.nodes import Item
+from _pytest.stash import StashKey
 from dotenv import load_dotenv
-from mysql.connector import MySQLConnection
-from requests_toolbelt.utils import dump
 from selenium import webdriver
 from selenium.webdriver.support.event_firing_webdriver import EventFiringWebDriver
 from selenium.webdriver.support.wait import WebDriverWait
 from pages.about_page import AboutPage
 from pages.login_page import LoginPage
+from utilities.attachment_writer import AttachmentWriter
+from utilities.baseline_store import BaselineStore
+from utilities.bidi_capture import BidiEventCapture
+from utilities.command_profiler import (
+    CommandProfiler,
+    CommandProfileSummary,
+    CommandRecord,
+    aggregate,
+    format_table,
+    profile_property,
+)
 from utilities.constants import Constants
 from utilities.data import Data
-from utilities.excel_parser import ExcelParser
+from utilities.data_registry import DataRegistry
+from utilities.data_source import DATA_SOURCE_MARKER, DataSource, parse_shard
+from utilities.db_client import (
+    DB_BACKENDS,
+    DatabaseClient,
+    DatabaseConfig,
+    QueryMetrics,
+)
+from utilities.driver_context import DriverContext
+from utilities.driver_pool import DriverPool
+from utilities.durations_store import DurationsRecorder, DurationsStore
+from utilities.failure_artifacts import Artifact, FailureArtifactCollector
+from utilities.http_client import EndpointMetrics, HttpClient
+from utilities.http_logging import HttpLogBuffer
+from utilities.http_stub import StubServer
+from utilities.network_log_writer import (
+    NetworkLogWriter,
+    entries_from_events,
+    entries_from_performance_log,
+)
+from utilities.screenshot_engine import Screenshot, ScreenshotEngine
+from utilities.visual_backends import (
+    VISUAL_BACKENDS,
+    VisualBackend,
+    create_visual_backend,
+)
+from utilities.vrt_helper import VrtHelper
+from utilities.wait_engine import WAIT_ENGINES, create_wait_engine
 from utilities.web_driver_listener import DriverEventListener
 
 drivers = ("chrome", "firefox", "chrome_headless", "remote")
+WAIT_TIMEOUT = 10
+durations_store_key = StashKey[DurationsStore]()
+failure_artifact_collector_key = StashKey[FailureArtifactCollector]()
+screenshot_engine_key = StashKey[ScreenshotEngine]()
+attachment_writer_key = StashKey[AttachmentWriter]()
+http_log_key = StashKey[HttpLogBuffer]()
+http_metrics_key = StashKey[dict[str, EndpointMetrics]]()
+command_profiler_key = StashKey[Optional[CommandProfiler]]()
+data_registry_key = StashKey[DataRegistry]()
+db_metrics_key = StashKey[QueryMetrics]()
+# hits and misses of the element caches of the page objects
+element_cache_stats_key = StashKey[Counter]()
+network_logs_directory_key = StashKey[tempfile.TemporaryDirectory]()
+screenshot_attachment_types = {
+    "png": (allure.attachment_type.PNG, None),
+    "jpeg": (allure.attachment_type.JPG, None),
+    "webp": ("image/webp", "webp"),
+}
 
 
 def pytest_addoption(parser: Parser) -> None:
@@ -42,84 +101,507 @@ def pytest_addoption(parser: Parser) -> None:
         default=False,
         help="should we decorate the driver",
     )
+    parser.addoption(
+        "--profile_commands",
+        action="store_true",
+        default=False,
+        help="record every WebDriver and CDP command with its latency and caller",
+    )
+    parser.addoption(
+        "--wait_engine",
+        action="store",
+        choices=WAIT_ENGINES,
+        default="polling",
+        help="wait for elements by polling the driver, or with a single in-page observer",
+    )
+    parser.addoption(
+        "--cache_elements",
+        action="store_true",
+        default=False,
+        help="keep the elements page objects found by locator until they change",
+    )
+    parser.addoption(
+        "--visual_backend",
+        action="store",
+        choices=VISUAL_BACKENDS,
+        default="local",
+        help="compare visual captures with local baselines or on a VRT server",
+    )
+    parser.addoption(
+        "--visual_baselines",
+        action="store",
+        default=Constants.BASELINES_PATH,
+        help="directory of the baselines of the local visual backend",
+    )
+    parser.addoption(
+        "--update_baselines",
+        action="store_true",
+        default=False,
+        help="make every visual capture the baseline instead of comparing it",
+    )
+    parser.addoption(
+        "--approve_baselines",
+        action="store_true",
+        default=False,
+        help="approve the pending captures of the local baselines before the run",
+    )
+    parser.addoption(
+        "--driver_pool_size",
+        action="store",
+        type=int,
+        default=1,
+        help="number of warm browsers kept per worker, 0 launches a new browser per test",
+    )
+    parser.addoption(
+        "--driver_max_uses",
+        action="store",
+        type=int,
+        default=25,
+        help="number of tests a pooled browser serves before it is recycled",
+    )
+    parser.addoption(
+        "--durations_store",
+        action="store",
+        default=Constants.DURATIONS_STORE_PATH,
+        help="file the per phase test durations are recorded in and scheduled from",
+    )
+    parser.addoption(
+        "--network_capture",
+        action="store",
+        choices=("bidi", "performance_log"),
+        default="bidi",
+        help="stream network and console events over BiDi or read the chrome logs on failure",
+    )
+    parser.addoption(
+        "--network_url_filter",
+        action="store",
+        default=None,
+        help="regular expression of the request URLs captured with their bodies",
+    )
+    parser.addoption(
+        "--network_body_types",
+        action="store",
+        default="json,text,xml,javascript",
+        help="comma separated MIME type parts response bodies are fetched for, empty for all",
+    )
+    parser.addoption(
+        "--network_body_max_size",
+        action="store",
+        type=int,
+        default=64 * 1024,
+        help="bytes of a request or response body kept in the network logs",
+    )
+    parser.addoption(
+        "--screenshot_format",
+        action="store",
+        choices=tuple(screenshot_attachment_types),
+        default="png",
+        help="image format of the failure screenshots",
+    )
+    parser.addoption(
+        "--screenshot_quality",
+        action="store",
+        type=int,
+        default=80,
+        help="jpeg and webp quality of the failure screenshots",
+    )
+    parser.addoption(
+        "--screenshot_scale",
+        action="store",
+        type=float,
+        default=1.0,
+        help="downscale factor of the failure screenshots, 0.5 halves width and height",
+    )
+    parser.addoption(
+        "--http_log_sample_rate",
+        action="store",
+        type=float,
+        default=0.0,
+        help="share (0-1) of the session_request responses dumped also when the test passes",
+    )
+    parser.addoption(
+        "--http_log_body_limit",
+        action="store",
+        type=int,
+        default=16 * 1024,
+        help="characters of a request or response body kept in the HTTP dumps",
+    )
+    parser.addoption(
+        "--attachments_gzip_threshold",
+        action="store",
+        type=int,
+        default=0,
+        help="kilobytes above which text attachments are stored gzipped, 0 never gzips",
+    )
+    parser.addoption(
+        "--attachments_size_budget",
+        action="store",
+        type=int,
+        default=1024,
+        help="megabytes the allure attachments of a worker may take",
+    )
+    parser.addoption(
+        "--artifacts_budget",
+        action="store",
+        type=float,
+        default=20,
+        help="seconds the failure artifacts of a single test may take to collect",
+    )
+    parser.addoption(
+        "--artifacts_session_budget",
+        action="store",
+        type=float,
+        default=300,
+        help="seconds failure artifacts may take per worker before only screenshots are collected",
+    )
+    parser.addoption(
+        "--data_sample",
+        action="store",
+        type=float,
+        default=None,
+        help="share (0-1) of the rows of the data_source marked tests to collect, by row hash",
+    )
+    parser.addoption(
+        "--data_shard",
+        action="store",
+        default=None,
+        help="index/count (e.g. 2/4) of the rows of the data_source marked tests this run "
+        "collects, by row hash",
+    )
+    parser.addoption(
+        "--db_backend",
+        action="store",
+        choices=DB_BACKENDS,
+        default=None,
+        help="database of the db tests, DB_BACKEND by default; sqlite is seeded from data/world.sql",
+    )
+    parser.addoption(
+        "--db_pool_size",
+        action="store",
+        type=int,
+        default=2,
+        help="database connections a worker keeps open",
+    )
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_configure(config: Config) -> None:
+    """Loads the recorded test durations and leaves cleaning of the allure results
+    directory to the xdist controller.
+
+    Every worker process configures allure on its own, so without this a worker
+    starting late would wipe the results already written by the others. Durations are
+    recorded by the controller only, which receives the reports of all workers.
+    """
+    config.stash[durations_store_key] = DurationsStore(
+        Path(config.getoption("durations_store"))
+    )
+    config.stash[screenshot_engine_key] = ScreenshotEngine(
+        image_format=config.getoption("screenshot_format"),
+        quality=config.getoption("screenshot_quality"),
+        scale=config.getoption("screenshot_scale"),
+    )
+    report_directory = config.getoption("allure_report_dir", None)
+    config.stash[attachment_writer_key] = AttachmentWriter(
+        config.pluginmanager,
+        Path(report_directory) if report_directory else None,
+        gzip_threshold=config.getoption("attachments_gzip_threshold") * 1024,
+        size_budget=config.getoption("attachments_size_budget") * 1024**2,
+    )
+    config.stash[http_log_key] = HttpLogBuffer(
+        on_sample=lambda record, text: config.stash[attachment_writer_key].attach(
+            text,
+            name=f"HTTP logs of {record.url}",
+            attachment_type=allure.attachment_type.TEXT,
+        ),
+        sample_rate=config.getoption("http_log_sample_rate"),
+        max_body_size=config.getoption("http_log_body_limit"),
+    )
+    config.stash[failure_artifact_collector_key] = FailureArtifactCollector(
+        budget=config.getoption("artifacts_budget"),
+        session_budget=config.getoption("artifacts_session_budget"),
+    )
+    config.stash[data_registry_key] = DataRegistry()
+    profile_commands = config.getoption("profile_commands")
+    config.stash[command_profiler_key] = CommandProfiler() if profile_commands else None
+    if hasattr(config, "workerinput"):
+        config.option.clean_alluredir = False
+        return
+    if profile_commands:
+        config.pluginmanager.register(
+            CommandProfileSummary(), "command_profile_summary"
+        )
+    durations_path = Path(config.option.durations_path)
+    if config.stash[durations_store_key].timings:
+        # pytest-split shards CI nodes ('--splitting-algorithm least_duration') from these,
+        # read when its plugin is configured right after this hook
+        config.stash[durations_store_key].export_totals(durations_path)
+    config.pluginmanager.register(
+        DurationsRecorder(
+            config.stash[durations_store_key], export_path=durations_path
+        ),
+        "durations_recorder",
+    )
+    # compiled once, before the workers start and map it
+    config.stash[data_registry_key].compile()
+    if config.getoption("approve_baselines"):
+        # before any worker compares with the baselines
+        store = BaselineStore(Path(config.getoption("visual_baselines")))
+        for entry in store.approve():
+            logging.info("Approved baseline %s", entry.key.id)
+
+
+def pytest_terminal_summary(terminalreporter, config: Config) -> None:
+    """Reports latency and connection reuse of the HTTP services and the database used by
+    the session, and the hit rate of the element caches."""
+    metrics = config.stash.get(http_metrics_key, {})
+    used = {name: metric for name, metric in metrics.items() if metric.requests}
+    if used:
+        terminalreporter.section("HTTP client")
+    for name, metric in used.items():
+        terminalreporter.write_line(
+            f"{name}: {metric.requests} requests, {metric.cache_hits} cache hits, "
+            f"{metric.errors} errors, {metric.average_ms:.1f} ms average, "
+            f"{metric.max_ms:.1f} ms max, {metric.connection_reuse:.0%} connection reuse"
+        )
+    if cache_stats := config.stash.get(element_cache_stats_key, None):
+        hits, misses = cache_stats["hits"], cache_stats["misses"]
+        terminalreporter.section("Element cache")
+        terminalreporter.write_line(
+            f"{hits} hits, {misses} misses, {hits / max(hits + misses, 1):.0%} hit rate"
+        )
+    db_metrics = config.stash.get(db_metrics_key, None)
+    if not db_metrics or not (db_metrics.queries or db_metrics.cache_hits):
+        return
+    terminalreporter.section("Database")
+    terminalreporter.write_line(
+        f"{db_metrics.queries} queries, {db_metrics.cache_hits} cache hits, "
+        f"{db_metrics.prepared_hits} prepared statement reuses, {db_metrics.errors} errors, "
+        f"{db_metrics.connections} connections, {db_metrics.average_ms:.1f} ms average, "
+        f"{db_metrics.max_ms:.1f} ms max"
+    )
+    for sql, total_ms in db_metrics.slowest():
+        terminalreporter.write_line(f"{total_ms:.1f} ms: {sql}")
+
+
+def pytest_sessionfinish(session: pytest.Session) -> None:
+    """Hands the database and element cache metrics of an xdist worker to the controller,
+    which reports them in its terminal summary."""
+    config = session.config
+    if not hasattr(config, "workeroutput"):
+        return
+    if db_metrics_key in config.stash:
+        config.workeroutput["db_metrics"] = asdict(config.stash[db_metrics_key])
+    if element_cache_stats_key in config.stash:
+        config.workeroutput["element_cache"] = dict(
+            config.stash[element_cache_stats_key]
+        )
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_testnodedown(node, error) -> None:
+    """Adds up the database and element cache metrics of the xdist workers on the
+    controller."""
+    if metrics := node.workeroutput.get("db_metrics"):
+        node.config.stash.setdefault(db_metrics_key, QueryMetrics()).merge(
+            QueryMetrics(**metrics)
+        )
+    if stats := node.workeroutput.get("element_cache"):
+        node.config.stash.setdefault(element_cache_stats_key, Counter()).update(stats)
+
+
+def pytest_unconfigure(config: Config) -> None:
+    """Waits for the attachments still being written, then removes the network logs they were
+    written from."""
+    if attachment_writer_key in config.stash:
+        config.stash[attachment_writer_key].close()
+    if network_logs_directory_key in config.stash:
+        config.stash[network_logs_directory_key].cleanup()
+    if data_registry_key in config.stash:
+        config.stash[data_registry_key].close()
+
+
+def worker_download_directory() -> Path:
+    """Download directory of the current worker, so parallel browsers and the
+    driver pool cleaning it never touch each other's files."""
+    return Constants.CHROME_DOWNLOAD_DIRECTORY / os.getenv(
+        "PYTEST_XDIST_WORKER", "main"
+    )
+
+
+@fixture(scope="session")
+def driver_pool(pytestconfig: Config) -> DriverPool:
+    """Warm browsers owned by the current worker process."""
+    pool = DriverPool(
+        size=pytestconfig.getoption("driver_pool_size"),
+        max_uses=pytestconfig.getoption("driver_max_uses"),
+        download_directory=worker_download_directory(),
+    )
+    yield pool
+    pool.close()
 
 
 @fixture(scope="session")
-def data() -> Data:
-    json_path = Constants.DATA_PATH / "tests_data.json"
-    with open(json_path, encoding="utf-8") as json_file:
-        json_data = json.load(json_file)
-    return Data.from_dict(json_data)
+def data_registry(pytestconfig: Config) -> DataRegistry:
+    """Test data of tests_data.json and data.xls, from the compiled snapshot."""
+    return pytestconfig.stash[data_registry_key]
 
 
-def get_public_ip(session: requests.Session) -> str:
-    return session.get("http://checkip.amazonaws.com", timeout=40).text.rstrip()
+@fixture(scope="session")
+def data(data_registry: DataRegistry) -> Data:
+    return data_registry.data()
+
+
+def get_public_ip(session: HttpClient) -> str:
+    # cached by the client, failures of the same worker share a single lookup
+    return session.get(session.service_url("public_ip")).text.rstrip()
 
 
 @fixture(scope="session")
-def excel_reader() -> ExcelParser:
-    return ExcelParser("data.xls")
+def excel_reader(data_registry: DataRegistry) -> Callable[[str], dict[str, tuple]]:
+    """Columns by header of a data.xls sheet, from the compiled snapshot - no worker
+    parses the workbook."""
+    return lambda sheet_name: data_registry.section(f"data.xls:{sheet_name}")
 
 
 @pytest.fixture(scope="session", autouse=True)
-def session_request():
+def session_request(pytestconfig: Config):
     """Fixture to create a session object with a logging hook for HTTP
     requests.
 
     This fixture is based on a helpful solution provided on StackOverflow:
     https://stackoverflow.com/a/70351922
 
+    The hook only records method, URL, status, latency and sizes of every response, full
+    dumps are attached for failed tests and for the '--http_log_sample_rate' share of the
+    responses.
+
+    The session is the pooled HttpClient shared by the helpers, with per service timeouts,
+    retries and caching. Its latency and connection reuse metrics are reported in the
+    terminal summary.
+
     Returns:
-        requests.Session: A session object with a logging hook.
+        HttpClient: A session object with a logging hook.
     """
-    session = requests.Session()
+    session = HttpClient()
     session.headers = {"User-Agent": Constants.AUTOMATION_USER_AGENT}
-    session.hooks["response"] = lambda response, *args, **kwargs: allure.attach(
-        dump.dump_all(response).decode("utf-8"),
-        name=f"HTTP logs of {response.url}",
-        attachment_type=allure.attachment_type.TEXT,
-    )
+    session.hooks["response"] = pytestconfig.stash[http_log_key].hook
     yield session
+    pytestconfig.stash[http_metrics_key] = session.metrics()
     session.close()
 
 
+@pytest.fixture
+def http_stub(session_request: HttpClient) -> StubServer:
+    """Local stub server for offline tests of HTTP helpers.
+
+    Point a service of the session to it with 'session_request.override(name, http_stub.url)',
+    the overridden base URLs are restored after the test.
+    """
+    base_urls = {
+        name: session_request.service_url(name) for name in session_request.services
+    }
+    with StubServer() as stub:
+        yield stub
+    for name, base_url in base_urls.items():
+        if session_request.service_url(name) != base_url:
+            session_request.override(name, base_url)
+
 
 @pytest.fixture(scope="session")
-def db_connection():
-    """Fixture to establish a database connection."""
-    connection = MySQLConnection(user="root", password="1234", database="world")
-    yield connection
-    connection.close()
+def db(pytestconfig: Config) -> Iterator[DatabaseClient]:
+    """Pooled database client of the worker, configured with the DB_* environment variables.
+
+    Statements are prepared once per connection, read-only queries made with 'cache=True'
+    are answered from the session cache until invalidated. With '--db_backend sqlite' the
+    client uses a local in-memory database seeded from data/world.sql.
+    """
+    config = DatabaseConfig.from_env(pytestconfig.getoption("db_backend"))
+    if config.backend == "sqlite":
+        config = replace(config, seed=Constants.DATA_PATH / "world.sql")
+    client = DatabaseClient(config, pool_size=pytestconfig.getoption("db_pool_size"))
+    yield client
+    pytestconfig.stash[db_metrics_key] = client.metrics()
+    client.close()
 
 
 @pytest.fixture(scope="session")
-def vrt_helper():
-    """Fixture for creating a Visual Regression Tracker (VRT) helper object.
+def db_connection(db: DatabaseClient):
+    """Fixture to establish a database connection, held from the pool for the session."""
+    with db.connection() as connection:
+        yield connection
 
-    This fixture sets up a Visual Regression Tracker helper object that provides
-    convenient methods for capturing and comparing screenshots with a Visual Regression
-    Tracker (VRT) server. It starts the VRT server before all tests and stops it
-    after all tests have completed.
 
-    Usage:
-    1. Import this fixture into your test module.
-    2. Use the returned `VrtHelper` instance as a parameter in your test functions to
-       access methods for VRT-related tasks.
+@pytest.fixture(scope="session")
+def visual_backend(pytestconfig: Config) -> Iterator[VisualBackend]:
+    """Backend comparing visual captures with their baselines.
+
+    The local backend diffs the captures against the PNGs in '--visual_baselines'
+    without any server, captures without a baseline become their baseline - except in CI
+    (the CI environment variable is set), where they fail as missing. With
+    '--visual_backend vrt' the captures are compared on a Visual Regression Tracker
+    server configured with the VRT_* environment variables. '--update_baselines'
+    makes every capture of the run the baseline.
 
     Links:
     - Visual Regression Tracker GitHub Repository: https://github.com/Visual-Regression-Tracker/examples-python
     - Visual Regression Tracker SDK for Python: https://github.com/Visual-Regression-Tracker/sdk-python
     """
+    backend = create_visual_backend(
+        pytestconfig.getoption("visual_backend"),
+        pytestconfig.getoption("driver"),
+        BaselineStore(Path(pytestconfig.getoption("visual_baselines"))),
+        pytestconfig.stash[attachment_writer_key].attach,
+        pytestconfig.getoption("update_baselines"),
+        save_new=not os.getenv("CI"),
+    )
+    backend.start()
+    yield backend
+    backend.stop()
 
-def pytest_runtest_setup(item: Item) -> None:
-    global browser, driver, chrome_options, wait
+
+@pytest.fixture
+def vrt_helper(
+    driver_context: DriverContext, visual_backend: VisualBackend
+) -> VrtHelper:
+    """Fixture for creating a visual regression helper object.
+
+    The helper captures the page (or elements of it) of the test's browser once it
+    settled and compares the captures with their baselines in the visual backend.
+
+    Usage:
+    1. Import this fixture into your test module.
+    2. Use the returned `VrtHelper` instance as a parameter in your test functions to
+       access methods for visual checks.
+    """
+    return VrtHelper(driver_context.driver, driver_context.wait, visual_backend)
+
+
+@pytest.fixture(autouse=True)
+def driver_context(
+    request: FixtureRequest, driver_pool: DriverPool, base_url: str
+) -> Iterator[Optional[DriverContext]]:
+    """Hands a browser from the worker's pool to the test and wires it into the
+    test class.
+
+    The context is fixture state rather than module globals, so hooks such as
+    'pytest_exception_interact' always see the browser of the failing test, also
+    when the suite runs in several worker processes ('pytest -n auto --dist loadscope').
+
+    Tests marked 'no_browser' (e.g. database checks) get no browser and a None context.
+    """
+    item: Item = request.node
+    if item.get_closest_marker("no_browser"):
+        yield None
+        return
     browser = item.config.getoption("driver")
-    base_url = item.config.getoption("base_url")
+    network_capture = item.config.getoption("network_capture")
     if browser in ("chrome", "chrome_headless"):
         chrome_options = webdriver.ChromeOptions()
-        chrome_options.set_capability(
-            "goog:loggingPrefs", {"performance": "ALL", "browser": "ALL"}
-        )
+        logging_prefs = {"browser": "ALL"}
+        if network_capture == "performance_log":
+            logging_prefs["performance"] = "ALL"
+        chrome_options.set_capability("goog:loggingPrefs", logging_prefs)
         chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
         chrome_options.add_experimental_option(
             "prefs",
@@ -132,7 +614,7 @@ def pytest_runtest_setup(item: Item) -> None:
                 "profile.password_manager_enabled": False,
                 "safebrowsing.enabled": False,
                 "download.default_directory": os.path.abspath(
-                    Constants.CHROME_DOWNLOAD_DIRECTORY.absolute().as_posix()
+                    driver_pool.download_directory.absolute().as_posix()
                 ),
             },
         )
@@ -158,60 +640,131 @@ def pytest_runtest_setup(item: Item) -> None:
         # example of adding specific chrome option based on test name
         if item.name == "test_invalid_login":
             chrome_options.add_argument(f"user-agent={Constants.AUTOMATION_USER_AGENT}")
-    match browser:
-        case "firefox":
-            driver = webdriver.Firefox()
-        case "chrome_headless":
-            chrome_options.add_argument("headless=new")
-            chrome_options.add_argument("force-device-scale-factor=0.6")
-            chrome_options.add_argument("window-size=1920,1080")
-            driver = webdriver.Chrome(options=chrome_options)
-        # https://stackoverflow.com/questions/76430192/getting-typeerror-webdriver-init-got-an-unexpected-keyword-argument-desi
-        case "remote":
-            chrome_options = webdriver.ChromeOptions()
-            # https://aerokube.com/images/latest/#_chrome
-            chrome_options.browser_version = "127.0"
-            chrome_options.set_capability(
-                "selenoid:options",
-                {
-                    "enableVNC": True,
-                    "enableVideo": True,
-                    "videoName": f"{item.name}.mp4",
-                },
+    decorate_driver = bool(item.config.getoption("decorate_driver"))
+
+    def launch_driver() -> webdriver.Remote:
+        match browser:
+            case "firefox":
+                new_driver = webdriver.Firefox()
+            case "chrome_headless":
+                chrome_options.add_argument("headless=new")
+                chrome_options.add_argument("force-device-scale-factor=0.6")
+                chrome_options.add_argument("window-size=1920,1080")
+                new_driver = webdriver.Chrome(options=chrome_options)
+            # https://stackoverflow.com/questions/76430192/getting-typeerror-webdriver-init-got-an-unexpected-keyword-argument-desi
+            case "remote":
+                remote_options = webdriver.ChromeOptions()
+                # https://aerokube.com/images/latest/#_chrome
+                remote_options.browser_version = "127.0"
+                remote_options.set_capability(
+                    "selenoid:options",
+                    {
+                        "enableVNC": True,
+                        "enableVideo": True,
+                        "videoName": f"{item.name}.mp4",
+                    },
+                )
+                new_driver = webdriver.Remote(
+                    command_executor="http://localhost:4444/wd/hub",
+                    options=remote_options,
+                )
+            case _:
+                new_driver = webdriver.Chrome(options=chrome_options)
+        if decorate_driver:
+            # nobody watches headless and remote browsers, highlighting only costs time
+            new_driver = EventFiringWebDriver(
+                new_driver,
+                DriverEventListener(highlight=browser in ("chrome", "firefox")),
             )
-            driver = webdriver.Remote(
-                command_executor="http://localhost:4444/wd/hub", options=chrome_options
+        new_driver.maximize_window()
+        return new_driver
+
+    # sessions can only be shared between tests launched with identical options
+    pool_key = (browser, decorate_driver)
+    if browser in ("chrome", "chrome_headless"):
+        pool_key += tuple(chrome_options.arguments)
+    started = time.perf_counter()
+    pooled_driver = driver_pool.acquire(pool_key, launch_driver)
+    command_profiler = item.config.stash[command_profiler_key]
+    try:
+        if pooled_driver.uses == 1:
+            item.user_properties.append(
+                ("browser_launch", time.perf_counter() - started)
             )
-        case _:
-            if item.config.getoption("decorate_driver"):
-                driver = EventFiringWebDriver(
-                    webdriver.Chrome(options=chrome_options), DriverEventListener()
+            if network_capture == "bidi":
+                pooled_driver.event_capture = BidiEventCapture.start(
+                    pooled_driver.driver,
+                    url_pattern=item.config.getoption("network_url_filter"),
                 )
-            else:
-                driver = webdriver.Chrome(options=chrome_options)
-    item.cls.driver = driver
-    driver.maximize_window()
-    driver.get(base_url)
-    wait = WebDriverWait(driver, 10)
-    item.cls.wait = wait
-    item.cls.about_page = AboutPage(driver, wait)
-    item.cls.login_page = LoginPage(driver, wait)
-
-
-def pytest_runtest_teardown() -> None:
-    """Pytest hook for teardown after each test.
-
-    Checks if the 'driver' variable is present in the local or global namespace.
-    If found, it calls the 'quit()' method on the 'driver' object to close the browser.
+        elif pooled_driver.event_capture:
+            pooled_driver.event_capture.clear()
+        driver = pooled_driver.driver
+        if pooled_driver.event_capture and hasattr(driver, "execute_cdp_cmd"):
+            # bodies are kept for Network.getResponseBody only with the Network domain
+            # enabled, again in the new tab every reset of the pool opens
+            driver.execute_cdp_cmd("Network.enable", {})
+        if command_profiler:
+            command_profiler.install(driver)
+            command_profiler.start()
+        driver.get(base_url)
+        wait = WebDriverWait(driver, WAIT_TIMEOUT)
+        context = DriverContext(
+            browser=browser,
+            pooled_driver=pooled_driver,
+            wait=wait,
+            wait_engine=create_wait_engine(
+                item.config.getoption("wait_engine"), driver, wait, WAIT_TIMEOUT
+            ),
+        )
+        pages = []
+        if request.cls is not None:
+            request.cls.driver = driver
+            request.cls.wait = context.wait
+            cache_elements = item.config.getoption("cache_elements")
+            request.cls.about_page = AboutPage(
+                driver, context.wait, context.wait_engine, cache_elements
+            )
+            request.cls.login_page = LoginPage(
+                driver, context.wait, context.wait_engine, cache_elements
+            )
+            pages = [request.cls.about_page, request.cls.login_page]
+    except BaseException:
+        if command_profiler:
+            command_profiler.stop()
+        # a session whose setup failed half way is in an unknown state
+        driver_pool.release(pooled_driver, reusable=False)
+        raise
+    yield context
+    if command_profiler:
+        attach_command_profile(item, command_profiler.stop())
+    for page in pages:
+        if page.element_cache is not None:
+            item.config.stash.setdefault(element_cache_stats_key, Counter()).update(
+                hits=page.element_cache.hits, misses=page.element_cache.misses
+            )
+    # Selenoid records a video per browser session, so remote sessions are never reused.
+    driver_pool.release(
+        pooled_driver, reusable=context.reusable and browser != "remote"
+    )
 
-    Note: This function assumes that the 'driver' variable is used for browser automation,
-    and its presence is necessary for cleanup.
 
-    Returns:
-        None
-    """
-    if "driver" in locals() or "driver" in globals():
-        driver.quit()
+def attach_command_profile(item: Item, records: list[CommandRecord]) -> None:
+    """Attaches the commands of the test as table per caller and command, and as
+    timeline, and hands the aggregates to the session summary."""
+    if not (user_property := profile_property(records)):
+        return
+    attachment_writer = item.config.stash[attachment_writer_key]
+    attachment_writer.attach(
+        format_table(aggregate(records, "both"), "caller -> command"),
+        name="WebDriver Commands",
+        attachment_type=allure.attachment_type.TEXT,
+    )
+    attachment_writer.attach(
+        json.dumps([asdict(record) for record in records], indent=1),
+        name="WebDriver Command Timeline",
+        attachment_type=allure.attachment_type.JSON,
+    )
+    item.user_properties.append(user_property)
 
 
 def pytest_sessionstart() -> None:
@@ -225,12 +778,60 @@ def pytest_sessionstart() -> None:
     logger.setLevel(logging.DEBUG)
 
 
+def pytest_generate_tests(metafunc: pytest.Metafunc) -> None:
+    """Parametrizes the tests marked with 'data_source' from the rows of its file.
+
+    The rows are streamed while collecting, sampled and sharded by '--data_sample' and
+    '--data_shard'. Every xdist worker collects the same rows, shard a run per CI node.
+    """
+    marker = metafunc.definition.get_closest_marker(DATA_SOURCE_MARKER)
+    if marker is None:
+        return
+    DataSource.from_marker(
+        marker,
+        sample=metafunc.config.getoption("data_sample"),
+        shard=parse_shard(metafunc.config.getoption("data_shard")),
+    ).parametrize(metafunc)
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_collection_modifyitems(config: Config, items: list[Item]) -> None:
+    """Runs the test classes with the longest recorded duration first.
+
+    xdist hands a whole class to the next free worker ('--dist loadscope'), so starting
+    with the longest classes is the longest-processing-time-first schedule that keeps the
+    makespan close to optimal. The order inside a class is kept as collected.
+    """
+    store = config.stash[durations_store_key]
+    class_durations = defaultdict(float)
+    for item in items:
+        class_durations[scope_of(item)] += store.duration(item.nodeid)
+    items.sort(key=lambda item: class_durations[scope_of(item)], reverse=True)
+
+
+def scope_of(item: Item) -> str:
+    """The unit xdist '--dist loadscope' distributes: the class, or the module."""
+    return item.nodeid.rsplit("::", 1)[0]
+
+
+def pytest_runtest_setup(item: Item) -> None:
+    """Starts the HTTP log of the test, including the requests of its fixtures."""
+    item.config.stash[http_log_key].clear()
+
+
 def pytest_exception_interact(node: Item) -> None:
     """Pytest hook for interacting with exceptions during test execution.
 
-    If the 'driver' variable is present in the local or global namespace, this function performs various
-    actions for reporting using the 'allure' reporting framework. If 'driver' is not present, the function
-    returns without taking any action.
+    The HTTP requests of the session_request fixture made by the test are attached as
+    records and full dumps.
+
+    If the test requested a 'driver_context', this function collects various artifacts of the
+    browser of that test for reporting using the 'allure' reporting framework. Otherwise (e.g.
+    collection errors or tests without a browser) the function returns without taking any action.
+
+    The artifacts are collected concurrently within the '--artifacts_budget' time budget, whatever
+    did not finish in time is left out and the time every artifact took is attached as well. A
+    browser still busy with an artifact that timed out is not reused by the next test.
 
     Args:
         node (Item): The pytest Item representing the test item.
@@ -238,163 +839,193 @@ def pytest_exception_interact(node: Item) -> None:
     Returns:
         None
     """
-    session_request: requests.Session = node.funcargs["session_request"]
-    if "driver" not in locals() and "driver" not in globals():
+    attachment_writer = node.config.stash[attachment_writer_key]
+    http_log = node.config.stash[http_log_key]
+    if records := http_log.records():
+        attachment_writer.attach(
+            json.dumps([asdict(record) for record in records], indent=4),
+            name="HTTP Log",
+            attachment_type=allure.attachment_type.JSON,
+        )
+        for record, text in http_log.dumps():
+            attachment_writer.attach(
+                text,
+                name=f"HTTP logs of {record.url}",
+                attachment_type=allure.attachment_type.TEXT,
+            )
+    funcargs = getattr(node, "funcargs", {})
+    context: Optional[DriverContext] = funcargs.get("driver_context")
+    if context is None:
         return
-    window_count = len(driver.window_handles)
-    if browser == "remote":
-        allure.attach(
+    session_request: HttpClient = funcargs["session_request"]
+    started = time.perf_counter()
+    if context.browser == "remote":
+        attachment_writer.attach(
             body="<html><body><video width='100%%' height='100%%' controls autoplay><source "
             f"src='http://localhost:4444/video/{node.name}.mp4' "
             "type='video/mp4'></video></body></html>",
             name="Video record",
             attachment_type=allure.attachment_type.HTML,
         )
-        if window_count == 1:
-            allure.attach(
-                body=driver.get_screenshot_as_png(),
-                name="Full Page Screenshot",
-                attachment_type=allure.attachment_type.PNG,
+    tasks = {
+        "windows": lambda: collect_window_artifacts(
+            context, node.config.stash[screenshot_engine_key], node.nodeid
+        ),
+        "console logs": lambda: [
+            Artifact(
+                "Console Logs",
+                json.dumps(
+                    (
+                        context.event_capture.console_messages()
+                        if context.event_capture
+                        else context.driver.get_log("browser")
+                    ),
+                    indent=4,
+                ),
+                allure.attachment_type.JSON,
             )
-            allure.attach(
-                body=driver.current_url,
-                name="URL",
-                attachment_type=allure.attachment_type.URI_LIST,
+        ],
+        "public ip": lambda: [
+            Artifact(
+                "Public IP Address",
+                get_public_ip(session_request),
+                allure.attachment_type.TEXT,
             )
-        else:
-            for window in range(window_count):
-                driver.switch_to.window(driver.window_handles[window])
-                allure.attach(
-                    body=driver.get_screenshot_as_png(),
-                    name=f"Full Page Screen Shot of window in index {window}",
-                    attachment_type=allure.attachment_type.PNG,
-                )
-                allure.attach(
-                    body=driver.current_url,
-                    name=f"URL of window in index {window}",
-                    attachment_type=allure.attachment_type.URI_LIST,
-                )
-    with allure.step("public ip address"):
-        get_public_ip(session_request)
-    allure.attach(
-        body=json.dumps(driver.get_cookies(), indent=4),
-        name="Cookies",
-        attachment_type=allure.attachment_type.JSON,
+        ],
+    }
+    if context.supports_cdp:
+        tasks["network logs"] = lambda: collect_network_logs(
+            node.config, context.driver, context.event_capture
+        )
+    result = node.config.stash[failure_artifact_collector_key].collect(
+        tasks,
+        essential=("windows",),
+        # the response bodies are read from the current window, before the window walk
+        serial=("network logs", "windows"),
     )
-    allure.attach(
-        body=json.dumps(
-            {
-                item[0]: item[1]
-                for item in driver.execute_script(
-                    "return Object.entries(sessionStorage);"
-                )
-            },
-            indent=4,
-        ),
-        name="Session Storage",
+    if result.timed_out:
+        # the timed out tasks keep sending commands to the driver in the background
+        context.reusable = False
+    for artifact in result.artifacts:
+        if isinstance(artifact.body, Path):
+            attachment_writer.attach_file(
+                artifact.body,
+                name=artifact.name,
+                attachment_type=artifact.attachment_type,
+                extension=artifact.extension,
+                remove=True,
+            )
+            continue
+        attachment_writer.attach(
+            body=artifact.body,
+            name=artifact.name,
+            attachment_type=artifact.attachment_type,
+            extension=artifact.extension,
+        )
+    attachment_writer.attach(
+        body=json.dumps([asdict(timing) for timing in result.timings], indent=4),
+        name="Failure Artifact Timings",
         attachment_type=allure.attachment_type.JSON,
     )
-    allure.attach(
-        body=json.dumps(
-            {
-                item[0]: item[1]
-                for item in driver.execute_script(
-                    "return Object.entries(localStorage);"
-                )
-            },
-            indent=4,
-        ),
-        name="Local Storage",
-        attachment_type=allure.attachment_type.JSON,
+    node.user_properties.append(("failure_artifacts", time.perf_counter() - started))
+
+
+def collect_window_artifacts(
+    context: DriverContext, screenshot_engine: ScreenshotEngine, nodeid: str
+) -> Iterator[Artifact]:
+    """Collects cookies and storage of the current window, then a screenshot and the URL of
+    every window.
+
+    A screenshot identical to one already attached for the same test (e.g. by a previous
+    run of a rerun test) is not attached again.
+
+    Everything that depends on the current window is done here, in one task, since switching
+    windows while other tasks run would make them read the wrong window.
+    """
+    driver = context.driver
+    yield Artifact(
+        "Cookies",
+        json.dumps(driver.get_cookies(), indent=4),
+        allure.attachment_type.JSON,
     )
-    allure.attach(
-        body=json.dumps(driver.get_log("browser"), indent=4),
-        name="Console Logs",
-        attachment_type=allure.attachment_type.JSON,
+    storage = driver.execute_script(
+        "return {session: Object.entries(sessionStorage), "
+        "local: Object.entries(localStorage)};"
     )
-    if browser != "remote":
+    for name, entries in (
+        ("Session Storage", storage["session"]),
+        ("Local Storage", storage["local"]),
+    ):
+        yield Artifact(
+            name,
+            json.dumps({item[0]: item[1] for item in entries}, indent=4),
+            allure.attachment_type.JSON,
+        )
+    window_handles = driver.window_handles
+    current_window = driver.current_window_handle
+    for window, handle in enumerate(window_handles):
+        if len(window_handles) > 1:
+            driver.switch_to.window(handle)
+        suffix = "" if len(window_handles) == 1 else f" of window in index {window}"
         # looks like cdp not working with remote: https://github.com/SeleniumHQ/selenium/issues/8672
-        if window_count == 1:
-            allure.attach(
-                body=capture_full_page_screenshot(),
-                name="Full Page Screenshot",
-                attachment_type=allure.attachment_type.PNG,
-            )
-            allure.attach(
-                body=driver.current_url,
-                name="URL",
-                attachment_type=allure.attachment_type.URI_LIST,
-            )
+        if context.supports_cdp:
+            screenshot = screenshot_engine.capture_full_page(driver)
         else:
-            for window in range(window_count):
-                driver.switch_to.window(driver.window_handles[window])
-                allure.attach(
-                    body=capture_full_page_screenshot(),
-                    name=f"Full Page Screen Shot of window in index {window}",
-                    attachment_type=allure.attachment_type.PNG,
-                )
-                allure.attach(
-                    body=driver.current_url,
-                    name=f"URL of window in index {window}",
-                    attachment_type=allure.attachment_type.URI_LIST,
-                )
-        allure.attach(
-            body=json.dumps(attach_network_logs(), indent=4),
-            name="Network Logs",
-            attachment_type=allure.attachment_type.JSON,
+            data = driver.get_screenshot_as_png()
+            screenshot = Screenshot(data, "png", hashlib.sha256(data).hexdigest())
+        if screenshot_engine.is_new(nodeid, screenshot):
+            attachment_type, extension = screenshot_attachment_types[
+                screenshot.image_format
+            ]
+            yield Artifact(
+                f"Full Page Screenshot{suffix}",
+                screenshot.data,
+                attachment_type,
+                extension,
+            )
+        yield Artifact(
+            f"URL{suffix}", driver.current_url, allure.attachment_type.URI_LIST
         )
+    if len(window_handles) > 1:
+        driver.switch_to.window(current_window)
 
 
-def get_response_body(request_id):
-    """Get the response body for the specified request ID."""
-    return driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+def collect_network_logs(
+    config: Config,
+    driver: webdriver.Chrome,
+    event_capture: Optional[BidiEventCapture] = None,
+) -> Iterator[Artifact]:
+    """Writes the XHR requests of the test with their bodies to a JSON file, next to a CSV
+    summary index of the requests.
 
-
-def get_request_post_data(request_id):
-    """Get the request post data for the specified request ID."""
-    return driver.execute_cdp_cmd(
-        "Network.getRequestPostData", {"requestId": request_id}
+    Uses the events streamed by the BiDi event capture when available, otherwise the Chrome
+    performance log ('--network_capture performance_log'). Bodies are fetched concurrently
+    and only for the content types and URLs selected with '--network_body_types' and
+    '--network_url_filter', up to '--network_body_max_size' bytes.
+    """
+    entries = (
+        entries_from_events(event_capture.network_events())
+        if event_capture is not None
+        else entries_from_performance_log(driver)
     )
-
-
-def capture_full_page_screenshot() -> bytes:
-    """Gets full page screenshot of the current window as a binary data."""
-    metrics = driver.execute_cdp_cmd("Page.getLayoutMetrics", {})
-    return base64.b64decode(
-        driver.execute_cdp_cmd(
-            "Page.captureScreenshot",
-            {
-                "clip": {
-                    "x": 0,
-                    "y": 0,
-                    "width": metrics["contentSize"]["width"],
-                    "height": metrics["contentSize"]["height"],
-                    "scale": 1,
-                },
-                "captureBeyondViewport": True,
-            },
-        )["data"]
+    if network_logs_directory_key not in config.stash:
+        # the logs are attached in the background, the directory is removed at the end
+        config.stash[network_logs_directory_key] = tempfile.TemporaryDirectory(
+            prefix="network-logs-"
+        )
+    directory = Path(
+        tempfile.mkdtemp(dir=config.stash[network_logs_directory_key].name)
+    )
+    body_types = config.getoption("network_body_types")
+    NetworkLogWriter(
+        driver,
+        content_types=tuple(body_types.split(",")) if body_types else (),
+        url_pattern=config.getoption("network_url_filter"),
+        max_body_size=config.getoption("network_body_max_size"),
+    ).write(entries, directory / "network.json", directory / "summary.csv")
+    yield Artifact(
+        "Network Logs Summary", directory / "summary.csv", allure.attachment_type.CSV
+    )
+    yield Artifact(
+        "Network Logs", directory / "network.json", allure.attachment_type.JSON
     )
-
-
-def attach_network_logs():
-    network_logs = defaultdict(dict)
-    for item in [
-        json.loads(log["message"])["message"] for log in driver.get_log("performance")
-    ]:
-        params = item.get("params")
-        if params.get("type") != "XHR":
-            continue
-        method = item.get("method")
-        request_id = params["requestId"]
-        network_log = network_logs[request_id]
-        if method == "Network.responseReceived":
-            network_log["response"] = item
-            with suppress(Exception):
-                network_log["response"]["body"] = get_response_body(request_id)
-        elif method == "Network.requestWillBeSent":
-            network_log["request"] = item
-            if params.get("request", {}).get("hasPostData"):
-                with suppress(Exception):
-                    network_log["request"]["body"] = get_request_post_data(request_id)
-    return [item for item in network_logs.values() if "response" in item]
@@ -0,0 +1,100 @@
+import json
+
+import allure
+import pytest
+from assertpy import assert_that
+
+from utilities.data_source import DataSource, parse_rows, parse_shard
+
+
+class Metafunc:
+    """Records the parametrization of a :class:`DataSource`."""
+
+    def parametrize(self, argnames, argvalues) -> None:
+        self.argnames = argnames
+        self.values = [param.values for param in argvalues]
+        self.ids = [param.id for param in argvalues]
+
+
+@pytest.fixture
+def users(tmp_path):
+    path = tmp_path / "users.csv"
+    path.write_text(
+        "email,password\n"
+        + "".join(f"user{index}@example.com,secret{index}\n" for index in range(1000)),
+        encoding="utf-8",
+    )
+    return path
+
+
+def indexes(source: DataSource) -> list[int]:
+    return [row.index for row in source.rows()]
+
+
+@allure.feature("Data")
+@pytest.mark.no_browser
+class TestDataSource:
+    @allure.title("Row ranges and shards are parsed")
+    def test_parse(self):
+        assert_that(parse_rows("2:5")).is_equal_to((2, 5))
+        assert_that(parse_rows(":5")).is_equal_to((0, 5))
+        assert_that(parse_rows("10:")).is_equal_to((10, None))
+        assert_that(parse_rows(None)).is_equal_to((0, None))
+        assert_that(parse_shard("2/4")).is_equal_to((1, 4))
+        assert_that(parse_shard(None)).is_none()
+        assert_that(parse_shard).raises(ValueError).when_called_with("5/4")
+
+    @allure.title("Only the rows of the range are kept")
+    def test_rows(self, users):
+        assert_that(indexes(DataSource(users, rows="2:5"))).is_equal_to([2, 3, 4])
+        assert_that(indexes(DataSource(users, rows="998:"))).is_equal_to([998, 999])
+
+    @allure.title("Samples keep the same share of the rows on every run")
+    def test_sample(self, users):
+        sample = indexes(DataSource(users, sample=0.3))
+        assert_that(len(sample)).is_between(250, 350)
+        assert_that(indexes(DataSource(users, sample=0.3))).is_equal_to(sample)
+        assert_that(indexes(DataSource(users, sample=0.3, seed=1))).is_not_equal_to(
+            sample
+        )
+
+    @allure.title("Shards split the rows between them")
+    def test_shard(self, users):
+        shards = [indexes(DataSource(users, shard=(index, 4))) for index in range(4)]
+        for shard in shards:
+            assert_that(len(shard)).is_between(200, 300)
+        assert_that(sorted(sum(shards, []))).is_equal_to(list(range(1000)))
+
+    @allure.title("Test ids are the row numbers or the values of the id column")
+    def test_ids(self, users):
+        metafunc = Metafunc()
+        DataSource(users, rows=":2").parametrize(metafunc)
+        assert_that(metafunc.argnames).is_equal_to(["email", "password"])
+        assert_that(metafunc.ids).is_equal_to(["users-0", "users-1"])
+        DataSource(users, "password", rows=":2", id_column="email").parametrize(
+            metafunc
+        )
+        assert_that(metafunc.values).is_equal_to([("secret0",), ("secret1",)])
+        assert_that(metafunc.ids).is_equal_to(
+            ["user0@example.com", "user1@example.com"]
+        )
+
+    @allure.title("JSON-lines values are passed by key")
+    def test_json_lines(self, tmp_path):
+        path = tmp_path / "users.jsonl"
+        rows = [{"email": "a@example.com", "password": "1"}, {"password": "2"}]
+        rows.append({"password": "3", "email": "c@example.com"})
+        path.write_text("".join(json.dumps(row) + "\n" for row in rows))
+        metafunc = Metafunc()
+        DataSource(path).parametrize(metafunc)
+        assert_that(metafunc.values).is_equal_to(
+            [("a@example.com", "1"), (None, "2"), ("c@example.com", "3")]
+        )
+
+    @allure.title("Short CSV rows are reported with their line")
+    def test_short_row(self, tmp_path):
+        path = tmp_path / "users.csv"
+        path.write_text("email,password\na@example.com,1\nb@example.com\n")
+        assert_that(indexes).raises(ValueError).when_called_with(
+            DataSource(path)
+        ).contains("users.csv line 3 (row 1)")
@@ -2,14 +2,22 @@ import allure
 import pytest
 from assertpy import assert_that
 
+from utilities.db_client import DatabaseClient
+from utilities.result_set_compare import ResultSetComparator
 
-@pytest.mark.skip(reason="requires database connection")
+
+@pytest.mark.skipif(
+    "(config.getoption('db_backend') or os.getenv('DB_BACKEND', 'mysql')) == 'mysql'"
+    " and not os.getenv('DB_HOST')",
+    reason="requires database connection, or --db_backend sqlite",
+)
+@pytest.mark.no_browser
 class TestDatabaseExample:
     @allure.title("Verify population amounts")
-    def test_verify_population_amount(self, db_connection):
-        with db_connection.cursor() as cursor:
-            cursor.execute("SELECT Population FROM city WHERE CountryCode='DNK'")
-            population_amount = [item[0] for item in cursor.fetchall()]
-            assert_that(population_amount).described_as(
-                "population amount"
-            ).is_equal_to([495699, 284846, 183912, 161161, 90327])
+    def test_verify_population_amount(self, db: DatabaseClient):
+        comparison = ResultSetComparator(db).compare(
+            "SELECT Population FROM city WHERE CountryCode = ? ORDER BY Population DESC",
+            [(495699,), (284846,), (183912,), (161161,), (90327,)],
+            ("DNK",),
+        )
+        assert_that(comparison.equal).described_as(str(comparison)).is_true()
@@ -34,7 +34,7 @@ class TestForgotPassword(BaseTest):
     )
     def test_invalid_email(self, excel_reader, data: Data):
         """This test is an example of a conditional skip based on base url."""
-        emails = excel_reader.read_from_excel("Emails")
+        emails = excel_reader("Emails")["email"]
         self.about_page.click_login_link()
         self.login_page.click_forgot_password()
         self.forget_password_page.send_password_reset_link(emails[0])
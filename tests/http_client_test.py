@@ -0,0 +1,32 @@
+import allure
+import pytest
+from assertpy import assert_that
+
+from utilities.http_client import HttpClient
+from utilities.http_stub import StubResponse, StubServer
+
+
+@allure.feature("HTTP")
+@pytest.mark.no_browser
+class TestHttpClient:
+    @allure.title("Cached GETs of a service are answered without a request")
+    def test_cached_get(self, session_request: HttpClient, http_stub: StubServer):
+        http_stub.route("GET", "/", StubResponse(body="127.0.0.1\n"))
+        session_request.override("public_ip", http_stub.url)
+        cache_hits = session_request.metrics()["public_ip"].cache_hits
+        for _ in range(3):
+            response = session_request.get(session_request.service_url("public_ip"))
+            assert_that(response.text).is_equal_to("127.0.0.1\n")
+        assert_that(http_stub.requests).is_length(1)
+        assert_that(
+            session_request.metrics()["public_ip"].cache_hits - cache_hits
+        ).is_equal_to(2)
+
+    @allure.title("Idempotent requests are retried on unavailable services")
+    def test_retries(self, session_request: HttpClient, http_stub: StubServer):
+        http_stub.route("GET", "/", StubResponse(503, "unavailable"))
+        session_request.override("public_ip", http_stub.url)
+        response = session_request.get(session_request.service_url("public_ip"))
+        assert_that(response.status_code).is_equal_to(503)
+        # the public IP service retries once
+        assert_that(http_stub.requests).is_length(2)
@@ -0,0 +1,78 @@
+import io
+import time
+
+import allure
+import numpy as np
+import pytest
+from assertpy import assert_that
+from PIL import Image
+
+from utilities.image_diff import IgnoreArea, ImageDiffEngine
+
+
+def full_hd_capture() -> np.ndarray:
+    """A gradient the size of a full-HD capture, no two neighbours alike."""
+    capture = np.zeros((1080, 1920, 4), dtype=np.uint8)
+    capture[:, :, 0] = np.linspace(0, 255, 1920, dtype=np.uint8)[None, :]
+    capture[:, :, 1] = np.linspace(0, 255, 1080, dtype=np.uint8)[:, None]
+    capture[:, :, 3] = 255
+    return capture
+
+
+def fastest_ms(compare, runs: int = 3) -> float:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        compare()
+        timings.append((time.perf_counter() - started) * 1000)
+    return min(timings)
+
+
+@allure.feature("Visual")
+@pytest.mark.no_browser
+class TestImageDiff:
+    # 12500 changed pixels, 0.6% of a full-HD capture
+    CHANGED = (slice(500, 550), slice(200, 450))
+
+    @allure.title("Changes within the tolerance pass without a heatmap")
+    def test_changes_within_tolerance(self):
+        baseline, actual = full_hd_capture(), full_hd_capture()
+        actual[self.CHANGED] = (255, 0, 0, 255)
+        result = ImageDiffEngine(tolerance_percent=1).compare(baseline, actual)
+        assert_that(result.passed).described_as(str(result)).is_true()
+        assert_that(result.diff_pixels).is_equal_to(12500)
+        assert_that(result.heatmap).is_none()
+
+    @allure.title("Changes beyond the tolerance fail with a heatmap")
+    def test_changes_beyond_tolerance(self):
+        baseline, actual = full_hd_capture(), full_hd_capture()
+        actual[self.CHANGED] = (255, 0, 0, 255)
+        result = ImageDiffEngine(tolerance_percent=0.1).compare(
+            baseline, actual, [IgnoreArea(0, 0, 100, 100)]
+        )
+        assert_that(result.passed).described_as(str(result)).is_false()
+        heatmap = np.asarray(Image.open(io.BytesIO(result.heatmap)).convert("RGB"))
+        assert_that(heatmap.shape).is_equal_to((1080, 1920, 3))
+        assert_that(tuple(heatmap[520, 300])).is_equal_to((255, 0, 0))
+        # ignored areas are tinted blue
+        assert_that(int(heatmap[50, 50, 2])).is_greater_than(int(heatmap[50, 50, 0]))
+
+    @allure.title("A line moved by a pixel is tolerated as anti-aliasing")
+    def test_anti_aliasing(self):
+        baseline = np.full((100, 100, 4), 255, dtype=np.uint8)
+        actual = baseline.copy()
+        baseline[50, 10:90, :3] = 0
+        actual[51, 10:90, :3] = 0
+        result = ImageDiffEngine(tolerance_percent=0).compare(baseline, actual)
+        assert_that(result.anti_aliased_pixels).is_equal_to(160)
+        assert_that(result.passed).described_as(str(result)).is_true()
+
+    @allure.title("Full-HD captures compare in tens of milliseconds")
+    def test_full_hd_compare_time(self):
+        baseline, actual = full_hd_capture(), full_hd_capture()
+        actual[self.CHANGED] = (255, 0, 0, 255)
+        passing_ms = fastest_ms(lambda: ImageDiffEngine(1).compare(baseline, actual))
+        failing_ms = fastest_ms(lambda: ImageDiffEngine(0.1).compare(baseline, actual))
+        # generous bounds, shared CI machines are slower than a workstation
+        assert_that(passing_ms).is_less_than(100)
+        assert_that(failing_ms).is_less_than(250)
@@ -10,8 +10,6 @@ from tests.base_test import BaseTest
 from utilities.constants import Constants
 from utilities.data import Data
 
-users = [("nirt236@gmail.com", "123456"), ("elias@gmail.com", "12345Tr")]
-
 
 @allure.severity(allure.severity_level.BLOCKER)
 @allure.epic("Security")
@@ -20,7 +18,7 @@ users = [("nirt236@gmail.com", "123456"), ("elias@gmail.com", "12345Tr")]
 class TestLogin(BaseTest):
     @allure.description("invalid login")
     @allure.title("Login with invalid credentials test")
-    @pytest.mark.parametrize("email, password", users)
+    @pytest.mark.data_source("invalid_credentials.csv", id_column="email")
     def test_invalid_login(self, email: str, password: str, data: Data):
         self.about_page.click_login_link()
         self.login_page.login(email, password)
@@ -0,0 +1,58 @@
+import random
+
+import allure
+import pytest
+from assertpy import assert_that
+
+from utilities.db_client import DatabaseClient, DatabaseConfig
+from utilities.result_set_compare import ResultSetComparator, row_key
+
+ROWS = [(index, f"name {index}", index * 1.5) for index in range(5000)]
+QUERY = "SELECT id, name, value FROM numbers ORDER BY id"
+
+
+@pytest.fixture(scope="module")
+def numbers_db():
+    db = DatabaseClient(DatabaseConfig(backend="sqlite", database=":memory:"))
+    db.execute("CREATE TABLE numbers (id INTEGER, name TEXT, value REAL)")
+    with db.connection() as connection:
+        connection.executemany("INSERT INTO numbers VALUES (?, ?, ?)", ROWS)
+        connection.commit()
+    yield db
+    db.close()
+
+
+@allure.feature("Database")
+@pytest.mark.no_browser
+class TestResultSetComparator:
+    @allure.title("Rows of different values have different keys")
+    def test_row_key(self):
+        assert_that(row_key(("a,b",))).is_not_equal_to(row_key(("a", "b")))
+        assert_that(row_key((None,))).is_not_equal_to(row_key(("",)))
+        assert_that(row_key(("1", None))).is_not_equal_to(row_key(("1-",)))
+        assert_that(row_key((495699,))).is_equal_to(row_key((495699.0,)))
+
+    @allure.title("Ordered comparisons report the first differing rows")
+    def test_ordered(self, numbers_db):
+        comparator = ResultSetComparator(numbers_db, chunk_size=500, max_differences=3)
+        assert_that(comparator.compare(QUERY, ROWS).equal).is_true()
+        # every row from 100 on moves by one, the report stops at the third
+        comparison = comparator.compare(QUERY, ROWS[:100] + ROWS[101:])
+        assert_that(
+            [difference.row for difference in comparison.differences]
+        ).is_equal_to([100, 101, 102])
+        assert_that(comparison.differing_chunks).is_length(10)
+
+    @allure.title("Unordered comparisons keep chunk_size rows per bucket")
+    def test_unordered(self, numbers_db):
+        comparator = ResultSetComparator(numbers_db, ordered=False, chunk_size=500)
+        shuffled = random.Random(0).sample(ROWS, len(ROWS))
+        comparison = comparator.compare(QUERY, shuffled)
+        assert_that(comparison.equal).described_as(str(comparison)).is_true()
+        assert_that(comparison.chunks).is_greater_than_or_equal_to(10)
+        shuffled[0] = (-1, "missing", None)
+        comparison = comparator.compare(QUERY, shuffled)
+        assert_that(comparison.differences).is_length(2)
+        assert_that(
+            [difference.expected for difference in comparison.differences]
+        ).contains((-1, "missing", None))
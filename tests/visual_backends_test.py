@@ -0,0 +1,68 @@
+import io
+
+import allure
+import numpy as np
+import pytest
+from assertpy import assert_that
+from PIL import Image, ImageDraw
+
+from utilities.baseline_store import BaselineKey, BaselineStore, perceptual_hash
+from utilities.image_diff import to_array
+from utilities.visual_backends import LocalDiffBackend
+
+
+def png(image: Image.Image) -> bytes:
+    output = io.BytesIO()
+    image.save(output, "PNG")
+    return output.getvalue()
+
+
+def gradient() -> Image.Image:
+    pixels = np.zeros((1080, 1920, 3), dtype=np.uint8)
+    pixels[:, :, 0] = np.linspace(0, 255, 1920, dtype=np.uint8)[None, :]
+    pixels[:, :, 2] = np.linspace(0, 255, 1080, dtype=np.uint8)[:, None]
+    return Image.fromarray(pixels)
+
+
+@allure.feature("Visual")
+@pytest.mark.no_browser
+class TestLocalDiffBackend:
+    @allure.title("A small change with the perceptual hash of its baseline fails")
+    def test_perceptually_equal_change(self, tmp_path):
+        store = BaselineStore(tmp_path)
+        baseline = gradient()
+        store.save(BaselineKey("balance"), png(baseline))
+        actual = baseline.copy()
+        ImageDraw.Draw(actual).text(
+            (800, 500), "Balance: -$1,000,000.00 OVERDRAWN", fill=(255, 0, 0)
+        )
+        capture = png(actual)
+        # too small a change for the hash, the pixel diff must tell
+        assert_that(perceptual_hash(to_array(capture))).is_equal_to(
+            store.get(BaselineKey("balance")).phash
+        )
+        check = LocalDiffBackend(store, attach=lambda *args: None).track(
+            "balance", capture
+        )
+        assert_that(check.status).described_as(str(check)).is_equal_to("unresolved")
+
+    @allure.title("A byte identical capture passes")
+    def test_identical_capture(self, tmp_path):
+        store = BaselineStore(tmp_path)
+        capture = png(gradient())
+        store.save(BaselineKey("page"), capture)
+        check = LocalDiffBackend(store, attach=lambda *args: None).track(
+            "page", capture
+        )
+        assert_that(check.status).is_equal_to("ok")
+        assert_that(check.details).is_equal_to("byte identical")
+
+    @allure.title("Without saving new baselines a capture without one fails")
+    def test_missing_baseline(self, tmp_path):
+        backend = LocalDiffBackend(
+            BaselineStore(tmp_path), attach=lambda *args: None, save_new=False
+        )
+        check = backend.track("page", png(gradient()))
+        assert_that(check.status).is_equal_to("missing")
+        assert_that(check.passed).is_false()
+        assert_that(backend.has_baseline("page")).is_false()
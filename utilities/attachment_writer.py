@@ -0,0 +1,263 @@
+import gzip
+import hashlib
+import logging
+import os
+import queue
+import shutil
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Union
+
+import allure
+from allure_commons.types import AttachmentType
+from pluggy import PluginManager
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_MIME_TYPES = ("application/json", "application/xml", "text/")
+
+
+@dataclass
+class AttachmentStats:
+    written: int = 0
+    deduplicated: int = 0
+    compressed: int = 0
+    over_budget: int = 0
+    bytes_written: int = 0
+
+
+@dataclass
+class _WriteJob:
+    file_name: str
+    data: Optional[bytes] = None
+    source: Optional[Path] = None
+    remove_source: bool = False
+    compress: bool = False
+
+
+class AttachmentWriter:
+    """Content addressed, asynchronous writer of allure attachments.
+
+    Attachments are named after the SHA-256 of their content instead of a
+    random uuid, so a payload attached by many tests (the same cookies, the
+    same error page, the same HTTP response) is stored once and referenced
+    by all of them. The attachment is registered with the current allure
+    test right away, the file itself is written by a background thread -
+    the test thread only hashes the content.
+
+    Text attachments larger than ``gzip_threshold`` are stored gzipped (the
+    report offers them as download), and once ``size_budget`` bytes were
+    written new attachments are replaced by a short note. The budget is per
+    process, every xdist worker has its own.
+
+    Without the allure plugin (e.g. no ``--alluredir``) attachments are
+    handed to ``allure.attach`` as before.
+
+    :param plugin_manager: Plugin manager the allure listener is registered
+        with.
+    :param results_directory: The allure results directory.
+    :param gzip_threshold: Size in bytes above which text attachments are
+        gzipped, ``0`` never gzips.
+    :param size_budget: Bytes the attachments of the run may take.
+    :param max_pending: Attachments queued for writing before ``attach``
+        blocks.
+    """
+
+    def __init__(
+        self,
+        plugin_manager: PluginManager,
+        results_directory: Optional[Path],
+        gzip_threshold: int = 0,
+        size_budget: int = 1024**3,
+        max_pending: int = 64,
+    ):
+        self.plugin_manager = plugin_manager
+        self.results_directory = results_directory
+        self.gzip_threshold = gzip_threshold
+        self.size_budget = size_budget
+        self.stats = AttachmentStats()
+        self._known: set[str] = set()
+        self._budget_spent = 0
+        self._lock = threading.Lock()
+        self._queue: queue.Queue[Optional[_WriteJob]] = queue.Queue(max_pending)
+        self._thread: Optional[threading.Thread] = None
+
+    def attach(
+        self,
+        body: Union[str, bytes],
+        name: str,
+        attachment_type: Union[AttachmentType, str],
+        extension: Optional[str] = None,
+    ) -> None:
+        """Attach ``body`` to the current allure test, like ``allure.attach``."""
+        reporter = self._reporter()
+        if reporter is None:
+            allure.attach(body, name, attachment_type, extension)
+            return
+        data = body.encode("utf-8") if isinstance(body, str) else body
+        digest = hashlib.sha256(data).hexdigest()
+        self._register(
+            reporter,
+            _WriteJob("", data=data),
+            digest,
+            len(data),
+            name,
+            attachment_type,
+            extension,
+        )
+
+    def attach_file(
+        self,
+        source: Path,
+        name: str,
+        attachment_type: Union[AttachmentType, str],
+        extension: Optional[str] = None,
+        remove: bool = False,
+    ) -> None:
+        """Attach the file ``source``, like ``allure.attach.file``.
+
+        :param remove: Remove ``source`` once it was written (or found to be a
+            duplicate).
+        """
+        reporter = self._reporter()
+        if reporter is None:
+            allure.attach.file(source, name, attachment_type, extension)
+            if remove:
+                source.unlink(missing_ok=True)
+            return
+        digest = hashlib.sha256()
+        with open(source, "rb") as file:
+            while chunk := file.read(1024 * 1024):
+                digest.update(chunk)
+        self._register(
+            reporter,
+            _WriteJob("", source=source, remove_source=remove),
+            digest.hexdigest(),
+            source.stat().st_size,
+            name,
+            attachment_type,
+            extension,
+        )
+
+    def close(self) -> None:
+        """Wait for the queued attachments to be written."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        logger.info("Allure attachments: %s", self.stats)
+
+    def _register(
+        self,
+        reporter,
+        job: _WriteJob,
+        digest: str,
+        size: int,
+        name: str,
+        attachment_type: Union[AttachmentType, str],
+        extension: Optional[str],
+        note: bool = False,
+    ) -> None:
+        mime_type, extension = self._type_of(attachment_type, extension)
+        original_name = name
+        if not note and self.gzip_threshold and size > self.gzip_threshold:
+            if mime_type.startswith(COMPRESSIBLE_MIME_TYPES):
+                job.compress = True
+                name, mime_type = f"{name} (gzip)", "application/gzip"
+                extension = f"{extension}.gz"
+        with self._lock:
+            file_name = f"{digest}-attachment.{extension}"
+            duplicate = file_name in self._known
+            over_budget = (
+                not note
+                and not duplicate
+                and self._budget_spent + size > self.size_budget
+            )
+            if duplicate:
+                self.stats.deduplicated += 1
+            elif over_budget:
+                self.stats.over_budget += 1
+            else:
+                self._known.add(file_name)
+                self._budget_spent += size
+        if over_budget:
+            if job.remove_source:
+                job.source.unlink(missing_ok=True)
+            text = (
+                f"Not attached, the attachment size budget of {self.size_budget} bytes "
+                f"is spent ({size} bytes)."
+            ).encode("utf-8")
+            self._register(
+                reporter,
+                _WriteJob("", data=text),
+                hashlib.sha256(text).hexdigest(),
+                len(text),
+                original_name,
+                allure.attachment_type.TEXT,
+                None,
+                note=True,
+            )
+            return
+        # registers the attachment with the test or step running in this thread
+        reporter._attach(digest, name, mime_type, extension)
+        if duplicate:
+            if job.remove_source:
+                job.source.unlink(missing_ok=True)
+            return
+        job.file_name = file_name
+        self._start()
+        self._queue.put(job)
+
+    def _reporter(self):
+        listener = self.plugin_manager.getplugin("allure_listener")
+        if listener is None or self.results_directory is None:
+            return None
+        return listener.allure_logger
+
+    @staticmethod
+    def _type_of(
+        attachment_type: Union[AttachmentType, str], extension: Optional[str]
+    ) -> tuple[str, str]:
+        if isinstance(attachment_type, AttachmentType):
+            return attachment_type.mime_type, attachment_type.extension
+        return attachment_type or "", extension or "attach"
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._write_jobs, name="allure-attachments", daemon=True
+                )
+                self._thread.start()
+
+    def _write_jobs(self) -> None:
+        while (job := self._queue.get()) is not None:
+            try:
+                self._write(job)
+            except OSError as e:
+                logger.warning("Writing attachment %s failed: %s", job.file_name, e)
+            finally:
+                if job.remove_source:
+                    job.source.unlink(missing_ok=True)
+
+    def _write(self, job: _WriteJob) -> None:
+        destination = self.results_directory / job.file_name
+        # written by another worker or a previous run of the same content
+        if destination.exists():
+            self.stats.deduplicated += 1
+            return
+        temporary = destination.with_name(
+            f".{job.file_name}.{os.getpid()}.{threading.get_ident()}.tmp"
+        )
+        opener = gzip.open if job.compress else open
+        with opener(temporary, "wb") as file:
+            if job.data is not None:
+                file.write(job.data)
+            else:
+                with open(job.source, "rb") as source:
+                    shutil.copyfileobj(source, file)
+        os.replace(temporary, destination)
+        self.stats.written += 1
+        self.stats.compressed += job.compress
+        self.stats.bytes_written += destination.stat().st_size
@@ -0,0 +1,283 @@
+import hashlib
+import json
+import os
+import re
+import socket
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional
+
+import numpy as np
+from PIL import Image
+
+from utilities.image_diff import to_array
+
+INDEX_FILE = "index.json"
+
+
+def perceptual_hash(pixels: np.ndarray) -> str:
+    """Difference hash (256 bits, hex) of an image: the brightness gradients
+    of a 17x16 thumbnail, equal for images that look the same."""
+    thumbnail = Image.fromarray(pixels).convert("L").resize((17, 16), Image.BILINEAR)
+    gray = np.asarray(thumbnail, dtype=np.int16)
+    bits = (gray[:, 1:] > gray[:, :-1]).flatten()
+    return np.packbits(bits).tobytes().hex()
+
+
+@dataclass(frozen=True)
+class BaselineKey:
+    """Identity of a baseline: the same check looks different per browser
+    and viewport (e.g. ``1920x1080``)."""
+
+    name: str
+    browser: str = "any"
+    viewport: str = "any"
+
+    @property
+    def id(self) -> str:
+        return f"{self.browser}/{self.viewport}/{self.name}"
+
+    @property
+    def path(self) -> Path:
+        name = re.sub(r"[^\w.-]+", "_", self.name.strip()).strip("_")
+        return Path(_safe(self.browser), _safe(self.viewport), f"{name}.png")
+
+
+def _safe(part: str) -> str:
+    return re.sub(r"[^\w.-]+", "_", part) or "any"
+
+
+@dataclass
+class BaselineEntry:
+    """Metadata of a baseline in the index.
+
+    :param sha256: Digest of the PNG, byte identical captures match it.
+    :param phash: Perceptual hash of the pixels.
+    :param pending: PNG of the last capture that did not match, awaiting
+        approval.
+    """
+
+    name: str
+    browser: str
+    viewport: str
+    file: str
+    sha256: str
+    phash: str
+    width: int
+    height: int
+    updated: str
+    pending: Optional[str] = None
+
+    @property
+    def key(self) -> BaselineKey:
+        return BaselineKey(self.name, self.browser, self.viewport)
+
+
+class BaselineStore:
+    """Baselines of the visual checks, indexed by name, browser and viewport.
+
+    Baselines are kept as PNGs (compact, reviewable) next to an
+    ``index.json`` with their digest, perceptual hash and size, so a check
+    can tell a byte or perceptually identical capture without decoding the
+    baseline at all. Decoded baselines are cached as raw arrays under
+    ``cache_directory`` (by digest) and memory-mapped on later loads.
+
+    Captures that do not match are kept as pending, :meth:`approve` turns
+    them (in bulk) into the baselines. The index is updated under a lock
+    file, the workers of a parallel run share the store.
+
+    :param directory: Directory of the baselines and the index.
+    :param cache_directory: Directory of the decoded baselines,
+        ``<directory>/.cache`` by default.
+    """
+
+    def __init__(self, directory: Path, cache_directory: Optional[Path] = None):
+        self.directory = Path(directory)
+        self.cache_directory = Path(cache_directory or self.directory / ".cache")
+        self._entries: dict[str, BaselineEntry] = {}
+        self._index_mtime: Optional[float] = None
+
+    def get(self, key: BaselineKey) -> Optional[BaselineEntry]:
+        self._refresh()
+        return self._entries.get(key.id)
+
+    def entries(self) -> list[BaselineEntry]:
+        self._refresh()
+        return list(self._entries.values())
+
+    def load(self, entry: BaselineEntry) -> np.ndarray:
+        """Pixels (RGBA) of the baseline, memory-mapped from the cache."""
+        cached = self.cache_directory / f"{entry.sha256}.npy"
+        if not cached.exists():
+            pixels = to_array((self.directory / entry.file).read_bytes())
+            self.cache_directory.mkdir(parents=True, exist_ok=True)
+            _write_atomic(cached, lambda file: np.save(file, pixels))
+            return pixels
+        return np.load(cached, mmap_mode="r")
+
+    def save(
+        self, key: BaselineKey, image: bytes, pixels: Optional[np.ndarray] = None
+    ) -> BaselineEntry:
+        """Make ``image`` (a PNG) the baseline of ``key``."""
+        return self.update([(key, image, pixels)])[0]
+
+    def update(
+        self, baselines: Iterable[tuple[BaselineKey, bytes, Optional[np.ndarray]]]
+    ) -> list[BaselineEntry]:
+        """Make the PNGs the baselines of their keys, in one index update."""
+        entries = []
+        for key, image, pixels in baselines:
+            pixels = to_array(image) if pixels is None else pixels
+            path = self.directory / key.path
+            path.parent.mkdir(parents=True, exist_ok=True)
+            _write_atomic(path, lambda file: file.write(image))
+            entries.append(
+                BaselineEntry(
+                    name=key.name,
+                    browser=key.browser,
+                    viewport=key.viewport,
+                    file=key.path.as_posix(),
+                    sha256=hashlib.sha256(image).hexdigest(),
+                    phash=perceptual_hash(pixels),
+                    width=pixels.shape[1],
+                    height=pixels.shape[0],
+                    updated=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                )
+            )
+        with self._locked_index() as index:
+            for entry in entries:
+                index[entry.key.id] = entry
+        return entries
+
+    def add_pending(self, key: BaselineKey, image: bytes) -> None:
+        """Keep ``image``, which did not match the baseline of ``key``, for
+        approval."""
+        pending = key.path.with_suffix(".pending.png")
+        path = self.directory / pending
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _write_atomic(path, lambda file: file.write(image))
+        with self._locked_index() as index:
+            if key.id in index:
+                index[key.id].pending = pending.as_posix()
+
+    def approve(
+        self, predicate: Callable[[BaselineEntry], bool] = lambda entry: True
+    ) -> list[BaselineEntry]:
+        """Make the pending captures of the entries matching ``predicate``
+        (all by default) their baselines.
+
+        :return: The approved baselines.
+        """
+        approved = []
+        for entry in self.entries():
+            if entry.pending and predicate(entry):
+                pending = self.directory / entry.pending
+                approved.append((entry.key, pending.read_bytes(), None))
+        entries = self.update(approved)
+        for key, _, _ in approved:
+            (self.directory / key.path.with_suffix(".pending.png")).unlink(
+                missing_ok=True
+            )
+        return entries
+
+    def _refresh(self) -> None:
+        index_path = self.directory / INDEX_FILE
+        try:
+            mtime = index_path.stat().st_mtime
+        except FileNotFoundError:
+            return
+        if mtime != self._index_mtime:
+            self._entries = self._read_index()
+            self._index_mtime = mtime
+
+    def _read_index(self) -> dict[str, BaselineEntry]:
+        index_path = self.directory / INDEX_FILE
+        if not index_path.exists():
+            return {}
+        return {
+            entry_id: BaselineEntry(**entry)
+            for entry_id, entry in json.loads(index_path.read_text()).items()
+        }
+
+    @contextmanager
+    def _locked_index(self) -> Iterator[dict[str, BaselineEntry]]:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with _lock(self.directory / f"{INDEX_FILE}.lock"):
+            index = self._read_index()
+            yield index
+            text = json.dumps(
+                {entry_id: asdict(entry) for entry_id, entry in sorted(index.items())},
+                indent=1,
+            )
+            _write_atomic(
+                self.directory / INDEX_FILE, lambda file: file.write(text.encode())
+            )
+        self._entries = index
+        self._index_mtime = (self.directory / INDEX_FILE).stat().st_mtime
+
+
+def _write_atomic(path: Path, write: Callable) -> None:
+    descriptor, temporary = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+            write(file)
+        os.replace(temporary, path)
+    except BaseException:
+        Path(temporary).unlink(missing_ok=True)
+        raise
+
+
+@contextmanager
+def _lock(path: Path, timeout: float = 30, stale_after: float = 120) -> Iterator[None]:
+    """Exclusive lock between processes, by creating ``path`` with the host and
+    pid of its holder. A lock whose holder no longer runs (or older than
+    ``stale_after`` seconds, e.g. held from another host) was left by a crashed
+    process and is taken over.
+
+    :raises TimeoutError: When another process holds the lock for ``timeout``.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            descriptor = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if _left_behind(path, stale_after):
+                path.unlink(missing_ok=True)
+                continue
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"{path} is held by another process")
+            time.sleep(0.01)
+            continue
+        with os.fdopen(descriptor, "w") as file:
+            file.write(f"{socket.gethostname()}:{os.getpid()}")
+        break
+    try:
+        yield
+    finally:
+        path.unlink(missing_ok=True)
+
+
+def _left_behind(path: Path, stale_after: float) -> bool:
+    """Whether the lock at ``path`` is held by no running process."""
+    try:
+        age = time.time() - path.stat().st_mtime
+        host, _, pid = path.read_text().rpartition(":")
+    except FileNotFoundError:
+        return False
+    if age > stale_after:
+        return True
+    # the holder may not have written itself yet, other hosts' pids mean nothing and
+    # os.kill(pid, 0) is no probe on Windows
+    if host != socket.gethostname() or not pid.isdigit() or os.name == "nt":
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
@@ -0,0 +1,114 @@
+import logging
+import re
+from collections import deque
+from typing import Optional, Union
+
+from selenium.webdriver import Chrome, Edge, Firefox
+from selenium.webdriver.common.bidi.script import ConsoleLogEntry, JavaScriptLogEntry
+from selenium.webdriver.common.bidi.session import session_subscribe
+
+logger = logging.getLogger(__name__)
+
+NETWORK_EVENTS = ("network.responseCompleted", "network.fetchError")
+
+
+class _BidiEvent:
+    """Event descriptor for the BiDi websocket connection, handing the raw
+    event parameters to the callback (selenium only ships descriptors for log
+    events)."""
+
+    def __init__(self, event_class: str):
+        self.event_class = event_class
+
+    @staticmethod
+    def from_json(json: dict) -> dict:
+        return json
+
+
+class BidiEventCapture:
+    """Streams network and console events of a browser session into bounded
+    ring buffers while the test runs.
+
+    Replaces dumping the whole ``performance`` and ``browser`` logs after a
+    failure: events are filtered as they arrive and only the last
+    ``max_events`` of each kind are kept, so the browser does not have to
+    buffer a verbose performance log for every test.
+
+    :param driver: Driver created with ``enable_bidi``.
+    :param max_events: Ring buffer size per event kind.
+    :param url_pattern: Regular expression network request URLs must match.
+    :param initiator_types: Request initiator types to keep (e.g. XHR and
+        fetch calls), ``None`` keeps all requests.
+    """
+
+    def __init__(
+        self,
+        driver: Union[Chrome, Firefox, Edge],
+        max_events: int = 500,
+        url_pattern: Optional[str] = None,
+        initiator_types: Optional[tuple[str, ...]] = ("xmlhttprequest", "fetch"),
+    ):
+        self.driver = driver
+        self.url_pattern = re.compile(url_pattern) if url_pattern else None
+        self.initiator_types = initiator_types
+        self._network: deque[dict] = deque(maxlen=max_events)
+        self._console: deque[dict] = deque(maxlen=max_events)
+
+    @classmethod
+    def start(cls, driver: Union[Chrome, Firefox, Edge], **kwargs):
+        """Subscribe to the events of ``driver``.
+
+        :return: The capture, or ``None`` when the session has no BiDi
+            connection (e.g. it was created without ``enable_bidi``).
+        """
+        capture = cls(driver, **kwargs)
+        try:
+            script = driver.script
+            script.add_console_message_handler(capture._on_log_entry)
+            script.add_javascript_error_handler(capture._on_log_entry)
+            connection = driver._websocket_connection
+            connection.execute(session_subscribe(*NETWORK_EVENTS))
+            for event in NETWORK_EVENTS:
+                connection.add_callback(_BidiEvent(event), capture._on_network_event)
+        # the websocket connection raises plain exceptions for BiDi errors
+        except Exception as e:
+            logger.warning("BiDi event capture is not available: %s", e)
+            return None
+        return capture
+
+    def clear(self) -> None:
+        """Drop the events of the previous test."""
+        self._network.clear()
+        self._console.clear()
+
+    def network_events(self) -> list[dict]:
+        return list(self._network)
+
+    def console_messages(self) -> list[dict]:
+        return list(self._console)
+
+    def _on_network_event(self, params: dict) -> None:
+        request = params.get("request", {})
+        if self.url_pattern and not self.url_pattern.search(request.get("url", "")):
+            return
+        initiator_type = request.get("initiatorType")
+        if (
+            self.initiator_types
+            and initiator_type
+            and initiator_type not in self.initiator_types
+        ):
+            return
+        self._network.append(params)
+
+    def _on_log_entry(
+        self, log_entry: Union[ConsoleLogEntry, JavaScriptLogEntry]
+    ) -> None:
+        # same keys as the entries of driver.get_log("browser")
+        self._console.append(
+            {
+                "level": log_entry.level,
+                "message": log_entry.text,
+                "source": log_entry.type_,
+                "timestamp": log_entry.timestamp,
+            }
+        )
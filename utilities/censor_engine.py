@@ -0,0 +1,103 @@
+from dataclasses import dataclass
+from typing import Iterable, Optional, Union
+
+from selenium.webdriver import Chrome, Edge, Firefox
+
+# walks the text nodes of the page once and applies every rule to each of them, text of
+# scripts, styles and editable fields is left alone
+CENSOR_SCRIPT = """
+const rules = arguments[0].map(([name, pattern, replacement, flags]) => ({
+  name: name,
+  regex: new RegExp(pattern, flags.includes("g") ? flags : flags + "g"),
+  replacement: replacement,
+}));
+const counts = Object.fromEntries(rules.map((rule) => [rule.name, 0]));
+const SKIPPED = new Set(["SCRIPT", "STYLE", "NOSCRIPT", "TEXTAREA", "TEMPLATE"]);
+const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT, {
+  acceptNode: (node) => {
+    const parent = node.parentElement;
+    if (!parent || SKIPPED.has(parent.tagName) || parent.isContentEditable) {
+      return NodeFilter.FILTER_REJECT;
+    }
+    return node.nodeValue.trim() ? NodeFilter.FILTER_ACCEPT : NodeFilter.FILTER_REJECT;
+  },
+});
+for (let node = walker.nextNode(); node; node = walker.nextNode()) {
+  let text = node.nodeValue;
+  for (const rule of rules) {
+    text = text.replace(rule.regex, () => {
+      counts[rule.name]++;
+      return rule.replacement;
+    });
+  }
+  if (text !== node.nodeValue) node.nodeValue = text;
+}
+return counts;
+"""
+
+_MONTHS = "Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec"
+
+
+@dataclass(frozen=True)
+class CensorRule:
+    """Text replaced on the page before it is compared.
+
+    :param name: Name of the rule, the key of its count.
+    :param pattern: Regular expression, in the syntax of JavaScript (which
+        the usual Python patterns without named groups or lookbehinds are).
+    :param replacement: Text of every match.
+    :param flags: JavaScript flags of the expression, e.g. ``i``; ``g`` is
+        always added.
+    """
+
+    name: str
+    pattern: str
+    replacement: str
+    flags: str = ""
+
+
+DATE_RULES = (
+    CensorRule("date", rf"({_MONTHS}) [0-3]?[0-9], [0-9]{{4}}", "mmm dd, yyyy"),
+    CensorRule("day", rf"({_MONTHS}) [0-3]?[0-9]\b", "mmm dd"),
+)
+TIME_RULES = (CensorRule("time", r"\d{1,2}:\d{1,2} (AM|PM)", "hh:mm AA"),)
+CARD_EXPIRATION_RULES = (
+    CensorRule("card_expiration", r"Expires \d{1,2}/\d{2,4}", "Expires mm/dddd"),
+)
+DEFAULT_RULES = TIME_RULES + DATE_RULES + CARD_EXPIRATION_RULES
+
+
+class CensorEngine:
+    """Replaces the volatile text of a page (dates, times, ...) before it is
+    compared with a baseline.
+
+    All rules are applied in a single walk over the text nodes of the page,
+    one ``execute_script`` however many rules and matches there are. Only
+    the text nodes change, so the markup and the listeners of the page stay.
+
+    :param rules: Rules applied in order, :data:`DEFAULT_RULES` by default.
+    """
+
+    def __init__(self, rules: Optional[Iterable[CensorRule]] = None):
+        self.rules: list[CensorRule] = list(DEFAULT_RULES if rules is None else rules)
+
+    def add_rule(self, rule: CensorRule) -> "CensorEngine":
+        self.rules.append(rule)
+        return self
+
+    def censor(
+        self,
+        driver: Union[Chrome, Firefox, Edge],
+        rules: Optional[Iterable[CensorRule]] = None,
+    ) -> dict[str, int]:
+        """Apply ``rules`` (all rules of the engine by default) to the page.
+
+        :return: The number of replacements per rule name.
+        """
+        rules = self.rules if rules is None else list(rules)
+        if not rules:
+            return {}
+        arguments = [
+            [rule.name, rule.pattern, rule.replacement, rule.flags] for rule in rules
+        ]
+        return driver.execute_script(CENSOR_SCRIPT, arguments)
@@ -0,0 +1,237 @@
+import json
+import sys
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from _pytest.reports import TestReport
+from _pytest.terminal import TerminalReporter
+from selenium.webdriver.remote.webdriver import WebDriver
+
+# page objects, helpers and tests in these directories are reported as callers
+_REPO_ROOT = Path(__file__).absolute().parent.parent
+_CALLER_DIRECTORIES = ("pages", "utilities", "tests")
+# infrastructure every page object goes through, the page object (or test) using it is
+# the caller
+_SKIPPED_MODULES = frozenset(
+    {
+        "command_profiler.py",
+        "driver_pool.py",
+        "element_cache.py",
+        "page_batch.py",
+        "wait_engine.py",
+    }
+)
+
+USER_PROPERTY = "command_profile"
+
+
+@dataclass
+class CommandRecord:
+    """A single WebDriver (or CDP, as ``cdp:<command>``) command."""
+
+    command: str
+    caller: str
+    started_ms: float
+    duration_ms: float
+    payload_bytes: int
+    response_bytes: int
+
+
+@dataclass
+class CommandStats:
+    count: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    payload_bytes: int = 0
+    response_bytes: int = 0
+
+    def add(self, duration_ms: float, payload_bytes: int, response_bytes: int) -> None:
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        self.payload_bytes += payload_bytes
+        self.response_bytes += response_bytes
+
+
+def _caller() -> str:
+    """The innermost page object, helper or test function on the stack, past the
+    waits, caches and batches of the infrastructure modules."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        path = Path(frame.f_code.co_filename)
+        if (
+            path.parent.name in _CALLER_DIRECTORIES
+            and path.parent.parent == _REPO_ROOT
+            and path.name not in _SKIPPED_MODULES
+        ):
+            owner = frame.f_locals.get("self")
+            if owner is not None:
+                return f"{type(owner).__name__}.{frame.f_code.co_name}"
+            return f"{path.stem}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "<selenium>"
+
+
+class CommandProfiler:
+    """Records every command sent through the command executor of a driver.
+
+    Each command is recorded with its name, latency, the size of its payload
+    and response, and the innermost page object method (or helper, or test)
+    that sent it - e.g. ``BasePage._highlight_element`` or
+    ``DriverEventListener.after_find``. Records are kept per test between
+    :meth:`start` and :meth:`stop`.
+
+    One profiler serves all drivers of a worker, drivers are instrumented
+    once with :meth:`install` and stay instrumented when they are pooled.
+    """
+
+    def __init__(self):
+        self.records: list[CommandRecord] = []
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def install(self, driver: WebDriver) -> None:
+        # EventFiringWebDriver delegates the commands to the driver it wraps
+        driver = getattr(driver, "wrapped_driver", driver)
+        executor = driver.command_executor
+        if getattr(executor, "_command_profiler", None) is self:
+            return
+        execute = executor.execute
+
+        def profiled_execute(command: str, params: dict):
+            caller = _caller()
+            started = time.perf_counter()
+            response = execute(command, params)
+            finished = time.perf_counter()
+            if command == "executeCdpCommand":
+                command = f"cdp:{params.get('cmd')}"
+            self._record(
+                CommandRecord(
+                    command=command,
+                    caller=caller,
+                    started_ms=(started - self._started) * 1000,
+                    duration_ms=(finished - started) * 1000,
+                    payload_bytes=_size(params),
+                    response_bytes=_size(response and response.get("value")),
+                )
+            )
+            return response
+
+        executor.execute = profiled_execute
+        executor._command_profiler = self
+
+    def start(self) -> None:
+        """Start recording the commands of a test."""
+        with self._lock:
+            self.records = []
+            self._started = time.perf_counter()
+
+    def stop(self) -> list[CommandRecord]:
+        """Stop recording and return the commands of the test."""
+        with self._lock:
+            records, self.records = self.records, []
+        return records
+
+    def _record(self, record: CommandRecord) -> None:
+        with self._lock:
+            self.records.append(record)
+
+
+def _size(value) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    return len(json.dumps(value, default=str))
+
+
+def aggregate(records: list[CommandRecord], key: str) -> dict[str, CommandStats]:
+    """Statistics of the records per ``command``, ``caller`` or ``both``."""
+    stats = defaultdict(CommandStats)
+    for record in records:
+        name = {
+            "command": record.command,
+            "caller": record.caller,
+            "both": f"{record.caller} -> {record.command}",
+        }[key]
+        stats[name].add(record.duration_ms, record.payload_bytes, record.response_bytes)
+    return dict(sorted(stats.items(), key=lambda item: item[1].total_ms, reverse=True))
+
+
+def format_table(stats: dict[str, CommandStats], title: str) -> str:
+    """Aligned text table of ``stats``, slowest first."""
+    width = max([len(title), *map(len, stats)])
+    lines = [
+        f"{title:<{width}}  {'count':>6}  {'total ms':>10}  {'max ms':>9}  "
+        f"{'sent B':>9}  {'received B':>11}"
+    ]
+    for name, stat in stats.items():
+        lines.append(
+            f"{name:<{width}}  {stat.count:>6}  {stat.total_ms:>10.1f}  "
+            f"{stat.max_ms:>9.1f}  {stat.payload_bytes:>9}  {stat.response_bytes:>11}"
+        )
+    return "\n".join(lines)
+
+
+class CommandProfileSummary:
+    """Pytest plugin reporting the slowest commands and callers of the session.
+
+    Registered on the xdist controller (or the only process when running
+    serially). The workers send the per test aggregates in the
+    ``command_profile`` user property.
+
+    :param limit: Rows of each table.
+    """
+
+    def __init__(self, limit: int = 15):
+        self.limit = limit
+        self.commands: dict[str, CommandStats] = defaultdict(CommandStats)
+        self.callers: dict[str, CommandStats] = defaultdict(CommandStats)
+
+    def pytest_runtest_logreport(self, report: TestReport) -> None:
+        if report.when != "teardown":
+            return
+        for name, value in report.user_properties:
+            if name != USER_PROPERTY:
+                continue
+            for target, stats in (
+                (self.commands, value["commands"]),
+                (self.callers, value["callers"]),
+            ):
+                for key, stat in stats.items():
+                    merged = target[key]
+                    merged.count += stat["count"]
+                    merged.total_ms += stat["total_ms"]
+                    merged.max_ms = max(merged.max_ms, stat["max_ms"])
+                    merged.payload_bytes += stat["payload_bytes"]
+                    merged.response_bytes += stat["response_bytes"]
+
+    def pytest_terminal_summary(self, terminalreporter: TerminalReporter) -> None:
+        if not self.commands:
+            return
+        terminalreporter.section("WebDriver commands")
+        for stats, title in ((self.commands, "command"), (self.callers, "caller")):
+            slowest = sorted(
+                stats.items(), key=lambda item: item[1].total_ms, reverse=True
+            )
+            terminalreporter.write_line(
+                format_table(dict(slowest[: self.limit]), title)
+            )
+            terminalreporter.write_line("")
+
+
+def profile_property(records: list[CommandRecord]) -> Optional[tuple[str, dict]]:
+    """The per test aggregates sent to :class:`CommandProfileSummary`."""
+    if not records:
+        return None
+    return (
+        USER_PROPERTY,
+        {
+            key: {name: vars(stat) for name, stat in aggregate(records, kind).items()}
+            for key, kind in (("commands", "command"), ("callers", "caller"))
+        },
+    )
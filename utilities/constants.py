@@ -5,4 +5,8 @@ class Constants:
     AUTOMATION_USER_AGENT: str = "automation"
     DATA_PATH: Path = Path(Path(__file__).absolute().parent.parent, "data")
     CHROME_DOWNLOAD_DIRECTORY: Path = DATA_PATH / "downloads"
+    BASELINES_PATH: Path = DATA_PATH / "baselines"
     DIFF_TOLERANCE_PERCENT: float = 0.01
+    DURATIONS_STORE_PATH: Path = Path(
+        Path(__file__).absolute().parent.parent, ".test_phase_durations.json"
+    )
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import Optional
 
 from dataclasses_json import dataclass_json
 
@@ -16,8 +17,8 @@ class Login:
 
 @dataclass
 class ValidUser:
-    email: str
-    password: str
+    email: Optional[str]
+    password: Optional[str]
 
 @dataclass
 class Workspace:
@@ -38,3 +39,4 @@ class Data:
     forgot_password: ForgotPassword
     login: Login
     valid_user: ValidUser
+    workspace: Workspace
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import struct
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+from utilities.constants import Constants
+from utilities.data import Data
+from utilities.excel_parser import ExcelParser
+
+MAGIC = b"TDS1"
+# bumped whenever the layout of the snapshot changes
+SNAPSHOT_VERSION = 1
+_HEADER = struct.Struct("<4sI")
+
+
+def _excel_section(path: Path, sheet_name: str) -> str:
+    return f"{path.name}:{sheet_name}"
+
+
+class DataRegistry:
+    """Test data of all sources, compiled into a single binary snapshot.
+
+    The JSON sources contribute their top level sections, the Excel sources
+    one section per sheet (``data.xls:Emails``, columns by header). The
+    snapshot is named after the digest of the sources' content, it is
+    compiled once - by the xdist controller before the workers start - and
+    every process then memory-maps it, unpickling a section only when it is
+    first used. Nothing is parsed from JSON or Excel again until a source
+    changes.
+
+    :param json_sources: JSON files, relative to the data directory.
+    :param excel_sources: Excel files, relative to the data directory.
+    :param snapshot_directory: Directory of the snapshots.
+    """
+
+    def __init__(
+        self,
+        json_sources: Iterable[str] = ("tests_data.json",),
+        excel_sources: Iterable[str] = ("data.xls",),
+        snapshot_directory: Path = Constants.DATA_PATH / ".snapshots",
+    ):
+        self.json_sources = [Constants.DATA_PATH / source for source in json_sources]
+        self.excel_sources = [Constants.DATA_PATH / source for source in excel_sources]
+        self.snapshot_directory = Path(snapshot_directory)
+        self._index: Optional[dict[str, tuple[int, int]]] = None
+        self._map: Optional[mmap.mmap] = None
+        self._sections: dict[str, Any] = {}
+        self._lookups: dict[tuple[str, str], dict[Any, int]] = {}
+        self._data_offset = 0
+        self._lock = threading.Lock()
+
+    @property
+    def digest(self) -> str:
+        """Digest of the content of all sources, names the snapshot."""
+        digest = hashlib.sha256(f"v{SNAPSHOT_VERSION}".encode())
+        for path in sorted(self.json_sources + self.excel_sources):
+            digest.update(path.name.encode())
+            digest.update(path.read_bytes())
+        return digest.hexdigest()
+
+    @property
+    def snapshot_path(self) -> Path:
+        return self.snapshot_directory / f"{self.digest[:16]}.bin"
+
+    def compile(self) -> Path:
+        """Write the snapshot of the current sources, unless it exists."""
+        path = self.snapshot_path
+        if path.exists():
+            return path
+        sections: dict[str, Any] = {}
+        for source in self.json_sources:
+            with open(source, encoding="utf-8") as json_file:
+                sections.update(json.load(json_file))
+        for source in self.excel_sources:
+            parser = ExcelParser(source)
+            for sheet_name in parser.sheet_names():
+                sections[_excel_section(source, sheet_name)] = parser.read_columns(
+                    sheet_name
+                )
+        payloads = {
+            name: pickle.dumps(section, protocol=pickle.HIGHEST_PROTOCOL)
+            for name, section in sections.items()
+        }
+        index, offset = {}, 0
+        for name, payload in payloads.items():
+            index[name] = (offset, len(payload))
+            offset += len(payload)
+        index_bytes = json.dumps(index).encode()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # workers may compile the same snapshot at once
+        descriptor, temporary = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(descriptor, "wb") as file:
+            file.write(_HEADER.pack(MAGIC, len(index_bytes)))
+            file.write(index_bytes)
+            for payload in payloads.values():
+                file.write(payload)
+        os.replace(temporary, path)
+        return path
+
+    def sections(self) -> list[str]:
+        with self._lock:
+            self._open()
+            return list(self._index)
+
+    def section(self, name: str) -> Any:
+        """The section ``name``: a JSON section as parsed, an Excel sheet as
+        its columns by header."""
+        with self._lock:
+            if name not in self._sections:
+                self._open()
+                offset, length = self._index[name]
+                start = self._data_offset + offset
+                self._sections[name] = pickle.loads(self._map[start : start + length])
+            return self._sections[name]
+
+    def rows(self, name: str) -> list[dict[str, Any]]:
+        """The rows of an Excel section, keyed by header."""
+        columns = self.section(name)
+        return [dict(zip(columns, row)) for row in zip(*columns.values())]
+
+    def lookup(self, name: str, column: str, key: Any) -> Optional[dict[str, Any]]:
+        """The first row of an Excel section whose ``column`` is ``key``.
+
+        The section is indexed by the column on the first lookup, following
+        lookups cost a dictionary access however large the sheet is.
+        """
+        columns = self.section(name)
+        with self._lock:
+            index = self._lookups.get((name, column))
+            if index is None:
+                index = {}
+                for row, value in enumerate(columns[column]):
+                    index.setdefault(value, row)
+                self._lookups[(name, column)] = index
+        row = index.get(key)
+        if row is None:
+            return None
+        return {header: values[row] for header, values in columns.items()}
+
+    def data(self) -> Data:
+        """The JSON sections as :class:`Data`.
+
+        The valid user comes from the ``EMAIL`` and ``PASSWORD`` environment
+        variables unless a source has it - secrets are never compiled into
+        the snapshot.
+        """
+        available = self.sections()
+        sections = {
+            name: self.section(name)
+            for name in Data.__dataclass_fields__
+            if name in available
+        }
+        sections.setdefault(
+            "valid_user",
+            {"email": os.getenv("EMAIL"), "password": os.getenv("PASSWORD")},
+        )
+        return Data.from_dict(sections)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+
+    def _open(self) -> None:
+        if self._map is not None:
+            return
+        path = self.compile()
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, index_length = _HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a test data snapshot")
+        start = _HEADER.size
+        self._index = json.loads(self._map[start : start + index_length])
+        self._data_offset = start + index_length
@@ -0,0 +1,200 @@
+import csv
+import itertools
+import json
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterator, Optional, Sequence, Union
+
+import pytest
+from _pytest.mark import Mark
+
+from utilities.constants import Constants
+from utilities.excel_parser import ExcelParser
+
+DATA_SOURCE_MARKER = "data_source"
+# seed of the row hash assigning shards, independent of the sampling hash
+_SHARD_SEED = 0x5EED
+
+
+def parse_rows(rows: Union[None, str, Sequence[int]]) -> tuple[int, Optional[int]]:
+    """A row range ``"start:stop"`` (either side may be left out) or
+    ``(start, stop)``."""
+    if rows is None:
+        return 0, None
+    if isinstance(rows, str):
+        start, _, stop = rows.partition(":")
+        return int(start or 0), int(stop) if stop else None
+    start, stop = rows
+    return start, stop
+
+
+def parse_shard(shard: Optional[str]) -> Optional[tuple[int, int]]:
+    """A shard ``"index/count"``, e.g. ``2/4`` for the second of four."""
+    if not shard:
+        return None
+    index, _, count = shard.partition("/")
+    if not 1 <= int(index) <= int(count):
+        raise ValueError(f"Invalid data shard {shard}, expected index/count")
+    return int(index) - 1, int(count)
+
+
+@dataclass(frozen=True)
+class _Row:
+    index: int
+    values: tuple
+    key: bytes
+
+
+class DataSource:
+    """Rows of a CSV, JSON-lines or Excel file as test parameters.
+
+    Rows are streamed from the file: only the rows within ``rows`` are
+    looked at, a row is kept with the probability ``sample`` by a hash of
+    its content (the same rows on every run and every machine) and with
+    ``shard`` only the rows hashed into that shard are kept - JSON-lines
+    rows outside of the range, the sample or the shard are never even
+    parsed. Test ids are the row numbers, or the values of ``id_column``.
+
+    :param path: The file, relative to the data directory; CSV and Excel
+        sheets start with a header row.
+    :param argnames: Names of the columns to pass, all by default.
+    :param sheet: Sheet of an Excel file, the first by default.
+    :param rows: Range of rows (``"start:stop"``, 0 is the first data row).
+    :param sample: Share of the rows to keep, between 0 and 1.
+    :param seed: Changes which rows the sample keeps.
+    :param shard: ``(index, count)`` of the shard to keep the rows of,
+        index from 0.
+    :param id_column: Column naming the test ids.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        argnames: Union[None, str, Sequence[str]] = None,
+        sheet: Optional[str] = None,
+        rows: Union[None, str, Sequence[int]] = None,
+        sample: float = 1.0,
+        seed: int = 0,
+        shard: Optional[tuple[int, int]] = None,
+        id_column: Optional[str] = None,
+    ):
+        self.path = Constants.DATA_PATH / path
+        if isinstance(argnames, str):
+            argnames = [name.strip() for name in argnames.split(",")]
+        self.argnames = list(argnames) if argnames else None
+        self.sheet = sheet
+        self.start, self.stop = parse_rows(rows)
+        self.sample = sample
+        self.seed = seed
+        self.shard = shard
+        self.id_column = id_column
+
+    @classmethod
+    def from_marker(
+        cls, marker: Mark, sample: Optional[float], shard: Optional[tuple[int, int]]
+    ) -> "DataSource":
+        """The source of a ``data_source`` marker, sampled and sharded as
+        given on the command line unless the marker says otherwise."""
+        kwargs = dict(marker.kwargs)
+        if sample is not None:
+            kwargs.setdefault("sample", sample)
+        kwargs.setdefault("shard", shard)
+        return cls(*marker.args, **kwargs)
+
+    def parametrize(self, metafunc: pytest.Metafunc) -> None:
+        columns = self.columns()
+        argnames = self.argnames or columns
+        missing = set(argnames) - set(columns)
+        if missing:
+            raise ValueError(f"{self.path.name} has no columns {sorted(missing)}")
+        positions = [columns.index(name) for name in argnames]
+        id_position = columns.index(self.id_column) if self.id_column else None
+        stem = self.path.stem
+        metafunc.parametrize(
+            argnames,
+            [
+                pytest.param(
+                    *(row.values[position] for position in positions),
+                    id=(
+                        str(row.values[id_position])[:60]
+                        if id_position is not None
+                        else f"{stem}-{row.index}"
+                    ),
+                )
+                for row in self.rows()
+            ],
+        )
+
+    def columns(self) -> list[str]:
+        match self.path.suffix.lower():
+            case ".csv":
+                with open(self.path, newline="", encoding="utf-8") as file:
+                    return next(csv.reader(file), [])
+            case ".jsonl":
+                with open(self.path, "rb") as file:
+                    first = next((line for line in file if line.strip()), b"{}")
+                return list(json.loads(first))
+            case _:
+                parser = ExcelParser(self.path)
+                return parser.read_headers(self._sheet(parser))
+
+    def rows(self) -> Iterator[_Row]:
+        """The rows of the range, sample and shard, in file order."""
+        match self.path.suffix.lower():
+            case ".csv":
+                return self._csv_rows()
+            case ".jsonl":
+                return self._jsonl_rows()
+            case _:
+                return self._excel_rows()
+
+    def _keep(self, key: bytes) -> bool:
+        if self.sample < 1 and zlib.crc32(key, self.seed) / 2**32 >= self.sample:
+            return False
+        if self.shard:
+            index, count = self.shard
+            # the high bits, the low bits of CRC-32 follow the structure of the rows
+            return zlib.crc32(key, _SHARD_SEED) * count >> 32 == index
+        return True
+
+    def _range(self, rows: Iterator) -> Iterator[tuple[int, Any]]:
+        return zip(
+            itertools.count(self.start), itertools.islice(rows, self.start, self.stop)
+        )
+
+    def _csv_rows(self) -> Iterator[_Row]:
+        with open(self.path, newline="", encoding="utf-8") as file:
+            reader = csv.reader(file)
+            columns = next(reader, [])
+            for index, values in self._range(values for values in reader if values):
+                if len(values) != len(columns):
+                    raise ValueError(
+                        f"{self.path.name} line {reader.line_num} (row {index}) has "
+                        f"{len(values)} values for {len(columns)} columns"
+                    )
+                key = "\x1f".join(values).encode()
+                if self._keep(key):
+                    yield _Row(index, tuple(values), key)
+
+    def _jsonl_rows(self) -> Iterator[_Row]:
+        # by name, the objects of a file need not list their keys in the same order
+        columns = self.columns()
+        with open(self.path, "rb") as file:
+            lines = (line for line in file if line.strip())
+            for index, line in self._range(lines):
+                key = line.rstrip()
+                if self._keep(key):
+                    row = json.loads(line)
+                    yield _Row(index, tuple(row.get(name) for name in columns), key)
+
+    def _excel_rows(self) -> Iterator[_Row]:
+        parser = ExcelParser(self.path)
+        for index, row in self._range(parser.iter_rows(self._sheet(parser))):
+            values = tuple(row.values())
+            key = repr(values).encode()
+            if self._keep(key):
+                yield _Row(index, values, key)
+
+    def _sheet(self, parser: ExcelParser) -> str:
+        return self.sheet or parser.sheet_names()[0]
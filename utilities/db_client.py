@@ -0,0 +1,353 @@
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Any, Iterator, Optional, Sequence
+
+DB_BACKENDS = ("mysql", "sqlite")
+
+logger = logging.getLogger(__name__)
+
+Row = tuple[Any, ...]
+
+
+@dataclass(frozen=True)
+class DatabaseConfig:
+    """Where the database is, read from the ``DB_*`` environment variables.
+
+    :param backend: ``mysql``, or ``sqlite`` - a local stand-in needing no
+        server, ``database`` is then a file or ``:memory:``.
+    :param seed: SQL script run when an empty SQLite database is opened.
+    """
+
+    backend: str = "mysql"
+    host: str = "localhost"
+    port: int = 3306
+    user: str = "root"
+    password: str = ""
+    database: str = "world"
+    seed: Optional[Path] = None
+
+    @classmethod
+    def from_env(cls, backend: Optional[str] = None, **overrides) -> "DatabaseConfig":
+        backend = backend or os.getenv("DB_BACKEND", "mysql")
+        default_database = ":memory:" if backend == "sqlite" else "world"
+        return cls(
+            backend=backend,
+            host=os.getenv("DB_HOST", "localhost"),
+            port=int(os.getenv("DB_PORT", "3306")),
+            user=os.getenv("DB_USER", "root"),
+            password=os.getenv("DB_PASSWORD", ""),
+            database=os.getenv("DB_NAME", default_database),
+            **overrides,
+        )
+
+
+@dataclass
+class QueryMetrics:
+    queries: int = 0
+    cache_hits: int = 0
+    prepared_hits: int = 0
+    errors: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    connections: int = 0
+    # total milliseconds per statement
+    statements_ms: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def average_ms(self) -> float:
+        return self.total_ms / self.queries if self.queries else 0.0
+
+    def slowest(self, count: int = 3) -> list[tuple[str, float]]:
+        return sorted(self.statements_ms.items(), key=lambda item: -item[1])[:count]
+
+    def merge(self, other: "QueryMetrics") -> None:
+        """Add the metrics of another client, e.g. of another xdist worker."""
+        for name in ("queries", "cache_hits", "prepared_hits", "errors", "connections"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.total_ms += other.total_ms
+        self.max_ms = max(self.max_ms, other.max_ms)
+        for sql, total_ms in other.statements_ms.items():
+            self.statements_ms[sql] = self.statements_ms.get(sql, 0.0) + total_ms
+
+
+class _PooledConnection:
+    """A connection of the pool with its prepared statements, one cursor per
+    statement (least recently used closed first)."""
+
+    def __init__(self, connection: Any, prepared: bool, cache_size: int):
+        self.connection = connection
+        self.prepared = prepared
+        self.cache_size = cache_size
+        self.statements: OrderedDict[str, tuple[str, Any]] = OrderedDict()
+
+    def cursor(self, sql: str) -> tuple[Any, str, bool]:
+        """The cursor of ``sql``, the SQL to execute with it and whether it
+        was prepared before.
+
+        The SQL is the one the cursor was prepared with: MySQL cursors only
+        reuse their statement for the very same string object.
+        """
+        cached = self.statements.get(sql)
+        if cached is not None:
+            self.statements.move_to_end(sql)
+            sql, cursor = cached
+            return cursor, sql, True
+        cursor = (
+            self.connection.cursor(prepared=True)
+            if self.prepared
+            else self.connection.cursor()
+        )
+        self.statements[sql] = (sql, cursor)
+        if len(self.statements) > self.cache_size:
+            _, (_, evicted) = self.statements.popitem(last=False)
+            evicted.close()
+        return cursor, sql, False
+
+    def close(self) -> None:
+        try:
+            for _, cursor in self.statements.values():
+                cursor.close()
+        finally:
+            self.statements.clear()
+            self.connection.close()
+
+
+class DatabaseClient:
+    """Pooled access to the database of the tests.
+
+    Connections are opened on demand, up to ``pool_size``, and reused by the
+    following queries - every xdist worker has its own client and pool.
+    Statements are prepared once per connection (MySQL server side prepared
+    statements, SQLite's statement cache) and kept for the next execution
+    of the same SQL. Queries use ``?`` placeholders.
+
+    Results of the read-only queries made with ``cache=True`` are kept for
+    the session, until :meth:`invalidate` - e.g. after a test changed the
+    data. Every query is timed, see :meth:`metrics`.
+
+    :param config: The database, from the environment by default.
+    :param pool_size: Connections kept open at most.
+    :param statement_cache_size: Prepared statements kept per connection.
+    :param timeout: Seconds to wait for a free connection of a full pool.
+    """
+
+    def __init__(
+        self,
+        config: Optional[DatabaseConfig] = None,
+        pool_size: int = 2,
+        statement_cache_size: int = 32,
+        timeout: float = 30,
+    ):
+        self.config = config or DatabaseConfig.from_env()
+        if self.config.backend not in DB_BACKENDS:
+            raise ValueError(f"Unsupported database backend {self.config.backend}")
+        self.pool_size = pool_size
+        self.statement_cache_size = statement_cache_size
+        self.timeout = timeout
+        self._idle: queue.LifoQueue[_PooledConnection] = queue.LifoQueue()
+        self._opened = 0
+        self._cache: dict[tuple[str, Row], list[Row]] = {}
+        self._metrics = QueryMetrics()
+        self._lock = threading.Lock()
+        # a shared in-memory database lives as long as one of its connections
+        self._memory_name = f"file:db_client_{id(self)}?mode=memory&cache=shared"
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """A connection of the pool, for the duration of the block."""
+        with self._pooled() as pooled:
+            yield pooled.connection
+
+    def query(self, sql: str, params: Sequence = (), cache: bool = False) -> list[Row]:
+        """The rows of a query.
+
+        :param cache: Keep the rows for the session, for read-only queries
+            whose data the tests do not change.
+        """
+        key = (sql, tuple(params))
+        if cache:
+            with self._lock:
+                if key in self._cache:
+                    self._metrics.cache_hits += 1
+                    return list(self._cache[key])
+        with self._pooled() as pooled, self._statement(pooled, sql, params) as cursor:
+            rows = [tuple(row) for row in cursor.fetchall()]
+        if cache:
+            with self._lock:
+                self._cache[key] = rows
+        return list(rows)
+
+    def query_value(self, sql: str, params: Sequence = (), cache: bool = False) -> Any:
+        """The first column of the first row of a query, None without rows."""
+        rows = self.query(sql, params, cache)
+        return rows[0][0] if rows else None
+
+    def iterate(
+        self, sql: str, params: Sequence = (), batch_size: int = 1000
+    ) -> Iterator[list[Row]]:
+        """Stream the rows of a query in batches of ``batch_size``.
+
+        Rows are fetched from the server as they are iterated (unbuffered,
+        never the whole result at once), the connection stays taken until
+        the iteration ends. A MySQL connection left with unread rows, when
+        the iteration is stopped early, is closed instead of reused.
+        """
+        with self._pooled() as pooled, self._statement(pooled, sql, params) as cursor:
+            while batch := cursor.fetchmany(batch_size):
+                yield [tuple(row) for row in batch]
+
+    def execute(self, sql: str, params: Sequence = ()) -> int:
+        """Run a statement changing the data and commit it.
+
+        Cached query results are not invalidated, see :meth:`invalidate`.
+
+        :return: Rows affected.
+        """
+        with self._pooled() as pooled:
+            with self._statement(pooled, sql, params) as cursor:
+                rowcount = cursor.rowcount
+            pooled.connection.commit()
+        return rowcount
+
+    def invalidate(self, sql: Optional[str] = None) -> None:
+        """Forget the cached results of ``sql``, or of all queries."""
+        with self._lock:
+            if sql is None:
+                self._cache.clear()
+            else:
+                for key in [key for key in self._cache if key[0] == sql]:
+                    del self._cache[key]
+
+    def metrics(self) -> QueryMetrics:
+        with self._lock:
+            return replace(
+                self._metrics, statements_ms=dict(self._metrics.statements_ms)
+            )
+
+    def close(self) -> None:
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(pooled)
+
+    @contextmanager
+    def _statement(
+        self, pooled: _PooledConnection, sql: str, params: Sequence
+    ) -> Iterator[Any]:
+        """The cursor of ``sql`` executed with ``params``, timed until the
+        block ends."""
+        cursor, sql, prepared = pooled.cursor(sql)
+        started = time.perf_counter()
+        try:
+            cursor.execute(sql, tuple(params))
+            yield cursor
+        except Exception:
+            with self._lock:
+                self._metrics.errors += 1
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                metrics = self._metrics
+                metrics.queries += 1
+                metrics.prepared_hits += prepared
+                metrics.total_ms += elapsed_ms
+                metrics.max_ms = max(metrics.max_ms, elapsed_ms)
+                metrics.statements_ms[sql] = (
+                    metrics.statements_ms.get(sql, 0.0) + elapsed_ms
+                )
+
+    @contextmanager
+    def _pooled(self) -> Iterator[_PooledConnection]:
+        pooled = self._acquire()
+        try:
+            yield pooled
+        except Exception:
+            # the connection may be broken or mid-transaction, not reused
+            self._discard(pooled)
+            raise
+        except GeneratorExit:
+            # a streamed query stopped early, MySQL would send its other rows next
+            if pooled.prepared:
+                self._discard(pooled)
+            else:
+                self._idle.put(pooled)
+            raise
+        self._idle.put(pooled)
+
+    def _discard(self, pooled: _PooledConnection) -> None:
+        try:
+            pooled.close()
+        except Exception:
+            logger.debug("Closing a discarded connection failed", exc_info=True)
+        with self._lock:
+            self._opened -= 1
+
+    def _acquire(self) -> _PooledConnection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_open = self._opened < self.pool_size
+            if can_open:
+                self._opened += 1
+        if not can_open:
+            try:
+                return self._idle.get(timeout=self.timeout)
+            except queue.Empty:
+                raise TimeoutError(
+                    f"No free database connection after {self.timeout}s"
+                ) from None
+        try:
+            pooled = self._open()
+        except Exception:
+            with self._lock:
+                self._opened -= 1
+            raise
+        with self._lock:
+            self._metrics.connections += 1
+        return pooled
+
+    def _open(self) -> _PooledConnection:
+        config = self.config
+        if config.backend == "mysql":
+            from mysql.connector import MySQLConnection
+
+            connection = MySQLConnection(
+                host=config.host,
+                port=config.port,
+                user=config.user,
+                password=config.password,
+                database=config.database,
+            )
+            return _PooledConnection(connection, True, self.statement_cache_size)
+        database = config.database
+        in_memory = database == ":memory:"
+        connection = sqlite3.connect(
+            self._memory_name if in_memory else database,
+            uri=in_memory,
+            check_same_thread=False,
+            cached_statements=self.statement_cache_size,
+        )
+        if config.seed:
+            # connections opened at once would all find the database empty
+            with self._lock:
+                if not connection.execute(
+                    "SELECT 1 FROM sqlite_master LIMIT 1"
+                ).fetchone():
+                    logger.info("Seeding %s from %s", database, config.seed)
+                    connection.executescript(
+                        Path(config.seed).read_text(encoding="utf-8")
+                    )
+        return _PooledConnection(connection, False, self.statement_cache_size)
@@ -0,0 +1,42 @@
+from dataclasses import dataclass
+from typing import Optional, Union
+
+from selenium.webdriver import Chrome, Edge, Firefox
+from selenium.webdriver.support.wait import WebDriverWait
+
+from utilities.bidi_capture import BidiEventCapture
+from utilities.driver_pool import PooledDriver
+from utilities.wait_engine import PollingWaitEngine
+
+
+@dataclass
+class DriverContext:
+    """Browser state owned by a single test.
+
+    Replaces the module globals conftest used to keep, so every hook and
+    helper receives the driver of the test it works for - which is what
+    makes running tests in several worker processes safe.
+
+    ``reusable`` is cleared when something may still be using the driver
+    after the test (e.g. a failure artifact task that timed out), the
+    driver is then not handed to the next test.
+    """
+
+    browser: str
+    pooled_driver: PooledDriver
+    wait: WebDriverWait
+    wait_engine: PollingWaitEngine
+    reusable: bool = True
+
+    @property
+    def driver(self) -> Union[Chrome, Firefox, Edge]:
+        return self.pooled_driver.driver
+
+    @property
+    def event_capture(self) -> Optional[BidiEventCapture]:
+        return self.pooled_driver.event_capture
+
+    @property
+    def supports_cdp(self) -> bool:
+        # looks like cdp not working with remote: https://github.com/SeleniumHQ/selenium/issues/8672
+        return self.browser in ("chrome", "chrome_headless")
@@ -0,0 +1,180 @@
+import logging
+import shutil
+from collections import OrderedDict
+from contextlib import suppress
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Hashable, Optional, Union
+from urllib.parse import urlsplit
+
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver import Chrome, Edge, Firefox
+
+from utilities.bidi_capture import BidiEventCapture
+from utilities.constants import Constants
+
+logger = logging.getLogger(__name__)
+
+DriverFactory = Callable[[], Union[Chrome, Firefox, Edge]]
+
+
+@dataclass
+class PooledDriver:
+    """A browser session owned by the pool together with its bookkeeping."""
+
+    driver: Union[Chrome, Firefox, Edge]
+    key: Hashable
+    uses: int = 0
+    event_capture: Optional[BidiEventCapture] = None
+
+
+class DriverPool:
+    """Keeps warm browser sessions and hands them out per test.
+
+    Launching Chrome or Firefox costs seconds, while resetting an already
+    running session costs a few round trips. The pool keeps up to ``size``
+    idle sessions, keyed by everything that cannot be changed on a running
+    browser (browser type, command line arguments, capabilities), and cleans
+    the state a test may leave behind before the session is reused.
+
+    A session is recycled (quit and replaced by a fresh one on the next
+    acquire) after ``max_uses`` tests, or as soon as it stops responding.
+    Only Chromium sessions are reused, the state of other browsers cannot be
+    cleaned reliably.
+
+    :param size: Maximum number of idle sessions kept warm. ``0`` disables
+        pooling so every test gets a fresh browser, as before.
+    :param max_uses: Number of tests a session may serve before it is
+        recycled.
+    :param download_directory: Download directory of the browsers owned by
+        the pool, emptied between tests.
+    """
+
+    def __init__(
+        self,
+        size: int = 1,
+        max_uses: int = 25,
+        download_directory: Path = Constants.CHROME_DOWNLOAD_DIRECTORY,
+    ):
+        self.size = size
+        self.max_uses = max_uses
+        self.download_directory = download_directory
+        self._idle: OrderedDict[int, PooledDriver] = OrderedDict()
+        self._busy: dict[int, PooledDriver] = {}
+
+    def acquire(self, key: Hashable, factory: DriverFactory) -> PooledDriver:
+        """Return an idle session created with the same ``key`` or launch a
+        new one with ``factory``.
+
+        :param key: Hashable description of the options the session was
+            launched with.
+        :param factory: Callable launching a new session for ``key``.
+        :return: The pooled session, marked as busy until it is released.
+        """
+        for driver_id, pooled in self._idle.items():
+            if pooled.key == key:
+                del self._idle[driver_id]
+                break
+        else:
+            pooled = PooledDriver(driver=factory(), key=key)
+        pooled.uses += 1
+        self._busy[id(pooled.driver)] = pooled
+        return pooled
+
+    def release(self, pooled: PooledDriver, reusable: bool = True) -> None:
+        """Give a session back to the pool.
+
+        The session is reset and kept warm, unless pooling is disabled, it
+        reached ``max_uses``, the caller marked it as not ``reusable`` or the
+        reset failed - in which case it is quit.
+
+        :param pooled: Session returned by :meth:`acquire`.
+        :param reusable: ``False`` when the session must not be handed out
+            again (e.g. it was launched for a single test only).
+        """
+        self._busy.pop(id(pooled.driver), None)
+        if (
+            not reusable
+            or self.size <= 0
+            or pooled.uses >= self.max_uses
+            or not self._reset(pooled.driver)
+        ):
+            self._quit(pooled)
+            return
+        self._idle[id(pooled.driver)] = pooled
+        while len(self._idle) > self.size:
+            _, oldest = self._idle.popitem(last=False)
+            self._quit(oldest)
+
+    def close(self) -> None:
+        """Quit every session owned by the pool."""
+        for pooled in [*self._idle.values(), *self._busy.values()]:
+            self._quit(pooled)
+        self._idle.clear()
+        self._busy.clear()
+
+    def _reset(self, driver: Union[Chrome, Firefox, Edge]) -> bool:
+        """Clean the state a test may leave in the browser.
+
+        Replaces every window with a single new tab (session storage belongs
+        to the tab), clears the cookies and the storage of every origin the
+        windows visited or embedded, geolocation overrides set by
+        ``BasePage.set_geo_location`` and the download directory.
+
+        Only Chromium sessions can be cleaned this way: WebDriver alone
+        clears the storage of the current origin only (and Firefox only the
+        cookies of the current domain), so other sessions are not reused.
+
+        :return: ``False`` when the session cannot be reused: the browser is
+            not Chromium based, or it did not respond (crashed or hung).
+        """
+        if not hasattr(driver, "execute_cdp_cmd"):
+            return False
+        try:
+            origins = set()
+            handles = driver.window_handles
+            for handle in handles:
+                driver.switch_to.window(handle)
+                origins.update(self._visited_origins(driver))
+            driver.switch_to.new_window("tab")
+            new_handle = driver.current_window_handle
+            for handle in handles:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(new_handle)
+            driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            for origin in sorted(origins):
+                driver.execute_cdp_cmd(
+                    "Storage.clearDataForOrigin",
+                    {"origin": origin, "storageTypes": "all"},
+                )
+            driver.execute_cdp_cmd("Emulation.clearGeolocationOverride", {})
+        except WebDriverException as e:
+            logger.warning("Recycling browser session that failed to reset: %s", e)
+            return False
+        if self.download_directory.exists():
+            shutil.rmtree(self.download_directory, ignore_errors=True)
+        return True
+
+    @staticmethod
+    def _visited_origins(driver: Union[Chrome, Edge]) -> set[str]:
+        """Origins of the navigation history and the frames of the current
+        window."""
+        history = driver.execute_cdp_cmd("Page.getNavigationHistory", {})
+        urls = [entry["url"] for entry in history.get("entries", [])]
+        frames = [driver.execute_cdp_cmd("Page.getFrameTree", {})["frameTree"]]
+        while frames:
+            frame = frames.pop()
+            urls.append(frame["frame"]["url"])
+            frames.extend(frame.get("childFrames", []))
+        origins = set()
+        for url in urls:
+            parts = urlsplit(url)
+            if parts.scheme in ("http", "https") and parts.netloc:
+                origins.add(f"{parts.scheme}://{parts.netloc}")
+        return origins
+
+    @staticmethod
+    def _quit(pooled: PooledDriver) -> None:
+        with suppress(Exception):
+            pooled.driver.quit()
@@ -0,0 +1,186 @@
+import json
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Iterable, Optional
+
+from _pytest.reports import TestReport
+
+EXTRA_TIMINGS = ("browser_launch", "failure_artifacts")
+
+
+@dataclass
+class TestTimings:
+    """Recorded timings of a single test id, in seconds.
+
+    ``browser_launch`` and ``failure_artifacts`` are already part of the
+    setup and call phases, they are kept apart to show how much of a test
+    is spent outside of the test body.
+    """
+
+    setup: float = 0.0
+    call: float = 0.0
+    teardown: float = 0.0
+    browser_launch: float = 0.0
+    failure_artifacts: float = 0.0
+    updated: float = field(default_factory=time.time)
+
+    @property
+    def total(self) -> float:
+        return self.setup + self.call + self.teardown
+
+
+class DurationsStore:
+    """Per test id timings, updated incrementally after every run.
+
+    New measurements are blended into the stored ones with an exponential
+    moving average, so a single slow run does not reshuffle the shards while
+    a test that really became slower is picked up after a few runs.
+
+    :param path: JSON file holding the detailed timings.
+    :param smoothing: Weight of the newest measurement, ``1`` keeps only the
+        last run.
+    """
+
+    def __init__(self, path: Path, smoothing: float = 0.5):
+        self.path = path
+        self.smoothing = smoothing
+        self.timings: dict[str, TestTimings] = {}
+        self._measured: dict[str, dict[str, float]] = {}
+        if path.exists():
+            with open(path, encoding="utf-8") as json_file:
+                self.timings = {
+                    nodeid: TestTimings(**timings)
+                    for nodeid, timings in json.load(json_file).items()
+                }
+
+    def record(self, nodeid: str, timing: str, seconds: float) -> None:
+        """Record a phase duration (``setup``, ``call``, ``teardown`` or one
+        of ``EXTRA_TIMINGS``) of the current run.
+
+        Repeated records of the same timing (e.g. reruns of a flaky test)
+        keep the last one.
+        """
+        self._measured.setdefault(nodeid, {})[timing] = seconds
+
+    def discard(self, nodeid: str) -> None:
+        """Forget the timings recorded for a test in this run."""
+        self._measured.pop(nodeid, None)
+
+    def update(self) -> None:
+        """Blend the timings recorded in this run into the stored ones."""
+        now = time.time()
+        for nodeid, measured in self._measured.items():
+            stored = self.timings.get(nodeid)
+            if stored is None:
+                self.timings[nodeid] = TestTimings(**measured, updated=now)
+                continue
+            for timing, seconds in measured.items():
+                previous = getattr(stored, timing)
+                setattr(
+                    stored,
+                    timing,
+                    self.smoothing * seconds + (1 - self.smoothing) * previous,
+                )
+            stored.updated = now
+        self._measured.clear()
+
+    def merge(self, other: "DurationsStore") -> None:
+        """Merge timings of another store, keeping the most recently updated
+        entry of every test id (e.g. stores written by different CI
+        nodes)."""
+        for nodeid, timings in other.timings.items():
+            if nodeid not in self.timings or (
+                timings.updated > self.timings[nodeid].updated
+            ):
+                self.timings[nodeid] = timings
+
+    def save(self) -> None:
+        with open(self.path, "w", encoding="utf-8") as json_file:
+            json.dump(
+                {nodeid: asdict(timings) for nodeid, timings in self.timings.items()},
+                json_file,
+                sort_keys=True,
+                indent=4,
+            )
+
+    def export_totals(self, path: Path) -> None:
+        """Write total durations in the format pytest-split reads from
+        ``--durations-path``."""
+        with open(path, "w", encoding="utf-8") as json_file:
+            json.dump(
+                {
+                    nodeid: round(timings.total, 3)
+                    for nodeid, timings in self.timings.items()
+                },
+                json_file,
+                sort_keys=True,
+                indent=4,
+            )
+
+    def duration(self, nodeid: str) -> float:
+        """Expected duration of a test, the average of the known tests when
+        it never ran."""
+        if nodeid in self.timings:
+            return self.timings[nodeid].total
+        if not self.timings:
+            return 1.0
+        return sum(timings.total for timings in self.timings.values()) / len(
+            self.timings
+        )
+
+
+class DurationsRecorder:
+    """Pytest plugin feeding a :class:`DurationsStore` from the test reports.
+
+    Registered on the xdist controller (or the only process when running
+    serially), which receives the reports of every worker. Browser launch and
+    failure artifact timings travel from the workers in the user properties
+    of the test, which are complete in the teardown report.
+
+    Tests whose setup errored are not recorded: their body never ran, their
+    duration says nothing about the next run.
+    """
+
+    def __init__(self, store: DurationsStore, export_path: Path):
+        self.store = store
+        self.export_path = export_path
+        self._errored: set[str] = set()
+
+    def pytest_runtest_logreport(self, report: TestReport) -> None:
+        if report.when == "setup":
+            if report.failed:
+                self._errored.add(report.nodeid)
+                self.store.discard(report.nodeid)
+                return
+            self._errored.discard(report.nodeid)
+        if report.nodeid in self._errored:
+            return
+        self.store.record(report.nodeid, report.when, report.duration)
+        if report.when == "teardown":
+            for name, value in report.user_properties:
+                if name in EXTRA_TIMINGS:
+                    self.store.record(report.nodeid, name, value)
+
+    def pytest_sessionfinish(self) -> None:
+        self.store.update()
+        self.store.save()
+        self.store.export_totals(self.export_path)
+
+
+def load_stores(paths: Iterable[Path], target: Optional[Path] = None) -> DurationsStore:
+    """Merge several stores into one, saved to ``target`` when given.
+
+    The timings already in ``target`` are kept unless a store has newer ones.
+    Without any store to merge (e.g. no CI node uploaded its durations)
+    ``target`` is left as it was.
+    """
+    paths = list(paths)
+    if not paths and target is None:
+        raise ValueError("No durations stores to merge")
+    merged = DurationsStore(target or paths[0])
+    for path in paths:
+        merged.merge(DurationsStore(path))
+    if target and paths:
+        merged.save()
+    return merged
@@ -0,0 +1,139 @@
+from dataclasses import dataclass
+from typing import Callable, Optional, Tuple, Union
+
+from selenium.common.exceptions import StaleElementReferenceException
+from selenium.webdriver import Chrome, Edge, Firefox
+from selenium.webdriver.remote.webelement import WebElement
+
+from utilities.wait_engine import ELEMENT_FUNCTIONS
+
+# generation of the document: a random token per document (so a navigation never
+# matches) and a counter of the DOM mutations, except the style changes of highlighting.
+# Pending mutation records are taken synchronously, a change made right before the check
+# counts even when the observer callback has not run yet.
+GENERATION_FUNCTION = """
+const currentGeneration = () => {
+  if (!window.__elementCacheGeneration) {
+    const state = {token: Math.random().toString(36).slice(2), count: 0};
+    const count = (mutations) => {
+      if (mutations.some((mutation) => mutation.attributeName !== "style")) {
+        state.count++;
+      }
+    };
+    const observer = new MutationObserver(count);
+    observer.observe(document, {
+      subtree: true, childList: true, attributes: true, characterData: true
+    });
+    state.takeRecords = () => count(observer.takeRecords());
+    window.__elementCacheGeneration = state;
+  }
+  const state = window.__elementCacheGeneration;
+  state.takeRecords();
+  return `${state.token}:${state.count}`;
+};
+"""
+
+# checks the cached element (attached, no mutation since its generation, condition holds)
+# and runs the action on it in the same round trip. A null generation skips the check,
+# for an element just found. The generation returned is the one before the action, so
+# whatever the action changes invalidates the element for the next call.
+ACTION_SCRIPT = (
+    ELEMENT_FUNCTIONS
+    + GENERATION_FUNCTION
+    + """
+const [element, generation, condition, action] = arguments;
+const current = currentGeneration();
+if (generation !== null && (
+  !element.isConnected || current !== generation || !conditionHolds(condition, element)
+)) {
+  return {stale: true};
+}
+const style = element.getAttribute("style") || "";
+element.setAttribute("style", `background-color:yellow;border: 1px solid green;${style}`);
+setTimeout(() => element.setAttribute("style", style), 400);
+let value = null;
+if (action === "click") {
+  element.scrollIntoView({block: "center"});
+  element.click();
+} else if (action === "clear") {
+  element.focus();
+  const prototype = Object.getPrototypeOf(element);
+  Object.getOwnPropertyDescriptor(prototype, "value").set.call(element, "");
+  element.dispatchEvent(new Event("input", {bubbles: true}));
+  element.dispatchEvent(new Event("change", {bubbles: true}));
+} else if (action === "text") {
+  value = element.innerText;
+}
+return {stale: false, generation: current, value: value};
+"""
+)
+
+
+@dataclass
+class _CachedElement:
+    element: WebElement
+    generation: str
+
+
+class ElementCache:
+    """Elements of a page object by locator.
+
+    A cached element is not found again: its action runs inside the page in the
+    same round trip that validates it. It must still be attached, the document
+    must not have mutated since it was used (e.g. a re-render inserting another
+    match, or what the last action changed) and the condition must hold.
+    Navigations load a document with a new generation, so everything found on
+    the previous page is invalidated. Otherwise (or on a
+    ``StaleElementReferenceException``) the element ``resolve`` waits for is
+    used and cached. Like the :class:`~utilities.page_batch.PageBatch` steps the
+    actions are the page's own: ``click()``, clearing the value with input
+    events and ``innerText``.
+
+    :param driver: Driver of the page object.
+    """
+
+    def __init__(self, driver: Union[Chrome, Firefox, Edge]):
+        self.driver = driver
+        self.hits = 0
+        self.misses = 0
+        self._elements: dict[Tuple[str, str], _CachedElement] = {}
+
+    def run(
+        self,
+        locator: Tuple[str, str],
+        condition: str,
+        action: str,
+        resolve: Callable[[], WebElement],
+    ) -> Tuple[WebElement, Optional[str]]:
+        """Run ``action`` ('click', 'clear' or 'text') on the element of ``locator``
+        and return the element with the text read, if any.
+
+        :param condition: 'present', 'visible' or 'clickable', what ``resolve``
+            waits for and a cached element must still meet.
+        :param resolve: Waits for the element when no valid one is cached.
+        """
+        if cached := self._elements.get(locator):
+            try:
+                result = self.driver.execute_script(
+                    ACTION_SCRIPT, cached.element, cached.generation, condition, action
+                )
+            except StaleElementReferenceException:
+                result = {"stale": True}
+            if not result["stale"]:
+                self.hits += 1
+                return cached.element, result["value"]
+            self.invalidate(locator)
+        self.misses += 1
+        element = resolve()
+        result = self.driver.execute_script(
+            ACTION_SCRIPT, element, None, condition, action
+        )
+        self._elements[locator] = _CachedElement(element, result["generation"])
+        return element, result["value"]
+
+    def invalidate(self, locator: Optional[Tuple[str, str]] = None) -> None:
+        """Drop the element of ``locator``, or all elements."""
+        if locator is None:
+            self._elements.clear()
+        else:
+            self._elements.pop(locator, None)
@@ -1,27 +1,152 @@
-import itertools
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterator, Optional
 
 import xlrd
+from xlrd.book import Book
+from xlrd.sheet import Sheet
 
 from utilities.constants import Constants
 
+Value = Optional[Any]
+
+
+@dataclass
+class _CachedWorkbook:
+    book: Book
+    mtime_ns: int
+    size: int
+    columns: dict[str, dict[str, tuple[Value, ...]]] = field(default_factory=dict)
+
+
+# workbooks opened by any parser, per file until the file changes
+_workbooks: dict[Path, _CachedWorkbook] = {}
+_lock = threading.Lock()
+
+
+def _typed(book: Book, cell_type: int, value: Any) -> Value:
+    """The cell value as str, int, float, bool, datetime or None."""
+    if cell_type == xlrd.XL_CELL_NUMBER:
+        return int(value) if value.is_integer() else value
+    if cell_type == xlrd.XL_CELL_DATE:
+        return xlrd.xldate_as_datetime(value, book.datemode)
+    if cell_type == xlrd.XL_CELL_BOOLEAN:
+        return bool(value)
+    if cell_type in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK, xlrd.XL_CELL_ERROR):
+        return None
+    return value
+
+
+def _headers(sheet: Sheet) -> list[str]:
+    headers = []
+    for index, header in enumerate(sheet.row_values(0) if sheet.nrows else []):
+        header = str(header).strip() or f"column_{index}"
+        headers.append(header if header not in headers else f"{header}_{index}")
+    return headers
+
 
 class ExcelParser:
+    """Reads the sheets of an Excel (.xls) file of the data directory.
+
+    The first row of a sheet holds the headers. Values are typed (str, int,
+    float, bool, datetime, or None for empty cells). The workbook is opened
+    once per file and kept until the file is modified, sheets are parsed on
+    first use and their columns are kept with it - reading the same sheet
+    again costs a dictionary lookup.
+
+    :param excel_path: Path of the file, relative to the data directory.
+    """
+
     def __init__(self, excel_path):
         self.excel_path = Constants.DATA_PATH / excel_path
 
-    def read_from_excel(self, sheet_name):
-        rows_val = []
-        # read from file
-        work_book = xlrd.open_workbook(self.excel_path)
-        sheet = work_book.sheet_by_name(sheet_name)
+    def sheet_names(self) -> list[str]:
+        with _lock:
+            return self._workbook().book.sheet_names()
+
+    def read_headers(self, sheet_name: str) -> list[str]:
+        """The headers of the sheet, without typing or keeping its values."""
+        with _lock:
+            cached = self._workbook()
+            if sheet_name in cached.columns:
+                return list(cached.columns[sheet_name])
+            try:
+                return _headers(cached.book.sheet_by_name(sheet_name))
+            finally:
+                cached.book.unload_sheet(sheet_name)
+
+    def read_from_excel(self, sheet_name: str) -> list[Value]:
+        """All values below the header row, row by row."""
+        columns = list(self.read_columns(sheet_name).values())
+        return [value for row in zip(*columns) for value in row]
+
+    def read_columns(self, sheet_name: str) -> dict[str, tuple[Value, ...]]:
+        """The values below the header row, per column by header.
+
+        The dictionary is the caller's own, the cached columns are tuples.
+        """
+        with _lock:
+            cached = self._workbook()
+            if sheet_name not in cached.columns:
+                sheet = cached.book.sheet_by_name(sheet_name)
+                cached.columns[sheet_name] = {
+                    header: tuple(
+                        _typed(cached.book, cell_type, value)
+                        for cell_type, value in zip(
+                            sheet.col_types(index, start_rowx=1),
+                            sheet.col_values(index, start_rowx=1),
+                        )
+                    )
+                    for index, header in enumerate(_headers(sheet))
+                }
+                cached.book.unload_sheet(sheet_name)
+            return dict(cached.columns[sheet_name])
+
+    def read_rows(self, sheet_name: str) -> list[dict[str, Value]]:
+        """The rows below the header row, keyed by header."""
+        columns = self.read_columns(sheet_name)
+        return [dict(zip(columns, row)) for row in zip(*columns.values())]
+
+    def iter_rows(self, sheet_name: str) -> Iterator[dict[str, Value]]:
+        """Yield the rows below the header row, keyed by header, one at a time.
+
+        Nothing is kept of the sheet: its rows are typed as they are yielded
+        and the sheet is unloaded afterwards - for sheets too large to keep
+        their values around.
+        """
+        with _lock:
+            book = self._workbook().book
+            sheet = book.sheet_by_name(sheet_name)
+        try:
+            headers = _headers(sheet)
+            for index in range(1, sheet.nrows):
+                yield {
+                    header: _typed(book, cell_type, value)
+                    for header, cell_type, value in zip(
+                        headers, sheet.row_types(index), sheet.row_values(index)
+                    )
+                }
+        finally:
+            with _lock:
+                book.unload_sheet(sheet_name)
 
-        # get all values, iterating through rows and columns
-        num_cols = sheet.ncols  # Number of columns
-        for row_idx, col_idx in itertools.product(
-            range(1, sheet.nrows), range(num_cols)
+    def _workbook(self) -> _CachedWorkbook:
+        stat = self.excel_path.stat()
+        cached = _workbooks.get(self.excel_path)
+        if (
+            cached is None
+            or cached.mtime_ns != stat.st_mtime_ns
+            or cached.size != stat.st_size
         ):
-            cell_obj = sheet.cell(row_idx, col_idx)  # Get cell object by row, col
-            # Convert cell to string,split it according to "'" and take the second cell in the array created
-            # e.g.: cell_obj == "text:'something'" --> after convert and splitting == "something"
-            rows_val.append(str(cell_obj).split("'")[1])
-        return rows_val
+            if cached is not None:
+                # closes the file (or its memory map) kept open for on demand sheets
+                cached.book.release_resources()
+            # sheets are parsed when first read, not all of them up front
+            cached = _CachedWorkbook(
+                xlrd.open_workbook(self.excel_path, on_demand=True),
+                stat.st_mtime_ns,
+                stat.st_size,
+            )
+            _workbooks[self.excel_path] = cached
+        return cached
@@ -0,0 +1,163 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, Optional, Union
+
+from allure_commons.types import AttachmentType
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Artifact:
+    """A single allure attachment produced by a collection task.
+
+    A ``Path`` body is a temporary file the task wrote its artifact to, it is
+    attached as a file and removed afterwards. Types allure has no
+    ``AttachmentType`` for are given as MIME type with their ``extension``.
+    """
+
+    name: str
+    body: Union[str, bytes, Path]
+    attachment_type: Union[AttachmentType, str]
+    extension: Optional[str] = None
+
+
+@dataclass
+class ArtifactTiming:
+    task: str
+    seconds: float
+    status: str
+
+
+@dataclass
+class CollectionResult:
+    artifacts: list[Artifact] = field(default_factory=list)
+    timings: list[ArtifactTiming] = field(default_factory=list)
+
+    @property
+    def timed_out(self) -> bool:
+        """Whether a task was still running when the budget ran out, it may
+        still be using the driver."""
+        return any(timing.status == "timed out" for timing in self.timings)
+
+
+ArtifactTask = Callable[[], Iterable[Artifact]]
+
+
+class FailureArtifactCollector:
+    """Collects failure artifacts concurrently within a time budget.
+
+    Every task runs in its own thread and yields the artifacts it gathers.
+    Tasks are independent of each other, so a task that must switch windows
+    has to do all of its window dependent work itself - the driver is shared.
+    Tasks that must not run alongside each other are given as ``serial``,
+    they run one after another in a single thread.
+    When the budget runs out the collection returns everything yielded so far,
+    records the unfinished tasks as timed out (see
+    :attr:`CollectionResult.timed_out`, their driver must not be reused) and
+    leaves them running in the background (a hung browser releases them once
+    its command timeout expires). Serial tasks not started yet are not
+    started anymore.
+
+    Once the session budget is spent (e.g. an environment outage failing every
+    test) only the tasks marked as essential are collected, so mass failures
+    do not multiply the run time.
+
+    Allure attachments must be added from the test thread, which is why tasks
+    return :class:`Artifact` objects instead of attaching them.
+
+    :param budget: Seconds a single collection may take.
+    :param session_budget: Seconds all collections of the session may take
+        before only essential tasks are collected.
+    """
+
+    def __init__(self, budget: float = 20, session_budget: float = 300):
+        self.budget = budget
+        self.session_budget = session_budget
+        self.spent = 0.0
+
+    def collect(
+        self,
+        tasks: dict[str, ArtifactTask],
+        essential: tuple[str, ...] = (),
+        serial: tuple[str, ...] = (),
+    ) -> CollectionResult:
+        """Run the tasks concurrently and return what finished in time.
+
+        :param tasks: Collection tasks by name.
+        :param essential: Names of the tasks still collected once the session
+            budget is spent.
+        :param serial: Names of the tasks run one after another, in this
+            order, instead of concurrently.
+        :return: Artifacts in task order, and the timing and status of every
+            task.
+        """
+        result = CollectionResult()
+        if self.spent >= self.session_budget:
+            skipped = [name for name in tasks if name not in essential]
+            result.timings += [ArtifactTiming(name, 0.0, "skipped") for name in skipped]
+            tasks = {name: task for name, task in tasks.items() if name in essential}
+        if not tasks:
+            return result
+        started = time.perf_counter()
+        cancelled = threading.Event()
+        durations: dict[str, dict] = {name: {} for name in tasks}
+        collected: dict[str, list[Artifact]] = {name: [] for name in tasks}
+        chain = [name for name in serial if name in tasks]
+        groups = [[name] for name in tasks if name not in chain]
+        if chain:
+            groups.append(chain)
+        executor = ThreadPoolExecutor(
+            max_workers=len(groups), thread_name_prefix="failure-artifacts"
+        )
+        futures: list[Future] = [
+            executor.submit(
+                self._run_all,
+                [(tasks[name], collected[name], durations[name]) for name in group],
+                cancelled,
+            )
+            for group in groups
+        ]
+        wait(futures, timeout=self.budget)
+        cancelled.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+        for name in tasks:
+            # copy, a timed out task keeps appending in the background
+            result.artifacts += list(collected[name])
+            timing = durations[name]
+            if "seconds" not in timing:
+                seconds, status = time.perf_counter() - started, "timed out"
+            elif "error" in timing:
+                logger.warning("Collecting '%s' failed: %s", name, timing["error"])
+                seconds, status = timing["seconds"], "failed"
+            else:
+                seconds, status = timing["seconds"], "ok"
+            result.timings.append(ArtifactTiming(name, seconds, status))
+        self.spent += time.perf_counter() - started
+        return result
+
+    @classmethod
+    def _run_all(
+        cls,
+        tasks: list[tuple[ArtifactTask, list[Artifact], dict]],
+        cancelled: threading.Event,
+    ) -> None:
+        for task, sink, timing in tasks:
+            if cancelled.is_set():
+                return
+            cls._run(task, sink, timing)
+
+    @staticmethod
+    def _run(task: ArtifactTask, sink: list[Artifact], timing: dict) -> None:
+        started = time.perf_counter()
+        try:
+            for artifact in task():
+                sink.append(artifact)
+        except Exception as error:
+            timing["error"] = error
+        finally:
+            timing["seconds"] = time.perf_counter() - started
@@ -0,0 +1,246 @@
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+@dataclass(frozen=True)
+class EndpointPolicy:
+    """How the requests of a service are sent.
+
+    :param timeout: Connect and read timeout in seconds.
+    :param retries: Retries of idempotent requests on connection errors and
+        502/503/504 responses.
+    :param backoff: Backoff factor between the retries in seconds.
+    :param cache_ttl: Seconds a GET response is served from cache, ``0``
+        disables caching.
+    """
+
+    timeout: float = 30
+    retries: int = 2
+    backoff: float = 0.5
+    cache_ttl: float = 0
+
+
+@dataclass
+class Service:
+    base_url: str
+    policy: EndpointPolicy = EndpointPolicy()
+
+
+@dataclass
+class EndpointMetrics:
+    requests: int = 0
+    cache_hits: int = 0
+    errors: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    connections: int = 0
+    pooled_requests: int = 0
+
+    @property
+    def average_ms(self) -> float:
+        return self.total_ms / self.requests if self.requests else 0.0
+
+    @property
+    def connection_reuse(self) -> float:
+        """Share of the requests sent over an already open connection."""
+        if not self.pooled_requests:
+            return 0.0
+        return 1 - self.connections / self.pooled_requests
+
+
+@dataclass
+class _CachedResponse:
+    response: requests.Response
+    expires: float
+
+
+@dataclass
+class _Endpoint:
+    name: str
+    service: Service
+    adapter: HTTPAdapter
+    metrics: EndpointMetrics = field(default_factory=EndpointMetrics)
+    # connection pool counters of the adapters replaced by overrides
+    closed_connections: int = 0
+    closed_requests: int = 0
+
+    def pool_counters(self) -> tuple[int, int]:
+        """New connections and requests of the connection pools."""
+        pools = self.adapter.poolmanager.pools
+        connections, requests_ = self.closed_connections, self.closed_requests
+        for key in pools.keys():
+            connections += pools[key].num_connections
+            requests_ += pools[key].num_requests
+        return connections, requests_
+
+
+# services the helpers talk to, base URLs can be overridden with HTTP_BASE_URL_<NAME>
+SERVICES = {
+    "public_ip": Service(
+        "http://checkip.amazonaws.com",
+        EndpointPolicy(timeout=5, retries=1, cache_ttl=300),
+    ),
+}
+
+
+class HttpClient(requests.Session):
+    """Shared HTTP session of the test helpers.
+
+    Every service gets its own connection pool (kept alive between requests)
+    with its timeout and retry policy, and idempotent GETs of services with a
+    ``cache_ttl`` are answered from cache - e.g. the public IP attached to
+    every failure is looked up once per worker instead of once per failure.
+    Requests to other URLs use the default policy.
+
+    Base URLs can be pointed elsewhere (e.g. a :class:`StubServer`) with
+    :meth:`override`, or with the ``HTTP_BASE_URL_<NAME>`` environment
+    variables.
+
+    :param services: Services by name.
+    :param default_policy: Policy of URLs not belonging to a service.
+    :param pool_connections: Hosts a pool keeps connections to.
+    :param pool_maxsize: Connections kept alive per host.
+    """
+
+    def __init__(
+        self,
+        services: Optional[dict[str, Service]] = None,
+        default_policy: EndpointPolicy = EndpointPolicy(),
+        pool_connections: int = 4,
+        pool_maxsize: int = 8,
+    ):
+        super().__init__()
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self._endpoints: dict[str, _Endpoint] = {}
+        self._cache: dict[tuple, _CachedResponse] = {}
+        self._lock = threading.Lock()
+        self._default = self._endpoint("default", Service("", default_policy))
+        self.mount("http://", self._default.adapter)
+        self.mount("https://", self._default.adapter)
+        for name, service in (services if services is not None else SERVICES).items():
+            base_url = os.getenv(f"HTTP_BASE_URL_{name.upper()}", service.base_url)
+            self.add_service(name, Service(base_url, service.policy))
+
+    def add_service(self, name: str, service: Service) -> None:
+        """Register ``service`` (or replace the one with the same name)."""
+        endpoint = self._endpoint(name, service)
+        with self._lock:
+            previous = self._endpoints.get(name)
+            self._endpoints[name] = endpoint
+            if previous:
+                endpoint.metrics = previous.metrics
+                (
+                    endpoint.closed_connections,
+                    endpoint.closed_requests,
+                ) = previous.pool_counters()
+                self.adapters.pop(previous.service.base_url, None)
+                previous.adapter.close()
+            # requests picks the adapter with the longest matching prefix
+            self.mount(service.base_url, endpoint.adapter)
+            self._cache.clear()
+
+    def override(self, name: str, base_url: str) -> str:
+        """Point service ``name`` to ``base_url``.
+
+        :return: The previous base URL, to restore it.
+        """
+        service = self._endpoints[name].service
+        self.add_service(name, Service(base_url, service.policy))
+        return service.base_url
+
+    @property
+    def services(self) -> dict[str, Service]:
+        with self._lock:
+            return {
+                name: endpoint.service for name, endpoint in self._endpoints.items()
+            }
+
+    def service_url(self, name: str, path: str = "") -> str:
+        base_url = self._endpoints[name].service.base_url.rstrip("/")
+        return f"{base_url}/{path.lstrip('/')}" if path else base_url
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        endpoint = self._endpoint_of(url)
+        policy = endpoint.service.policy
+        kwargs.setdefault("timeout", policy.timeout)
+        cache_key = None
+        if method.upper() == "GET" and policy.cache_ttl and not kwargs.get("stream"):
+            cache_key = (url, repr(sorted((kwargs.get("params") or {}).items())))
+            with self._lock:
+                cached = self._cache.get(cache_key)
+                if cached and cached.expires > time.monotonic():
+                    endpoint.metrics.cache_hits += 1
+                    return cached.response
+        started = time.perf_counter()
+        try:
+            response = super().request(method, url, **kwargs)
+        except requests.RequestException:
+            with self._lock:
+                endpoint.metrics.errors += 1
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                endpoint.metrics.requests += 1
+                endpoint.metrics.total_ms += elapsed_ms
+                endpoint.metrics.max_ms = max(endpoint.metrics.max_ms, elapsed_ms)
+        if cache_key and response.ok:
+            with self._lock:
+                self._cache[cache_key] = _CachedResponse(
+                    response, time.monotonic() + policy.cache_ttl
+                )
+        return response
+
+    def metrics(self) -> dict[str, EndpointMetrics]:
+        """Latency and connection reuse per service, and of the other URLs
+        under ``default``."""
+        result = {}
+        with self._lock:
+            for endpoint in (self._default, *self._endpoints.values()):
+                (
+                    endpoint.metrics.connections,
+                    endpoint.metrics.pooled_requests,
+                ) = endpoint.pool_counters()
+                result[endpoint.name] = endpoint.metrics
+        return result
+
+    def clear_cache(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def _endpoint(self, name: str, service: Service) -> _Endpoint:
+        policy = service.policy
+        retry = Retry(
+            total=policy.retries,
+            backoff_factor=policy.backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=IDEMPOTENT_METHODS,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=retry,
+        )
+        return _Endpoint(name, service, adapter)
+
+    def _endpoint_of(self, url: str) -> _Endpoint:
+        with self._lock:
+            matching = [
+                endpoint
+                for endpoint in self._endpoints.values()
+                if url.lower().startswith(endpoint.service.base_url.lower())
+            ]
+        if not matching:
+            return self._default
+        return max(matching, key=lambda endpoint: len(endpoint.service.base_url))
@@ -0,0 +1,132 @@
+import random
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import requests
+
+
+@dataclass
+class HttpRecord:
+    """Structured summary of a single HTTP exchange."""
+
+    method: str
+    url: str
+    status: int
+    elapsed_ms: float
+    request_size: int
+    response_size: int
+    sampled: bool = False
+
+
+@dataclass
+class HttpExchange:
+    record: HttpRecord
+    response: requests.Response = field(repr=False)
+
+
+def dump_exchange(response: requests.Response, max_body_size: int) -> str:
+    """Format request and response of ``response`` with their headers, bodies
+    are cut at ``max_body_size`` characters."""
+    request = response.request
+    request_body = request.body or ""
+    if isinstance(request_body, bytes):
+        request_body = request_body.decode("utf-8", errors="replace")
+    elif not isinstance(request_body, str):
+        request_body = "<streamed body>"
+    try:
+        response_body = response.text
+    except RuntimeError:
+        # the content of a streamed response was consumed by the test
+        response_body = "<streamed body>"
+    lines = [f"< {request.method} {request.url}"]
+    lines += [f"< {name}: {value}" for name, value in request.headers.items()]
+    lines += ["<", _truncate(request_body, max_body_size), ""]
+    lines += [f"> {response.status_code} {response.reason}"]
+    lines += [f"> {name}: {value}" for name, value in response.headers.items()]
+    lines += [">", _truncate(response_body, max_body_size)]
+    return "\n".join(lines)
+
+
+def _truncate(body: str, max_body_size: int) -> str:
+    if len(body) <= max_body_size:
+        return body
+    return (
+        f"{body[:max_body_size]}\n... truncated {len(body) - max_body_size} characters"
+    )
+
+
+class HttpLogBuffer:
+    """Per test buffer of HTTP exchanges, installed as ``requests`` response hook.
+
+    Every response is recorded as a cheap :class:`HttpRecord` (method, URL,
+    status, latency and sizes); the response itself is kept so the full
+    request/response dump can be produced later, only for tests that fail.
+    A ``sample_rate`` share of the responses is dumped right away anyway and
+    handed to ``on_sample``, so passing tests still show representative
+    traffic.
+
+    Only the last ``max_exchanges`` responses of a test are kept.
+
+    :param on_sample: Receives the record and dump of every sampled response.
+    :param sample_rate: Share (0-1) of the responses dumped immediately, ``1``
+        dumps all of them.
+    :param max_body_size: Characters of a body kept in a dump.
+    :param max_exchanges: Responses kept per test.
+    :param seed: Seed of the sampling, so reruns sample the same requests.
+    """
+
+    def __init__(
+        self,
+        on_sample: Callable[[HttpRecord, str], None],
+        sample_rate: float = 0.0,
+        max_body_size: int = 16 * 1024,
+        max_exchanges: int = 200,
+        seed: Optional[int] = None,
+    ):
+        self.on_sample = on_sample
+        self.sample_rate = sample_rate
+        self.max_body_size = max_body_size
+        self._exchanges: deque[HttpExchange] = deque(maxlen=max_exchanges)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def hook(self, response: requests.Response, *args, **kwargs) -> None:
+        """``requests`` response hook recording ``response``."""
+        request = response.request
+        body = request.body
+        record = HttpRecord(
+            method=request.method,
+            url=response.url,
+            status=response.status_code,
+            elapsed_ms=round(response.elapsed.total_seconds() * 1000, 3),
+            request_size=len(body) if isinstance(body, (str, bytes)) else 0,
+            # content of streamed responses is not read yet, use the header
+            response_size=int(response.headers.get("Content-Length") or 0),
+        )
+        with self._lock:
+            record.sampled = self._random.random() < self.sample_rate
+            self._exchanges.append(HttpExchange(record, response))
+        if record.sampled:
+            self.on_sample(record, dump_exchange(response, self.max_body_size))
+
+    def clear(self) -> None:
+        """Drop the exchanges of the previous test."""
+        with self._lock:
+            self._exchanges.clear()
+
+    def records(self) -> list[HttpRecord]:
+        with self._lock:
+            return [exchange.record for exchange in self._exchanges]
+
+    def dumps(self) -> list[tuple[HttpRecord, str]]:
+        """Dump the buffered exchanges not sampled already, for the report of a
+        failed test."""
+        with self._lock:
+            exchanges = list(self._exchanges)
+        return [
+            (exchange.record, dump_exchange(exchange.response, self.max_body_size))
+            for exchange in exchanges
+            if not exchange.record.sampled
+        ]
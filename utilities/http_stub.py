@@ -0,0 +1,89 @@
+import threading
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Union
+
+
+@dataclass
+class StubResponse:
+    status: int = 200
+    body: Union[str, bytes] = b""
+    headers: dict[str, str] = field(default_factory=dict)
+
+
+class StubServer:
+    """Local HTTP server answering canned responses, to run the HTTP helpers
+    offline.
+
+    Responses are registered per method and path; unknown routes answer 404.
+    Every request is recorded in ``requests`` as ``(method, path, body)``.
+
+    Example:
+        with StubServer() as stub:
+            stub.route("GET", "/", StubResponse(body="127.0.0.1"))
+            http_client.override("public_ip", stub.url)
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.routes: dict[tuple[str, str], StubResponse] = {}
+        self.requests: list[tuple[str, str, bytes]] = []
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="http-stub", daemon=True
+        )
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def route(self, method: str, path: str, response: StubResponse) -> None:
+        self.routes[(method.upper(), path)] = response
+
+    def start(self) -> "StubServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # keep-alive, so connection reuse of the clients can be observed
+            protocol_version = "HTTP/1.1"
+
+            def _respond(self) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                path = self.path.split("?", 1)[0]
+                stub.requests.append((self.command, path, body))
+                response = stub.routes.get(
+                    (self.command, path), StubResponse(404, "not found")
+                )
+                content, headers = response.body, dict(response.headers)
+                if isinstance(content, str):
+                    content = content.encode("utf-8")
+                    headers.setdefault("Content-Type", "text/plain; charset=utf-8")
+                self.send_response(response.status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(content)
+
+            do_GET = do_POST = do_PUT = do_DELETE = do_PATCH = do_HEAD = _respond
+
+            def log_message(self, *args) -> None:
+                pass
+
+        return Handler
@@ -0,0 +1,218 @@
+import io
+from dataclasses import dataclass
+from typing import Iterable, Optional, Union
+
+import numpy as np
+from PIL import Image
+
+from utilities.constants import Constants
+
+# largest squared YIQ distance of two colors (black and white)
+MAX_YIQ_DELTA = 35215.0
+# changed pixels beyond which the comparison fails anyway, not worth telling anti-aliasing
+MAX_ANTI_ALIASING_CANDIDATES = 100_000
+# neighbours a pixel is compared with to tell anti-aliasing from a change
+_NEIGHBOURS = [(dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dy or dx]
+
+ImageSource = Union[bytes, Image.Image, np.ndarray]
+
+# palette of the heatmap: the luma of the capture faded to 26 light grays, the same
+# tinted blue for ignored areas, then anti-aliasing and changes
+_HEATMAP_LEVELS = (25 - (255 - np.arange(256)) // 10).astype(np.uint8)
+_HEATMAP_IGNORED = 26
+_HEATMAP_ANTI_ALIASED = 52
+_HEATMAP_CHANGED = 53
+_HEATMAP_PALETTE = (
+    [channel for gray in range(230, 256) for channel in (gray, gray, gray)]
+    + [
+        channel
+        for gray in range(230, 256)
+        for channel in (gray * 154 >> 8, gray * 179 >> 8, gray)
+    ]
+    + [255, 200, 0, 255, 0, 0]
+)
+
+
+@dataclass(frozen=True)
+class IgnoreArea:
+    """Rectangle of a capture left out of the comparison, in pixels."""
+
+    x: int
+    y: int
+    width: int
+    height: int
+
+
+@dataclass
+class DiffResult:
+    """Outcome of :meth:`ImageDiffEngine.compare`.
+
+    :param diff_pixels: Pixels that differ, anti-aliasing not counted.
+    :param compared_pixels: Pixels compared, ignored areas not counted.
+    :param anti_aliased_pixels: Differing pixels tolerated as anti-aliasing.
+    :param size_mismatch: The images differ in size and were not compared.
+    :param heatmap: PNG of the differences, when there are any.
+    """
+
+    diff_pixels: int
+    compared_pixels: int
+    anti_aliased_pixels: int
+    tolerance_percent: float
+    size_mismatch: bool = False
+    heatmap: Optional[bytes] = None
+
+    @property
+    def diff_percent(self) -> float:
+        if self.size_mismatch:
+            return 100.0
+        if not self.compared_pixels:
+            return 0.0
+        return self.diff_pixels / self.compared_pixels * 100
+
+    @property
+    def passed(self) -> bool:
+        return not self.size_mismatch and self.diff_percent <= self.tolerance_percent
+
+    def __str__(self) -> str:
+        if self.size_mismatch:
+            return "Images differ in size"
+        return (
+            f"{self.diff_percent:.4f}% of the pixels differ "
+            f"({self.diff_pixels} of {self.compared_pixels}, "
+            f"{self.anti_aliased_pixels} anti-aliased), "
+            f"tolerance {self.tolerance_percent}%"
+        )
+
+
+def to_array(image: ImageSource) -> np.ndarray:
+    """RGBA pixels of a PNG (or any format Pillow reads), image or array."""
+    if isinstance(image, np.ndarray):
+        if image.shape[2] == 4:
+            return np.ascontiguousarray(image)
+        image = Image.fromarray(image)
+    elif isinstance(image, bytes):
+        image = Image.open(io.BytesIO(image))
+    return np.asarray(image.convert("RGBA"))
+
+
+def _yiq_delta(first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    """Squared perceptual distance of colors (rows of RGB or RGBA), the YIQ
+    metric of pixelmatch without the alpha blending."""
+    delta = first.astype(np.float32) - second.astype(np.float32)
+    r, g, b = delta[:, 0], delta[:, 1], delta[:, 2]
+    y = r * 0.29889531 + g * 0.58662247 + b * 0.11448223
+    i = r * 0.59597799 - g * 0.27417610 - b * 0.32180189
+    q = r * 0.21147017 - g * 0.52261711 + b * 0.31114694
+    return 0.5053 * y * y + 0.299 * i * i + 0.1957 * q * q
+
+
+class ImageDiffEngine:
+    """Pixel comparison of captures, vectorized with NumPy.
+
+    Pixels are compared as 32 bit words, only the ones that differ are
+    measured with the perceptual YIQ distance: a pixel counts as changed
+    above ``threshold`` (0 to 1 of the largest distance). A changed pixel is
+    tolerated as anti-aliasing when both images have its color within one
+    pixel of it (an edge rendered a sub-pixel off). The images match while
+    the changed pixels stay within ``tolerance_percent`` of the compared
+    ones.
+
+    Anti-aliasing is only told apart and the heatmap only rendered once the
+    changed pixels exceed the tolerance: decoded full-HD captures that match
+    compare in about 10 ms, failing ones take tens of milliseconds more for
+    the heatmap PNG (see ``tests/image_diff_test.py``).
+
+    :param tolerance_percent: Changed pixels allowed, in percent.
+    :param threshold: Color distance a pixel is changed above.
+    :param anti_aliasing: Tolerate anti-aliased pixels.
+    :param heatmap: Render a heatmap of the changes of failed comparisons.
+    """
+
+    def __init__(
+        self,
+        tolerance_percent: float = Constants.DIFF_TOLERANCE_PERCENT,
+        threshold: float = 0.1,
+        anti_aliasing: bool = True,
+        heatmap: bool = True,
+    ):
+        self.tolerance_percent = tolerance_percent
+        self.threshold = threshold
+        self.anti_aliasing = anti_aliasing
+        self.heatmap = heatmap
+
+    def compare(
+        self,
+        baseline: ImageSource,
+        actual: ImageSource,
+        ignore_areas: Iterable[IgnoreArea] = (),
+    ) -> DiffResult:
+        expected, actual = to_array(baseline), to_array(actual)
+        if expected.shape != actual.shape:
+            return DiffResult(0, 0, 0, self.tolerance_percent, size_mismatch=True)
+        height, width = actual.shape[:2]
+        mask = np.ones((height, width), dtype=bool)
+        for area in ignore_areas:
+            mask[
+                max(area.y, 0) : max(area.y + area.height, 0),
+                max(area.x, 0) : max(area.x + area.width, 0),
+            ] = False
+        compared = int(np.count_nonzero(mask))
+        changed = expected.view(np.uint32)[:, :, 0] != actual.view(np.uint32)[:, :, 0]
+        changed &= mask
+        ys, xs = np.nonzero(changed) if changed.any() else (np.array([], int),) * 2
+        if len(ys):
+            limit = MAX_YIQ_DELTA * self.threshold**2
+            different = _yiq_delta(expected[ys, xs], actual[ys, xs]) > limit
+            ys, xs = ys[different], xs[different]
+        anti_aliased = np.zeros(len(ys), dtype=bool)
+        # within the tolerance the comparison passes whatever is anti-aliasing
+        allowed = compared * self.tolerance_percent / 100
+        if self.anti_aliasing and allowed < len(ys) <= MAX_ANTI_ALIASING_CANDIDATES:
+            anti_aliased = self._anti_aliased(expected, actual, ys, xs)
+        diff_ys, diff_xs = ys[~anti_aliased], xs[~anti_aliased]
+        result = DiffResult(
+            diff_pixels=len(diff_ys),
+            compared_pixels=compared,
+            anti_aliased_pixels=int(anti_aliased.sum()),
+            tolerance_percent=self.tolerance_percent,
+        )
+        if self.heatmap and not result.passed:
+            result.heatmap = self._heatmap(
+                actual, mask, (diff_ys, diff_xs), (ys[anti_aliased], xs[anti_aliased])
+            )
+        return result
+
+    def _anti_aliased(
+        self, expected: np.ndarray, actual: np.ndarray, ys: np.ndarray, xs: np.ndarray
+    ) -> np.ndarray:
+        height, width = actual.shape[:2]
+        limit = MAX_YIQ_DELTA * self.threshold**2
+        in_expected = np.zeros(len(ys), dtype=bool)
+        in_actual = np.zeros(len(ys), dtype=bool)
+        for dy, dx in _NEIGHBOURS:
+            ny = np.clip(ys + dy, 0, height - 1)
+            nx = np.clip(xs + dx, 0, width - 1)
+            in_expected |= _yiq_delta(expected[ny, nx], actual[ys, xs]) <= limit
+            in_actual |= _yiq_delta(actual[ny, nx], expected[ys, xs]) <= limit
+        return in_expected & in_actual
+
+    @staticmethod
+    def _heatmap(
+        actual: np.ndarray,
+        mask: np.ndarray,
+        diff: tuple[np.ndarray, np.ndarray],
+        anti_aliased: tuple[np.ndarray, np.ndarray],
+    ) -> bytes:
+        # the capture faded to light gray, changes red, anti-aliasing yellow and
+        # ignored areas blue - as palette image, a third of the pixel data of RGB
+        luma = np.asarray(Image.fromarray(actual).convert("L"))
+        heatmap = _HEATMAP_LEVELS[luma]
+        if not mask.all():
+            heatmap[~mask] += _HEATMAP_IGNORED
+        heatmap[anti_aliased] = _HEATMAP_ANTI_ALIASED
+        heatmap[diff] = _HEATMAP_CHANGED
+        image = Image.fromarray(heatmap)
+        image.putpalette(_HEATMAP_PALETTE)
+        output = io.BytesIO()
+        image.save(output, "PNG", compress_level=1)
+        return output.getvalue()
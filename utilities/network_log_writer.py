@@ -0,0 +1,232 @@
+import base64
+import binascii
+import csv
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from dataclasses import dataclass
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+
+SUMMARY_FIELDS = ("method", "url", "status", "duration_ms", "size", "body_size")
+
+
+@dataclass
+class NetworkEntry:
+    """A request/response pair, normalized from BiDi events or the Chrome
+    performance log."""
+
+    request_id: str
+    method: str
+    url: str
+    status: Optional[int]
+    mime_type: str
+    duration_ms: Optional[float]
+    size: Optional[int]
+    has_post_data: bool
+    request: dict
+    response: dict
+    body: Optional[str] = None
+    post_data: Optional[str] = None
+    body_skipped: Optional[str] = None
+    # bytes of the body as received, before it was truncated
+    body_size: Optional[int] = None
+    # "base64" for binary bodies kept encoded
+    body_encoding: Optional[str] = None
+
+    def to_summary(self) -> dict:
+        return {
+            "method": self.method,
+            "url": self.url,
+            "status": self.status,
+            "duration_ms": self.duration_ms,
+            "size": self.size,
+            "body_size": self.body_size,
+        }
+
+
+def entries_from_events(events: Iterable[dict]) -> Iterator[NetworkEntry]:
+    """Normalize events streamed by :class:`BidiEventCapture`."""
+    for event in events:
+        request, response = event["request"], event.get("response") or {}
+        timings = request.get("timings") or {}
+        duration = None
+        if timings.get("responseEnd") and timings.get("requestTime"):
+            duration = round(timings["responseEnd"] - timings["requestTime"], 3)
+        yield NetworkEntry(
+            # chromium's BiDi request ids are the CDP ones
+            request_id=request["request"],
+            method=request.get("method", ""),
+            url=request.get("url", ""),
+            status=response.get("status"),
+            mime_type=response.get("mimeType", ""),
+            duration_ms=duration,
+            size=response.get("bytesReceived"),
+            has_post_data=bool(request.get("bodySize")),
+            request=request,
+            response=response,
+        )
+
+
+def entries_from_performance_log(driver: webdriver.Chrome) -> Iterator[NetworkEntry]:
+    """Normalize the XHR requests of the Chrome ``performance`` log."""
+    requests, responses = {}, {}
+    for log in driver.get_log("performance"):
+        item = json.loads(log["message"])["message"]
+        params = item.get("params")
+        if params.get("type") != "XHR":
+            continue
+        if item.get("method") == "Network.responseReceived":
+            responses[params["requestId"]] = item
+        elif item.get("method") == "Network.requestWillBeSent":
+            requests[params["requestId"]] = item
+    for request_id, response_item in responses.items():
+        request_item = requests.get(request_id, {"params": {}})
+        request = request_item["params"].get("request", {})
+        response = response_item["params"]["response"]
+        yield NetworkEntry(
+            request_id=request_id,
+            method=request.get("method", ""),
+            url=response.get("url", ""),
+            status=response.get("status"),
+            mime_type=response.get("mimeType", ""),
+            duration_ms=(response.get("timing") or {}).get("receiveHeadersEnd"),
+            size=response.get("encodedDataLength"),
+            has_post_data=bool(request.get("hasPostData")),
+            request=request_item,
+            response=response_item,
+        )
+
+
+class NetworkLogWriter:
+    """Fetches request and response bodies concurrently and streams the log to
+    disk.
+
+    Bodies are only fetched for entries matching the content types and URL
+    filter, and never beyond ``max_body_size`` - larger responses are listed
+    without their body. CDP round trips run in a thread pool, a batch at a
+    time, so memory stays bounded by ``batch_size`` bodies however many
+    requests the page made. Next to the full log, a summary index (method,
+    URL, status, timing and size per request) is written as CSV, which is
+    cheap to browse in the report.
+
+    :param driver: Chrome driver the requests were made in.
+    :param content_types: Substrings of the MIME types bodies are fetched for,
+        empty fetches all.
+    :param url_pattern: Regular expression URLs must match for their bodies
+        to be fetched.
+    :param max_body_size: Maximal body size in bytes, longer bodies are
+        truncated. Binary bodies are kept base64 encoded.
+    """
+
+    def __init__(
+        self,
+        driver: webdriver.Chrome,
+        content_types: tuple[str, ...] = ("json", "text", "xml", "javascript"),
+        url_pattern: Optional[str] = None,
+        max_body_size: int = 64 * 1024,
+        max_workers: int = 8,
+        batch_size: int = 32,
+    ):
+        self.driver = driver
+        self.content_types = content_types
+        self.url_pattern = re.compile(url_pattern) if url_pattern else None
+        self.max_body_size = max_body_size
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+
+    def write(
+        self, entries: Iterable[NetworkEntry], log_path: Path, summary_path: Path
+    ) -> int:
+        """Write the network log as a JSON array and its summary index as CSV.
+
+        :return: Number of entries written.
+        """
+        count = 0
+        entries = iter(entries)
+        with (
+            ThreadPoolExecutor(max_workers=self.max_workers) as executor,
+            open(log_path, "w", encoding="utf-8") as log_file,
+            open(summary_path, "w", encoding="utf-8", newline="") as summary_file,
+        ):
+            summary = csv.DictWriter(summary_file, fieldnames=SUMMARY_FIELDS)
+            summary.writeheader()
+            log_file.write("[")
+            while batch := list(islice(entries, self.batch_size)):
+                for entry in executor.map(self._fetch_bodies, batch):
+                    log_file.write(",\n" if count else "\n")
+                    json.dump(self._to_json(entry), log_file, ensure_ascii=False)
+                    summary.writerow(entry.to_summary())
+                    count += 1
+            log_file.write("\n]\n")
+        return count
+
+    def _fetch_bodies(self, entry: NetworkEntry) -> NetworkEntry:
+        if not any(
+            content_type in entry.mime_type for content_type in self.content_types
+        ):
+            entry.body_skipped = "content type"
+        elif self.url_pattern and not self.url_pattern.search(entry.url):
+            entry.body_skipped = "url"
+        elif entry.size is not None and entry.size > self.max_body_size:
+            entry.body_skipped = "size"
+        elif entry.status is not None:
+            try:
+                response = self.driver.execute_cdp_cmd(
+                    "Network.getResponseBody", {"requestId": entry.request_id}
+                )
+            except WebDriverException as e:
+                # e.g. the Network domain was not enabled, or the body was evicted
+                reason = (e.msg or str(e)).strip().partition("\n")[0]
+                entry.body_skipped = f"error: {reason}"
+            else:
+                content = self._decode(response["body"], response.get("base64Encoded"))
+                entry.body_size = len(content)
+                entry.body, entry.body_encoding = self._truncate(content)
+        if entry.has_post_data:
+            with suppress(Exception):
+                request = self.driver.execute_cdp_cmd(
+                    "Network.getRequestPostData", {"requestId": entry.request_id}
+                )
+                entry.post_data, _ = self._truncate(
+                    self._decode(request["postData"], request.get("base64Encoded"))
+                )
+        return entry
+
+    @staticmethod
+    def _decode(body: str, base64_encoded: Optional[bool]) -> bytes:
+        if base64_encoded:
+            with suppress(binascii.Error):
+                return base64.b64decode(body)
+        return body.encode("utf-8")
+
+    def _truncate(self, content: bytes) -> tuple[str, Optional[str]]:
+        """The first ``max_body_size`` bytes of a body as text, base64 encoded
+        (labelled ``"base64"``) when they are not UTF-8."""
+        kept = content[: self.max_body_size]
+        try:
+            return kept.decode("utf-8"), None
+        except UnicodeDecodeError as error:
+            # a character cut in half by the truncation is dropped
+            if len(kept) < len(content) and error.reason == "unexpected end of data":
+                with suppress(UnicodeDecodeError):
+                    return kept[: error.start].decode("utf-8"), None
+            return base64.b64encode(kept).decode("ascii"), "base64"
+
+    @staticmethod
+    def _to_json(entry: NetworkEntry) -> dict:
+        return {
+            **entry.to_summary(),
+            "mime_type": entry.mime_type,
+            "request": entry.request,
+            "response": entry.response,
+            "body": entry.body,
+            "body_encoding": entry.body_encoding,
+            "post_data": entry.post_data,
+            "body_skipped": entry.body_skipped,
+        }
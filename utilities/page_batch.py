@@ -0,0 +1,257 @@
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional, Tuple
+
+from selenium.common.exceptions import (
+    JavascriptException,
+    TimeoutException,
+    WebDriverException,
+)
+
+from utilities.wait_engine import WAIT_FOR_FUNCTION, script_locator
+
+if TYPE_CHECKING:
+    from pages.base_page import BasePage
+
+# runs the steps of a segment one after the other inside the page, every step waits for
+# its element with waitFor() first. A type_text step (always the last of its segment)
+# clears its field and returns it, the keys are sent to it natively.
+BATCH_SCRIPT = (
+    """
+const [steps, timeout, afterNavigation, navigationGrace] = arguments;
+const done = arguments[arguments.length - 1];
+if (typeof MutationObserver === "undefined") {
+  done({unsupported: true});
+  return;
+}
+"""
+    + WAIT_FOR_FUNCTION
+    + """
+const setValue = (element, text) => {
+  element.focus();
+  if (element.isContentEditable) {
+    element.textContent = text;
+  } else {
+    // the prototype's setter, so frameworks tracking the value (e.g. React) see the change
+    const prototype = Object.getPrototypeOf(element);
+    Object.getOwnPropertyDescriptor(prototype, "value").set.call(element, text);
+  }
+  element.dispatchEvent(new Event("input", {bubbles: true}));
+  element.dispatchEvent(new Event("change", {bubbles: true}));
+};
+(async () => {
+  if (afterNavigation && window.__pageBatchNavigating) {
+    // a navigation started by the previous segment unloads this document meanwhile,
+    // a client side route change does not
+    await new Promise((resolve) => setTimeout(resolve, navigationGrace));
+    delete window.__pageBatchNavigating;
+  }
+  const texts = [];
+  let typeInto = null;
+  for (let index = 0; index < steps.length; index++) {
+    const [action, using, value, condition, text, navigates] = steps[index];
+    const result = await waitFor(using, value, condition, timeout);
+    if (!result.element) {
+      const reason = result.error || `not ${condition} within ${timeout} ms`;
+      return done({failed: index, reason: reason});
+    }
+    try {
+      if (action === "fill") {
+        setValue(result.element, text);
+      } else if (action === "type_text") {
+        setValue(result.element, "");
+        typeInto = result.element;
+      } else if (action === "click") {
+        if (navigates) window.__pageBatchNavigating = true;
+        result.element.scrollIntoView({block: "center"});
+        result.element.click();
+      } else if (action === "read_text") {
+        texts.push(result.element.innerText);
+      }
+    } catch (error) {
+      return done({failed: index, reason: String(error)});
+    }
+  }
+  done({texts: texts, typeInto: typeInto});
+})();
+"""
+)
+
+
+@dataclass
+class BatchStep:
+    action: str
+    locator: Tuple[str, str]
+    condition: str
+    text: Optional[str] = None
+    navigates: bool = False
+
+    def __str__(self) -> str:
+        return f"{self.action} {self.locator}"
+
+
+class PageBatchError(WebDriverException):
+    """A step of a :class:`PageBatch` failed."""
+
+    def __init__(self, index: int, step: BatchStep, reason: str):
+        super().__init__(f"Step {index + 1} of the batch ({step}) failed: {reason}")
+        self.index = index
+        self.step = step
+        self.reason = reason
+
+
+class PageBatch:
+    """Sequence of page actions and reads run in as few round trips as
+    possible.
+
+    The steps run inside the page, each waiting for its element first, so a
+    batch costs a single round trip instead of several per step. A click
+    marked as ``navigates`` ends the round trip, the following steps run on
+    the loaded page. Browsers the batch script does not work in run the
+    steps through the page object's methods instead.
+
+    Values are filled like a user's input as far as the page can tell
+    (``input`` and ``change`` events), but no key events are sent - use
+    :meth:`type_text` where the page reacts to single key strokes (e.g.
+    credential fields). Its field is waited for and cleared by the script
+    like any step, which ends the round trip there: the keys are sent to the
+    field with one more command before the next steps run.
+
+    A round trip takes as many steps as their waits fit into the driver's
+    script timeout, longer segments are split.
+
+    Example:
+        email, = (
+            page.batch()
+            .fill(EMAIL_FIELD, "user@example.com")
+            .click(CONTINUE_BUTTON)
+            .read_text(EMAIL_LABEL)
+            .run()
+        )
+
+    :param page: Page object the batch runs on.
+    :param timeout: Seconds every step waits for its element.
+    :param navigation_grace: Seconds the steps after a navigating click give
+        the navigation to unload the previous page.
+    :param script_timeout: The driver's script timeout in seconds, 30 unless
+        the session changed it.
+    """
+
+    def __init__(
+        self,
+        page: "BasePage",
+        timeout: float = 10,
+        navigation_grace: float = 0.5,
+        script_timeout: float = 30,
+    ):
+        self.page = page
+        self.timeout = timeout
+        self.navigation_grace = navigation_grace
+        self.script_timeout = script_timeout
+        self.steps: list[BatchStep] = []
+
+    def fill(self, locator: Tuple[str, str], text: str) -> "PageBatch":
+        self.steps.append(BatchStep("fill", locator, "clickable", text))
+        return self
+
+    def type_text(self, locator: Tuple[str, str], text: str) -> "PageBatch":
+        """Type the text with key strokes, like the page object's
+        ``fill_text``. Ends the round trip."""
+        self.steps.append(BatchStep("type_text", locator, "clickable", text))
+        return self
+
+    def click(self, locator: Tuple[str, str], navigates: bool = False) -> "PageBatch":
+        self.steps.append(BatchStep("click", locator, "clickable", navigates=navigates))
+        return self
+
+    def wait_for(
+        self, locator: Tuple[str, str], condition: str = "visible"
+    ) -> "PageBatch":
+        self.steps.append(BatchStep("wait_for", locator, condition))
+        return self
+
+    def read_text(self, locator: Tuple[str, str]) -> "PageBatch":
+        self.steps.append(BatchStep("read_text", locator, "visible"))
+        return self
+
+    def run(self) -> list[str]:
+        """Run the steps.
+
+        :return: The texts of the ``read_text`` steps, in order.
+        :raises PageBatchError: When a step fails, with the failing step.
+        """
+        # the waits of a segment (and the grace after a navigation) must end
+        # before the script times out
+        budget = max(self.script_timeout - self.navigation_grace - 1, 1)
+        step_timeout = min(self.timeout, budget)
+        steps_per_segment = max(1, int(budget // step_timeout))
+        texts, segment, offset = [], [], 0
+        for step in self.steps:
+            segment.append(step)
+            if (
+                step.action == "type_text"
+                or step.navigates
+                or len(segment) == steps_per_segment
+            ):
+                texts += self._run_segment(segment, offset, step_timeout)
+                offset += len(segment)
+                segment = []
+        if segment:
+            texts += self._run_segment(segment, offset, step_timeout)
+        return texts
+
+    def _run_segment(
+        self, segment: list[BatchStep], offset: int, step_timeout: float
+    ) -> list[str]:
+        arguments = [
+            [step.action, *script_locator(step.locator), step.condition, step.text]
+            + [step.navigates]
+            for step in segment
+        ]
+        deadline = time.monotonic() + step_timeout * len(segment)
+        while True:
+            try:
+                result = self.page.driver.execute_async_script(
+                    BATCH_SCRIPT,
+                    arguments,
+                    int(step_timeout * 1000),
+                    offset > 0,
+                    int(self.navigation_grace * 1000),
+                )
+            except JavascriptException as e:
+                # the previous segment's navigation unloaded the page, run on the new one
+                if "unload" in str(e).lower() and time.monotonic() < deadline:
+                    continue
+                return self._run_with_page(segment, offset)
+            except TimeoutException as e:
+                raise PageBatchError(offset, segment[0], f"script timeout: {e.msg}")
+            if result.get("unsupported"):
+                return self._run_with_page(segment, offset)
+            if "failed" in result:
+                index = result["failed"]
+                raise PageBatchError(offset + index, segment[index], result["reason"])
+            if field := result.get("typeInto"):
+                try:
+                    field.send_keys(segment[-1].text)
+                except WebDriverException as e:
+                    raise PageBatchError(
+                        offset + len(segment) - 1, segment[-1], e.msg
+                    ) from e
+            return result["texts"]
+
+    def _run_with_page(self, segment: list[BatchStep], offset: int) -> list[str]:
+        texts = []
+        for index, step in enumerate(segment):
+            try:
+                match step.action:
+                    case "fill" | "type_text":
+                        self.page.fill_text(step.locator, step.text)
+                    case "click":
+                        self.page.click(step.locator)
+                    case "wait_for":
+                        self.page._wait_for(step.locator, step.condition)
+                    case "read_text":
+                        texts.append(self.page.get_text(step.locator))
+            except WebDriverException as e:
+                raise PageBatchError(offset + index, step, e.msg) from e
+        return texts
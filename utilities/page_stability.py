@@ -0,0 +1,183 @@
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Union
+
+from selenium.common.exceptions import JavascriptException, TimeoutException
+from selenium.webdriver import Chrome, Edge, Firefox
+
+logger = logging.getLogger(__name__)
+
+# resolves once the page is stable: no request in flight (counted by wrapping fetch and
+# XMLHttpRequest, and by the resource timings of everything else) for networkIdle ms, the
+# fonts loaded, the layout unchanged over stableFrames animation frames and no finite
+# animation running. Every check records when it last started to pass.
+STABILITY_SCRIPT = """
+const [timeout, networkIdle, stableFrames, maxElements] = arguments;
+const done = arguments[arguments.length - 1];
+const started = performance.now();
+if (!window.__pageStabilityRequests) {
+  const state = {inFlight: 0, lastFinished: 0};
+  const finished = () => {
+    state.inFlight--;
+    state.lastFinished = performance.now();
+  };
+  if (window.fetch) {
+    const fetch = window.fetch;
+    window.fetch = function () {
+      state.inFlight++;
+      return fetch.apply(this, arguments).finally(finished);
+    };
+  }
+  const send = XMLHttpRequest.prototype.send;
+  XMLHttpRequest.prototype.send = function () {
+    state.inFlight++;
+    this.addEventListener("loadend", finished, {once: true});
+    return send.apply(this, arguments);
+  };
+  window.__pageStabilityRequests = state;
+}
+const requests = window.__pageStabilityRequests;
+const lastResource = () => performance.getEntriesByType("resource")
+  .reduce((last, entry) => Math.max(last, entry.responseEnd), 0);
+const layout = () => {
+  const root = document.documentElement;
+  const parts = [root.scrollWidth, root.scrollHeight];
+  const elements = document.body ? document.body.getElementsByTagName("*") : [];
+  for (let i = 0; i < Math.min(elements.length, maxElements); i++) {
+    const rect = elements[i].getBoundingClientRect();
+    parts.push(rect.x, rect.y, rect.width, rect.height);
+  }
+  return parts.join(",");
+};
+const runningAnimations = () => !document.getAnimations ? 0 : document.getAnimations()
+  .filter((animation) => animation.playState === "running"
+    && animation.effect && animation.effect.getTiming().iterations !== Infinity)
+  .length;
+const passed = {network: null, fonts: null, layout: null, animations: null};
+let fontsLoaded = !document.fonts;
+if (document.fonts) document.fonts.ready.then(() => { fontsLoaded = true; });
+let previousLayout = null, sameFrames = 0;
+const frame = () => {
+  const now = performance.now();
+  const elapsed = now - started;
+  const idleSince = Math.max(requests.lastFinished, lastResource());
+  const checks = {
+    network: document.readyState === "complete" && requests.inFlight <= 0
+      && now - idleSince >= networkIdle,
+    fonts: fontsLoaded,
+    layout: false,
+    animations: runningAnimations() === 0,
+  };
+  const currentLayout = layout();
+  sameFrames = currentLayout === previousLayout ? sameFrames + 1 : 0;
+  previousLayout = currentLayout;
+  checks.layout = sameFrames >= stableFrames;
+  for (const name in checks) {
+    if (checks[name] && passed[name] === null) passed[name] = elapsed;
+    if (!checks[name]) passed[name] = null;
+  }
+  const pending = Object.keys(checks).filter((name) => !checks[name]);
+  if (!pending.length || elapsed >= timeout) {
+    return done({stable: !pending.length, elapsed: elapsed, passed: passed, pending});
+  }
+  // animation frames are throttled in hidden windows
+  document.hidden ? setTimeout(frame, 16) : requestAnimationFrame(frame);
+};
+frame();
+"""
+
+
+@dataclass
+class StabilityReport:
+    """Outcome of :meth:`PageStabilityDetector.wait`.
+
+    :param stable: All checks passed before the timeout.
+    :param elapsed_ms: How long the wait took.
+    :param passed_ms: When each check (``network``, ``fonts``, ``layout``,
+        ``animations``) last started to pass, ``None`` when it did not.
+    :param pending: The checks still failing at the timeout.
+    """
+
+    stable: bool
+    elapsed_ms: float
+    passed_ms: dict[str, float] = field(default_factory=dict)
+    pending: list[str] = field(default_factory=list)
+
+    def __str__(self) -> str:
+        state = "stable" if self.stable else f"not stable ({', '.join(self.pending)})"
+        checks = ", ".join(
+            f"{name} {ms:.0f} ms"
+            for name, ms in self.passed_ms.items()
+            if ms is not None
+        )
+        return f"Page {state} after {self.elapsed_ms:.0f} ms: {checks}"
+
+
+class PageStabilityDetector:
+    """Waits until the page stopped changing, before it is captured.
+
+    The page is stable when the network has been idle for
+    ``network_idle_ms``, the fonts are loaded, the layout did not change over
+    ``stable_frames`` consecutive animation frames and no (finite) animation
+    runs. The checks run inside the page, a single round trip unless the
+    page navigates meanwhile. After ``timeout`` seconds the page is captured
+    anyway, the report tells which checks did not pass.
+
+    :param driver: Driver of the page.
+    :param timeout: Seconds to wait at most.
+    :param network_idle_ms: Milliseconds without requests in flight.
+    :param stable_frames: Animation frames the layout must not change in.
+    :param max_elements: Elements whose boxes are compared between frames.
+    """
+
+    def __init__(
+        self,
+        driver: Union[Chrome, Firefox, Edge],
+        timeout: float = 10,
+        network_idle_ms: int = 500,
+        stable_frames: int = 3,
+        max_elements: int = 2000,
+    ):
+        self.driver = driver
+        self.timeout = timeout
+        self.network_idle_ms = network_idle_ms
+        self.stable_frames = stable_frames
+        self.max_elements = max_elements
+
+    def wait(self) -> StabilityReport:
+        started = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                result = self.driver.execute_async_script(
+                    STABILITY_SCRIPT,
+                    int(remaining * 1000),
+                    self.network_idle_ms,
+                    self.stable_frames,
+                    self.max_elements,
+                )
+            except JavascriptException as e:
+                # the page navigated away while waiting, wait for the new one
+                if "unload" in str(e).lower():
+                    continue
+                logger.warning("Page stability could not be detected: %s", e)
+                return self._report(started, False, {}, ["error"])
+            except TimeoutException:
+                return self._report(started, False, {}, ["script timeout"])
+            return self._report(
+                started, result["stable"], result["passed"], result["pending"]
+            )
+        return self._report(started, False, {}, ["timeout"])
+
+    @staticmethod
+    def _report(
+        started: float, stable: bool, passed_ms: dict, pending: list[str]
+    ) -> StabilityReport:
+        report = StabilityReport(
+            stable, (time.perf_counter() - started) * 1000, passed_ms, pending
+        )
+        # the root logger is at WARNING during the session, a page captured before
+        # it settled must show up
+        logger.log(logging.INFO if stable else logging.WARNING, "%s", report)
+        return report
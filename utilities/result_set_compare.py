@@ -0,0 +1,345 @@
+import hashlib
+import itertools
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Any, Callable, Generator, Iterable, Optional, Sequence, Union
+
+from utilities.db_client import DatabaseClient, Row
+
+# a source of rows streamed in batches, called once per pass
+Batches = Callable[[], Generator[list[Row], None, None]]
+Expected = Union[Sequence[Sequence[Any]], Callable[[], Iterable[Sequence[Any]]]]
+# buckets the rows of unordered comparisons are summed in, folded into as few as the
+# row count allows once it is known
+FINE_BUCKETS = 2**16
+
+
+def _canonical(value: Any) -> str:
+    """``value`` as text equal for equal values of different drivers and
+    types, e.g. ``Decimal("495699")``, ``495699`` and ``495699.0``."""
+    # the common types first, most values take no conversion
+    if type(value) is str:
+        return value
+    if type(value) is int:
+        return str(value)
+    if type(value) is float and value.is_integer():
+        return str(int(value))
+    if isinstance(value, (int, float, Decimal)):
+        number = Decimal(repr(value)) if isinstance(value, float) else Decimal(value)
+        return format(number.normalize(), "f") if number.is_finite() else str(number)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return "0x" + bytes(value).hex()
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return str(value.total_seconds())
+    return str(value)
+
+
+def row_key(row: Sequence[Any]) -> bytes:
+    """The canonical bytes of a row, hashed and compared.
+
+    Every value is prefixed with its length and None has a marker no text
+    has, so rows of different values never share a key (``("a,b",)`` and
+    ``("a", "b")``, None and ``""``).
+    """
+    parts = []
+    for value in row:
+        if value is None:
+            parts.append("-")
+        else:
+            text = _canonical(value)
+            parts.append(f"{len(text)}:{text}")
+    return "".join(parts).encode()
+
+
+def _row_hash(key: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+@dataclass(frozen=True)
+class RowDifference:
+    """A row of one side without its counterpart on the other.
+
+    :param row: Position of the row (ordered comparisons), None for
+        unordered comparisons.
+    :param actual: The row of the query, None if it has no such row.
+    :param expected: The expected row, None if none was expected.
+    """
+
+    row: Optional[int]
+    actual: Optional[Row]
+    expected: Optional[Row]
+
+
+@dataclass
+class ResultSetComparison:
+    ordered: bool
+    actual_rows: int = 0
+    expected_rows: int = 0
+    chunks: int = 0
+    differing_chunks: list[int] = field(default_factory=list)
+    differences: list[RowDifference] = field(default_factory=list)
+
+    @property
+    def equal(self) -> bool:
+        return not self.differing_chunks
+
+    def __str__(self) -> str:
+        if self.equal:
+            return f"{self.actual_rows} rows equal ({self.chunks} chunks)"
+        lines = [
+            f"{self.actual_rows} rows, {self.expected_rows} expected: "
+            f"{len(self.differing_chunks)} of {self.chunks} chunks differ"
+        ]
+        for difference in self.differences:
+            position = "" if difference.row is None else f"row {difference.row}: "
+            lines.append(
+                f"  {position}actual {difference.actual}, "
+                f"expected {difference.expected}"
+            )
+        return "\n".join(lines)
+
+
+class ResultSetComparator:
+    """Compares the result of a query with expected rows, or with the result
+    of another query, without keeping either in memory.
+
+    Both sides are streamed in batches and hashed in chunks: ordered
+    comparisons hash chunks of ``chunk_size`` consecutive rows, unordered
+    ones sum the row hashes per bucket (rows are assigned to a bucket by
+    their hash, so the order of the rows does not matter). The buckets are
+    summed finely and folded into as few as keep ``chunk_size`` rows per
+    bucket once the row count is known. Equal results take a single pass
+    over each side.
+
+    Only when chunks differ both sides are streamed again: ordered
+    comparisons stream both sides together (two connections of the pool
+    for :meth:`compare_queries`) and stop at the ``max_differences``-th
+    differing row, unordered ones keep the rows of the first differing
+    buckets to match them up.
+
+    Values are compared by their canonical text, a ``Decimal`` of one
+    driver equals the int of another.
+
+    :param db: Client running the queries.
+    :param ordered: Compare the rows in order, or as multisets.
+    :param chunk_size: Rows per chunk, or at most per bucket of unordered
+        comparisons (rows of equal hash share their bucket).
+    :param batch_size: Rows fetched at once.
+    :param max_differences: Differing rows reported at most.
+    """
+
+    def __init__(
+        self,
+        db: DatabaseClient,
+        ordered: bool = True,
+        chunk_size: int = 10_000,
+        batch_size: int = 1000,
+        max_differences: int = 20,
+    ):
+        self.db = db
+        self.ordered = ordered
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.max_differences = max_differences
+
+    def compare(
+        self, sql: str, expected: Expected, params: Sequence = ()
+    ) -> ResultSetComparison:
+        """Compare the rows of ``sql`` with ``expected``: a sequence of rows,
+        or a callable returning an iterable of them (called once per pass,
+        e.g. a generator function streaming a file)."""
+        return self._compare(self._query(sql, params), self._expected(expected))
+
+    def compare_queries(
+        self,
+        sql: str,
+        expected_sql: str,
+        params: Sequence = (),
+        expected_params: Sequence = (),
+    ) -> ResultSetComparison:
+        """Compare the rows of ``sql`` with the rows of ``expected_sql``."""
+        return self._compare(
+            self._query(sql, params), self._query(expected_sql, expected_params)
+        )
+
+    def _query(self, sql: str, params: Sequence) -> Batches:
+        return lambda: self.db.iterate(sql, params, self.batch_size)
+
+    def _expected(self, expected: Expected) -> Batches:
+        if not callable(expected) and iter(expected) is expected:
+            raise TypeError(
+                "Expected rows are read twice when they differ, pass a sequence "
+                "or a callable returning the rows"
+            )
+
+        def batches() -> Generator[list[Row], None, None]:
+            rows = iter(expected() if callable(expected) else expected)
+            while batch := [
+                tuple(row) for row in itertools.islice(rows, self.batch_size)
+            ]:
+                yield batch
+
+        return batches
+
+    def _digests(self, batches: Batches) -> dict[int, tuple]:
+        """The row count and digest of each chunk: the hash of its rows in
+        order, or the sum of their hashes per fine bucket."""
+        position, sums, counts = 0, {}, Counter()
+        hashers: dict[int, Any] = {}
+        for batch in batches():
+            for row in batch:
+                key = row_key(row)
+                if self.ordered:
+                    chunk = position // self.chunk_size
+                    hasher = hashers.get(chunk)
+                    if hasher is None:
+                        hasher = hashers[chunk] = hashlib.blake2b(digest_size=16)
+                    hasher.update(key)
+                    hasher.update(b"\x1e")
+                else:
+                    row_hash = _row_hash(key)
+                    chunk = row_hash % FINE_BUCKETS
+                    sums[chunk] = (sums.get(chunk, 0) + row_hash) & (2**64 - 1)
+                counts[chunk] += 1
+                position += 1
+        if self.ordered:
+            return {
+                chunk: (counts[chunk], hasher.digest())
+                for chunk, hasher in hashers.items()
+            }
+        return {chunk: (counts[chunk], sums[chunk]) for chunk in counts}
+
+    def _bucket_count(self, *digests: dict[int, tuple]) -> int:
+        """The fewest buckets (a power of two dividing the fine buckets) that
+        keep ``chunk_size`` rows per bucket on either side."""
+        rows = max(sum(count for count, _ in side.values()) for side in digests)
+        buckets = 1
+        while buckets < FINE_BUCKETS and (
+            buckets * self.chunk_size < rows
+            or any(
+                max((count for count, _ in self._fold(side, buckets).values()))
+                > self.chunk_size
+                for side in digests
+                if side
+            )
+        ):
+            buckets *= 2
+        return buckets
+
+    @staticmethod
+    def _fold(digests: dict[int, tuple], buckets: int) -> dict[int, tuple]:
+        folded: dict[int, tuple] = {}
+        for fine, (count, total) in digests.items():
+            bucket = fine % buckets
+            previous_count, previous_total = folded.get(bucket, (0, 0))
+            folded[bucket] = (
+                previous_count + count,
+                (previous_total + total) & (2**64 - 1),
+            )
+        return folded
+
+    def _compare(self, actual: Batches, expected: Batches) -> ResultSetComparison:
+        comparison = ResultSetComparison(self.ordered)
+        actual_digests = self._digests(actual)
+        expected_digests = self._digests(expected)
+        comparison.actual_rows = sum(count for count, _ in actual_digests.values())
+        comparison.expected_rows = sum(count for count, _ in expected_digests.values())
+        buckets = 0
+        if not self.ordered:
+            buckets = self._bucket_count(actual_digests, expected_digests)
+            actual_digests = self._fold(actual_digests, buckets)
+            expected_digests = self._fold(expected_digests, buckets)
+        chunks = sorted(actual_digests.keys() | expected_digests.keys())
+        comparison.chunks = len(chunks)
+        comparison.differing_chunks = [
+            chunk
+            for chunk in chunks
+            if actual_digests.get(chunk) != expected_digests.get(chunk)
+        ]
+        if not comparison.differing_chunks:
+            return comparison
+        if self.ordered:
+            comparison.differences = self._ordered_differences(
+                actual, expected, comparison.differing_chunks
+            )
+        else:
+            comparison.differences = self._unordered_differences(
+                actual, expected, comparison.differing_chunks, buckets
+            )
+        return comparison
+
+    def _ordered_differences(
+        self, actual: Batches, expected: Batches, differing: list[int]
+    ) -> list[RowDifference]:
+        """The first differing rows, streaming both sides together up to the
+        ``max_differences``-th."""
+        chunks = set(differing)
+        last_row = (differing[-1] + 1) * self.chunk_size
+        differences = []
+        actual_batches, expected_batches = actual(), expected()
+        try:
+            rows = itertools.zip_longest(
+                itertools.chain.from_iterable(actual_batches),
+                itertools.chain.from_iterable(expected_batches),
+            )
+            for position, (actual_row, expected_row) in enumerate(rows):
+                if position == last_row:
+                    break
+                if position // self.chunk_size not in chunks:
+                    continue
+                if (
+                    actual_row is None
+                    or expected_row is None
+                    or row_key(actual_row) != row_key(expected_row)
+                ):
+                    differences.append(
+                        RowDifference(position, actual_row, expected_row)
+                    )
+                    if len(differences) == self.max_differences:
+                        break
+        finally:
+            # a query stopped early gives its connection back
+            actual_batches.close()
+            expected_batches.close()
+        return differences
+
+    def _unordered_differences(
+        self, actual: Batches, expected: Batches, differing: list[int], buckets: int
+    ) -> list[RowDifference]:
+        """The rows without counterpart of the first differing buckets, each
+        has at least one."""
+        chunks = set(differing[: self.max_differences])
+        actual_rows = self._rows_of(actual, chunks, buckets)
+        expected_rows = self._rows_of(expected, chunks, buckets)
+        differences = []
+        for chunk in sorted(chunks):
+            # by key, a Decimal of one side equals the str or int of the other
+            rows = {
+                row_key(row): row
+                for row in actual_rows.get(chunk, []) + expected_rows.get(chunk, [])
+            }
+            actual_counts = Counter(map(row_key, actual_rows.get(chunk, ())))
+            expected_counts = Counter(map(row_key, expected_rows.get(chunk, ())))
+            for key, count in (actual_counts - expected_counts).items():
+                differences += [RowDifference(None, rows[key], None)] * count
+            for key, count in (expected_counts - actual_counts).items():
+                differences += [RowDifference(None, None, rows[key])] * count
+            if len(differences) >= self.max_differences:
+                break
+        return differences[: self.max_differences]
+
+    @staticmethod
+    def _rows_of(
+        batches: Batches, chunks: set[int], buckets: int
+    ) -> dict[int, list[Row]]:
+        kept: dict[int, list[Row]] = {}
+        for batch in batches():
+            for row in batch:
+                chunk = _row_hash(row_key(row)) % FINE_BUCKETS % buckets
+                if chunk in chunks:
+                    kept.setdefault(chunk, []).append(row)
+        return kept
@@ -0,0 +1,129 @@
+import base64
+import hashlib
+import math
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Optional
+
+from PIL import Image
+from selenium import webdriver
+
+# Chrome fails to capture beyond its maximal texture size, tiles stay well below it
+MAX_TILE_HEIGHT = 4096
+# webp images cannot be any larger
+WEBP_MAX_DIMENSION = 16383
+
+
+@dataclass
+class Screenshot:
+    data: bytes
+    image_format: str
+    digest: str
+
+
+class ScreenshotEngine:
+    """Captures full page screenshots over CDP in bounded tiles.
+
+    Pages that fit in a single tile are captured and encoded by the browser
+    directly. Taller pages are captured tile by tile and stitched, so neither
+    the browser nor the test process ever holds more than one tile plus the
+    (downscaled) result. Downscaling happens in the browser through the clip
+    scale, before anything is encoded or transferred.
+
+    The engine remembers the digests it produced per key (e.g. the test id),
+    so the same screenshot is attached once - a rerun of a test failing on an
+    unchanged page does not attach it again.
+
+    :param image_format: ``png``, ``jpeg`` or ``webp``.
+    :param quality: Compression quality (0-100) for ``jpeg`` and ``webp``.
+    :param scale: Downscale factor, ``0.5`` halves width and height.
+    :param tile_height: Height of a tile in CSS pixels.
+    :param max_height: Pages are cut at this height in CSS pixels.
+    """
+
+    def __init__(
+        self,
+        image_format: str = "png",
+        quality: int = 80,
+        scale: float = 1.0,
+        tile_height: int = MAX_TILE_HEIGHT,
+        max_height: int = 30000,
+    ):
+        self.image_format = image_format
+        self.quality = quality
+        self.scale = scale
+        self.tile_height = min(tile_height, MAX_TILE_HEIGHT)
+        self.max_height = max_height
+        self._digests: set[tuple[str, str]] = set()
+
+    def capture_full_page(self, driver: webdriver.Chrome) -> Screenshot:
+        """Gets full page screenshot of the current window."""
+        metrics = driver.execute_cdp_cmd("Page.getLayoutMetrics", {})
+        size = metrics.get("cssContentSize") or metrics["contentSize"]
+        width = math.ceil(size["width"])
+        height = min(math.ceil(size["height"]), self.max_height)
+        if height <= self.tile_height:
+            data = self._capture(driver, 0, width, height, self.image_format)
+        else:
+            data = self._capture_tiled(driver, width, height)
+        return Screenshot(
+            data=data,
+            image_format=self.image_format,
+            digest=hashlib.sha256(data).hexdigest(),
+        )
+
+    def is_new(self, key: str, screenshot: Screenshot) -> bool:
+        """Return ``False`` when an identical screenshot was already seen for
+        ``key``."""
+        if (key, screenshot.digest) in self._digests:
+            return False
+        self._digests.add((key, screenshot.digest))
+        return True
+
+    def _capture_tiled(
+        self, driver: webdriver.Chrome, width: int, height: int
+    ) -> bytes:
+        canvas: Optional[Image.Image] = None
+        offset = 0
+        for top in range(0, height, self.tile_height):
+            tile_height = min(self.tile_height, height - top)
+            with Image.open(
+                BytesIO(self._capture(driver, top, width, tile_height, "png"))
+            ) as tile:
+                if canvas is None:
+                    # pixels per CSS pixel, includes the device scale factor
+                    ratio = tile.width / width
+                    canvas = Image.new("RGB", (tile.width, round(height * ratio)))
+                canvas.paste(tile.convert("RGB"), (0, offset))
+                offset += tile.height
+        if self.image_format == "webp" and canvas.height > WEBP_MAX_DIMENSION:
+            canvas = canvas.crop((0, 0, canvas.width, WEBP_MAX_DIMENSION))
+        output = BytesIO()
+        canvas.save(output, format=self.image_format.upper(), quality=self.quality)
+        return output.getvalue()
+
+    def _capture(
+        self,
+        driver: webdriver.Chrome,
+        top: int,
+        width: int,
+        height: int,
+        image_format: str,
+    ) -> bytes:
+        params = {
+            "format": image_format,
+            "clip": {
+                "x": 0,
+                "y": top,
+                "width": width,
+                "height": height,
+                "scale": self.scale,
+            },
+            "captureBeyondViewport": True,
+            "optimizeForSpeed": True,
+        }
+        if image_format != "png":
+            params["quality"] = self.quality
+        return base64.b64decode(
+            driver.execute_cdp_cmd("Page.captureScreenshot", params)["data"]
+        )
@@ -0,0 +1,218 @@
+import base64
+import hashlib
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional, Protocol
+
+import allure
+from allure_commons.types import AttachmentType
+
+from utilities.baseline_store import BaselineKey, BaselineStore, perceptual_hash
+from utilities.constants import Constants
+from utilities.image_diff import DiffResult, IgnoreArea, ImageDiffEngine, to_array
+
+VISUAL_BACKENDS = ("local", "vrt")
+# statuses of a VRT server a check passes with, besides ours
+PASSED_STATUSES = frozenset({"ok", "new", "updated", "approved", "autoapproved"})
+
+Attach = Callable[[bytes, str, AttachmentType], None]
+
+
+@dataclass
+class VisualCheck:
+    """Outcome of comparing a capture with its baseline.
+
+    :param status: ``ok``, ``new`` (no baseline yet, the capture became it),
+        ``missing`` (no baseline and none saved), ``updated`` (the capture
+        replaced the baseline) or ``unresolved`` (differs from the baseline),
+        or another status of the VRT server.
+    """
+
+    name: str
+    status: str
+    diff_percent: float = 0.0
+    details: str = ""
+
+    @property
+    def passed(self) -> bool:
+        return self.status in PASSED_STATUSES
+
+    def __str__(self) -> str:
+        return f"{self.name}: {self.status} {self.details}".strip()
+
+
+class VisualBackend(Protocol):
+    def start(self) -> None: ...
+
+    def stop(self) -> None: ...
+
+    def track(
+        self,
+        name: str,
+        image: bytes,
+        ignore_areas: Iterable[IgnoreArea] = (),
+        viewport: str = "any",
+    ) -> VisualCheck: ...
+
+
+class LocalDiffBackend:
+    """Compares captures with the baselines of a :class:`BaselineStore`, no
+    server involved.
+
+    A capture byte identical to its baseline (by digest) passes without a
+    pixel diff and without loading the baseline, any other capture is
+    compared pixel by pixel. A capture without a baseline becomes the
+    baseline, unless ``save_new`` is off: then it fails as ``missing``.
+    Failed comparisons
+    keep the capture as pending in the store and attach the baseline, the
+    capture and the heatmap of the differences.
+
+    :param store: Store of the baselines.
+    :param browser: Browser of the captures, part of the baseline keys.
+    :param engine: Engine comparing the images.
+    :param attach: Attaches a failure's images, like ``allure.attach``.
+    :param perceptual_match: Pass captures with the perceptual hash of their
+        baseline without a pixel diff. Off by default: the hash is taken from
+        a 17x16 thumbnail, a changed line of text leaves it as it was.
+    :param update: Make every capture the baseline instead of comparing it.
+    :param save_new: Save captures without a baseline as their baseline. Off
+        in CI, where such a check would compare nothing and the workers of a
+        parallel run would race to write the baselines.
+    """
+
+    def __init__(
+        self,
+        store: Optional[BaselineStore] = None,
+        browser: str = "any",
+        engine: Optional[ImageDiffEngine] = None,
+        attach: Attach = allure.attach,
+        perceptual_match: bool = False,
+        update: bool = False,
+        save_new: bool = True,
+    ):
+        self.store = store or BaselineStore(Constants.BASELINES_PATH)
+        self.browser = browser
+        self.engine = engine or ImageDiffEngine()
+        self.attach = attach
+        self.perceptual_match = perceptual_match
+        self.update = update
+        self.save_new = save_new
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    def has_baseline(self, name: str) -> bool:
+        """Whether ``name`` has a baseline for the browser, in any viewport."""
+        return any(
+            entry.name == name and entry.browser == self.browser
+            for entry in self.store.entries()
+        )
+
+    def track(
+        self,
+        name: str,
+        image: bytes,
+        ignore_areas: Iterable[IgnoreArea] = (),
+        viewport: str = "any",
+    ) -> VisualCheck:
+        key = BaselineKey(name, self.browser, viewport)
+        entry = self.store.get(key)
+        if entry is None and not self.save_new:
+            self.attach(image, f"Actual: {name}", AttachmentType.PNG)
+            return VisualCheck(name, "missing", details="no baseline to compare with")
+        if entry is None or self.update:
+            self.store.save(key, image)
+            if entry is None:
+                self.attach(image, f"New baseline: {name}", AttachmentType.PNG)
+                return VisualCheck(name, "new", details="baseline saved")
+            return VisualCheck(name, "updated", details="baseline replaced")
+        if hashlib.sha256(image).hexdigest() == entry.sha256:
+            return VisualCheck(name, "ok", details="byte identical")
+        actual = to_array(image)
+        if self.perceptual_match and perceptual_hash(actual) == entry.phash:
+            return VisualCheck(name, "ok", details="perceptually identical")
+        expected = self.store.load(entry)
+        result: DiffResult = self.engine.compare(expected, actual, ignore_areas)
+        if result.passed:
+            return VisualCheck(name, "ok", result.diff_percent, str(result))
+        self.store.add_pending(key, image)
+        self.attach(
+            (self.store.directory / entry.file).read_bytes(),
+            f"Baseline: {name}",
+            AttachmentType.PNG,
+        )
+        self.attach(image, f"Actual: {name}", AttachmentType.PNG)
+        if result.heatmap:
+            self.attach(result.heatmap, f"Diff: {name}", AttachmentType.PNG)
+        return VisualCheck(name, "unresolved", result.diff_percent, str(result))
+
+
+class VrtServerBackend:
+    """Compares captures on a Visual Regression Tracker server, configured
+    with the ``VRT_*`` environment variables."""
+
+    def __init__(
+        self,
+        browser: str = "any",
+        tolerance_percent: float = Constants.DIFF_TOLERANCE_PERCENT,
+    ):
+        from visual_regression_tracker import VisualRegressionTracker
+
+        self.browser = browser
+        self.tolerance_percent = tolerance_percent
+        self.vrt_tracker = VisualRegressionTracker()
+
+    def start(self) -> None:
+        self.vrt_tracker.start()
+
+    def stop(self) -> None:
+        self.vrt_tracker.stop()
+
+    def track(
+        self,
+        name: str,
+        image: bytes,
+        ignore_areas: Iterable[IgnoreArea] = (),
+        viewport: str = "any",
+    ) -> VisualCheck:
+        from visual_regression_tracker import IgnoreArea as VrtIgnoreArea
+        from visual_regression_tracker import TestRun
+
+        response = self.vrt_tracker.track(
+            TestRun(
+                name=name,
+                browser=self.browser,
+                viewport=viewport,
+                diffTollerancePercent=self.tolerance_percent,
+                imageBase64=base64.b64encode(image).decode(),
+                ignoreAreas=[
+                    VrtIgnoreArea(
+                        x=area.x, y=area.y, width=area.width, height=area.height
+                    )
+                    for area in ignore_areas
+                ],
+            )
+        ).testRunResponse
+        return VisualCheck(
+            name,
+            response.status.name.lower(),
+            getattr(response, "diffPercent", None) or 0.0,
+            getattr(response, "url", None) or "",
+        )
+
+
+def create_visual_backend(
+    name: str,
+    browser: str,
+    store: Optional[BaselineStore] = None,
+    attach: Attach = allure.attach,
+    update: bool = False,
+    save_new: bool = True,
+) -> VisualBackend:
+    if name == "vrt":
+        return VrtServerBackend(browser)
+    return LocalDiffBackend(
+        store, browser, attach=attach, update=update, save_new=save_new
+    )
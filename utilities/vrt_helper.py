@@ -1,210 +1,346 @@
-import re
-import time
+import io
+import math
 from contextlib import suppress
-from typing import Tuple, Union
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Iterable, Optional, Tuple, Union
 
+import allure
+import numpy as np
+from allure_commons.types import AttachmentType
+from PIL import Image
 from pytest_check import check
 from selenium.webdriver import Chrome, Edge, Firefox
-from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.webelement import WebElement
-from selenium.webdriver.support import expected_conditions
 from selenium.webdriver.support.wait import WebDriverWait
-from utilities.constants import Constants
+from utilities.censor_engine import (
+    CARD_EXPIRATION_RULES,
+    DATE_RULES,
+    TIME_RULES,
+    CensorEngine,
+)
+from utilities.image_diff import IgnoreArea, to_array
+from utilities.page_stability import PageStabilityDetector, StabilityReport
+from utilities.screenshot_engine import ScreenshotEngine
+from utilities.visual_backends import (
+    Attach,
+    LocalDiffBackend,
+    VisualBackend,
+    VisualCheck,
+)
+from utilities.wait_engine import ELEMENT_FUNCTIONS, Target, script_locator
+
+
+# rectangles (viewport relative, in CSS pixels) of elements, by locator or element, with
+# what is needed to map them onto a screenshot
+LAYOUT_SCRIPT = (
+    ELEMENT_FUNCTIONS
+    + """
+const rects = arguments[0].map(([using, value, element]) => {
+  const target = element || findElement(using, value);
+  if (!target) return null;
+  const rect = target.getBoundingClientRect();
+  return [rect.x, rect.y, rect.width, rect.height];
+});
+return {
+  rects: rects,
+  ratio: window.devicePixelRatio,
+  scrollX: window.scrollX,
+  scrollY: window.scrollY,
+  width: window.innerWidth,
+  height: window.innerHeight,
+};
+"""
+)
+
+
+@dataclass
+class _Capture:
+    """A screenshot and the rectangles of the elements in it."""
+
+    png: bytes
+    ratio: float
+    offset: tuple[float, float]
+    rects: list[Optional[list[float]]]
+    viewport: str
+
+    @cached_property
+    def pixels(self) -> np.ndarray:
+        return to_array(self.png)
+
+    def area(
+        self, rect: Optional[list[float]], clip: bool = False
+    ) -> Optional[IgnoreArea]:
+        """Pixels of a rectangle within the screenshot, ``None`` when it is not
+        completely in there - or, clipped, not in there at all."""
+        if not rect or rect[2] <= 0 or rect[3] <= 0:
+            return None
+        left = math.floor((rect[0] + self.offset[0]) * self.ratio)
+        top = math.floor((rect[1] + self.offset[1]) * self.ratio)
+        right = math.ceil((rect[0] + self.offset[0] + rect[2]) * self.ratio)
+        bottom = math.ceil((rect[1] + self.offset[1] + rect[3]) * self.ratio)
+        height, width = self.pixels.shape[:2]
+        if clip:
+            left, top = max(left, 0), max(top, 0)
+            right, bottom = min(right, width), min(bottom, height)
+            if right <= left or bottom <= top:
+                return None
+        elif left < 0 or top < 0 or right > width or bottom > height:
+            return None
+        return IgnoreArea(left, top, right - left, bottom - top)
+
+    def crop(self, area: IgnoreArea) -> bytes:
+        pixels = self.pixels[
+            area.y : area.y + area.height, area.x : area.x + area.width
+        ]
+        output = io.BytesIO()
+        Image.fromarray(np.ascontiguousarray(pixels)).save(
+            output, "PNG", compress_level=1
+        )
+        return output.getvalue()
+
+
+def _relative(area: IgnoreArea, within: IgnoreArea) -> Optional[IgnoreArea]:
+    """The part of ``area`` overlapping ``within``, relative to ``within``."""
+    left, top = max(area.x, within.x), max(area.y, within.y)
+    right = min(area.x + area.width, within.x + within.width)
+    bottom = min(area.y + area.height, within.y + within.height)
+    if right <= left or bottom <= top:
+        return None
+    return IgnoreArea(left - within.x, top - within.y, right - left, bottom - top)
 
 
 class VrtHelper:
-    """Helper class for capturing and comparing screenshots in Visual
-    Regression Tracker (VRT).
+    """Helper class for capturing screenshots and comparing them with their
+    baselines, locally or in Visual Regression Tracker (VRT).
 
     :param driver: The web driver instance (e.g., Chrome, Firefox,
         Edge).
-    :param vrt_tracker: The Visual Regression Tracker for comparing
-        screenshots.
     :param wait: The WebDriverWait instance for element synchronization.
+    :param backend: Backend comparing the screenshots with the baselines,
+        the local pixel diff by default.
+    :param censor_engine: Engine replacing the volatile text before a
+        screenshot, dates, times and card expirations by default.
+    :param stability_detector: Detector waiting for the page to settle
+        before a screenshot.
+    :param attach: Attaches the stability report of every capture, like
+        ``allure.attach``.
     """
 
     def __init__(
         self,
         driver: Union[Chrome, Firefox, Edge],
-        #vrt_tracker: VisualRegressionTracker,
         wait: WebDriverWait,
+        backend: Optional[VisualBackend] = None,
+        censor_engine: Optional[CensorEngine] = None,
+        stability_detector: Optional[PageStabilityDetector] = None,
+        attach: Attach = allure.attach,
     ):
         self.driver = driver
-        #self.vrt_tracker = vrt_tracker
         self.wait = wait
+        self.backend = backend or LocalDiffBackend()
+        self.censor_engine = censor_engine or CensorEngine()
+        self.stability_detector = stability_detector or PageStabilityDetector(driver)
+        self.attach = attach
 
-    # def shoot_page(self, baseline_name: str):
-    #     """Capture a screenshot of the current page compare the captured
-    #     screenshot with a baseline image stored in Visual Regression tracker.
-    #
-    #     :param baseline_name: A descriptive name for the baseline image.
-    #     :return: None
-    #     """
-    #     # time.sleep(8)
-    #     # with suppress(Exception):
-    #     #     self.censor_all_times()
-    #     #     self.censor_all_dates()
-    #     #     self.censor_credit_card_expiration()
-    #     # check.equal(
-    #     #     # self.vrt_tracker.track(
-    #     #     #     TestRun(
-    #     #     #         name=baseline_name,
-    #     #     #         diffTollerancePercent=Constants.DIFF_TOLERANCE_PERCENT,
-    #     #     #         imageBase64=self.driver.get_screenshot_as_base64(),
-    #     #     #     )
-    #     #     # ).testRunResponse.status.name,
-    #     #     #TestRunStatus.OK.name,
-    #     )
+    def shoot_page(
+        self,
+        baseline_name: str,
+        ignore: Iterable[Target] = (),
+        full_page: bool = False,
+    ) -> VisualCheck:
+        """Capture a screenshot of the current page and compare it with its
+        baseline.
+
+        :param baseline_name: A descriptive name for the baseline image.
+        :param ignore: Locators or WebElements of areas left out of the
+            comparison.
+        :param full_page: Capture the whole page instead of the viewport
+            (chrome only).
+        :return: The outcome of the comparison.
+        """
+        capture = self._capture([], list(ignore), full_page)
+        areas = [area for rect in capture.rects if (area := capture.area(rect, True))]
+        return self._check(
+            self.backend.track(baseline_name, capture.png, areas, capture.viewport)
+        )
 
     def shoot_page_ang_ignore_elements(
         self, baseline_name: str, elements: list[WebElement]
-    ):
+    ) -> VisualCheck:
         """Capture a screenshot of the current page, define areas to be ignored
-        within the screenshot, compare the captured screenshot with a baseline
-        image stored in Visual Regression tracker.
+        within the screenshot, compare the captured screenshot with its
+        baseline.
 
         :param baseline_name: A descriptive name for the baseline image.
         :type baseline_name: str
         :param elements: A list of WebElements to be ignored in the
             screenshot.
-        :return: None
+        :return: The outcome of the comparison.
         """
-        time.sleep(8)
-        with suppress(Exception):
-            self.censor_all_times()
-            self.censor_all_dates()
-            self.censor_credit_card_expiration()
-        ignore_areas = []
-
-        for element_to_ignore in elements:
-            ignore_areas.append(
-                IgnoreArea(
-                    x=element_to_ignore.location["x"],
-                    y=element_to_ignore.location["y"],
-                    width=element_to_ignore.size["width"],
-                    height=element_to_ignore.size["height"],
-                )
-            )
-            check.equal(
-                self.vrt_tracker.track(
-                    TestRun(
-                        name=baseline_name,
-                        diffTollerancePercent=Constants.DIFF_TOLERANCE_PERCENT,
-                        imageBase64=self.driver.get_screenshot_as_base64(),
-                        ignoreAreas=ignore_areas,
-                    )
-                ).testRunResponse.status.name,
-            )
+        return self.shoot_page(baseline_name, elements)
 
-    def shoot_element(self, baseline_name: str, locator: Tuple[str, str]):
-        """Capture a screenshot of a specific element on the current page
-        compare the captured screenshot with a baseline image stored in Visual
-        Regression tracker.
+    def shoot_element(
+        self, baseline_name: str, locator: Tuple[str, str]
+    ) -> VisualCheck:
+        """Capture a screenshot of a specific element on the current page and
+        compare it with its baseline.
 
         :param baseline_name: A descriptive name for the baseline image.
         :type baseline_name: str
         :param locator: A tuple containing the type and value of the
             element locator (e.g., (By.ID, 'element_id')).
-        :return: None
+        :return: The outcome of the comparison.
         """
-        time.sleep(8)
-        with suppress(Exception):
-            self.censor_all_times()
-            self.censor_all_dates()
-            self.censor_credit_card_expiration()
-        element_to_shoot: WebElement = self.wait.until(
-            expected_conditions.visibility_of_element_located(locator)
+        return self.shoot_elements({baseline_name: locator})[0]
+
+    def shoot_elements(
+        self,
+        baselines: dict[str, Target],
+        ignore: Iterable[Target] = (),
+        full_page: bool = False,
+    ) -> list[VisualCheck]:
+        """Compare any number of elements of the current page with their
+        baselines, from a single capture.
+
+        The rectangles of all elements are read with one script, the
+        elements are cropped from one screenshot of the viewport (or of the
+        whole page, when an element lies outside of the viewport and the
+        browser supports it) - checking ten components costs one capture.
+
+        :param baselines: Locators or WebElements by baseline name.
+        :param ignore: Locators or WebElements of areas left out of the
+            comparisons, wherever they overlap an element.
+        :param full_page: Capture the whole page instead of the viewport
+            (chrome only).
+        :return: The outcomes of the comparisons, in order.
+        """
+        targets = list(baselines.values())
+        capture = self._capture(targets, list(ignore), full_page)
+        ignored = [
+            area
+            for rect in capture.rects[len(targets) :]
+            if (area := capture.area(rect, True))
+        ]
+        results = []
+        for name, rect in zip(baselines, capture.rects):
+            area = capture.area(rect)
+            if area is None:
+                results.append(
+                    self._check(
+                        VisualCheck(name, "unresolved", 100.0, "not within the capture")
+                    )
+                )
+                continue
+            results.append(
+                self._check(
+                    self.backend.track(
+                        name,
+                        capture.crop(area),
+                        [
+                            local
+                            for local in (_relative(other, area) for other in ignored)
+                            if local
+                        ],
+                        capture.viewport,
+                    )
+                )
+            )
+        return results
+
+    def _capture(
+        self, targets: list[Target], ignore: list[Target], full_page: bool
+    ) -> "_Capture":
+        """Settle the page, read the rectangles of the targets and ignored
+        areas and capture the viewport, or the page when asked to or when a
+        target is outside of the viewport. The stability report is attached to
+        the test, a page captured before it settled explains a flaky diff."""
+        report = self.prepare_capture()
+        self.attach(
+            str(report).encode(),
+            "Page stability" if report.stable else "Page stability: not stable",
+            AttachmentType.TEXT,
         )
-        check.equal(
-            self.vrt_tracker.track(
-                TestRun(
-                    name=baseline_name,
-                    diffTollerancePercent=Constants.DIFF_TOLERANCE_PERCENT,
-                    imageBase64=element_to_shoot.screenshot_as_base64,
+        layout = self.driver.execute_script(
+            LAYOUT_SCRIPT,
+            [
+                (
+                    [None, None, target]
+                    if isinstance(target, WebElement)
+                    else [*script_locator(target), None]
                 )
-            ).testRunResponse.status.name,
-            TestRunStatus.OK.name,
+                for target in targets + ignore
+            ],
         )
+        can_capture_page = hasattr(self.driver, "execute_cdp_cmd")
+        beyond_viewport = any(
+            rect
+            and (
+                rect[0] < 0
+                or rect[1] < 0
+                or rect[0] + rect[2] > layout["width"]
+                or rect[1] + rect[3] > layout["height"]
+            )
+            for rect in layout["rects"][: len(targets)]
+        )
+        if can_capture_page and (full_page or beyond_viewport):
+            png = ScreenshotEngine().capture_full_page(self.driver).data
+            offset = (layout["scrollX"], layout["scrollY"])
+        else:
+            png = self.driver.get_screenshot_as_png()
+            offset = (0, 0)
+        return _Capture(
+            png=png,
+            ratio=layout["ratio"],
+            offset=offset,
+            rects=layout["rects"],
+            viewport=f"{layout['width']}x{layout['height']}",
+        )
+
+    @staticmethod
+    def _check(result: VisualCheck) -> VisualCheck:
+        check.is_true(result.passed, str(result))
+        return result
+
+    def prepare_capture(self) -> StabilityReport:
+        """Wait for the page to settle, then censor its volatile text.
+
+        :return: How long the page took to settle.
+        """
+        report = self.stability_detector.wait()
+        with suppress(Exception):
+            self.censor()
+        return report
+
+    def censor(self) -> dict[str, int]:
+        """Replaces the text matching the rules of the censor engine (dates,
+        times and card expirations by default) with "placeholder" characters,
+        in a single pass over the page.
+
+        :return: The number of replacements per rule.
+        """
+        return self.censor_engine.censor(self.driver)
 
     def censor_all_dates(self) -> None:
         """Replaces the dates in the text of all elements with "placeholder"
-        characters in the format 'mmm dd, yyyy'.
+        characters in the format 'mmm dd, yyyy' (or 'mmm dd' without a year).
 
-        This method iterates through each month and finds elements
-        containing that month in the text. It then replaces the day and
-        year or just the day in the text with placeholders.
         :return: None
         """
-        day_and_year_regex = r" [0-3]?[0-9], [0-9]{4}"
-        day_regex = r" [0-3]?[0-9]"
-        months = [
-            "Jan",
-            "Feb",
-            "Mar",
-            "Apr",
-            "May",
-            "Jun",
-            "Jul",
-            "Aug",
-            "Sep",
-            "Oct",
-            "Nov",
-            "Dec",
-        ]
-        for month in months:
-            elements_with_month = self.driver.find_elements(
-                By.XPATH, f"//p[contains(. , '{month}')]"
-            )
-            elements_with_month += self.driver.find_elements(
-                By.XPATH, f"//*[contains(text(), '{month}')]"
-            )
-
-            if elements_with_month:
-                for element_with_month in elements_with_month:
-                    element_text = element_with_month.text
-                    element_text = re.sub(
-                        f"{month}{day_and_year_regex}", "mmm dd, yyyy", element_text
-                    )
-                    element_text = re.sub(f"{month}{day_regex}", "mmm dd", element_text)
-
-                    self.driver.execute_script(
-                        f"arguments[0].innerHTML='{element_text}';",
-                        element_with_month,
-                    )
+        self.censor_engine.censor(self.driver, DATE_RULES)
 
     def censor_credit_card_expiration(self) -> None:
-        """Replaces credit card expiration dates in the text of elements
-        containing the text 'Expires' with 'placeholder' characters.
+        """Replaces credit card expiration dates ('Expires 12/2027') in the
+        text of elements with 'placeholder' characters.
 
         :return: None
         """
-        if credit_card_expiration_element := self.driver.find_elements(
-            By.XPATH, "//p[contains(. , 'Expires')]"
-        ):
-            element_text = "Expires mm/dddd"
-            self.driver.execute_script(
-                f"arguments[0].innerHTML='{element_text}';",
-                credit_card_expiration_element[0],
-            )
+        self.censor_engine.censor(self.driver, CARD_EXPIRATION_RULES)
 
     def censor_all_times(self) -> None:
         """Replaces the times (hours:minutes AM/PM) in the text of all elements
         with "placeholder" characters in the format 'hh:mm AA'.
 
-        Finds elements with text containing ':' and 'AM' or 'PM', then
-        replaces the time format with placeholders.
         :return: None
         """
-        time_regex = r"\d{1,2}:\d{1,2} (AM|PM)"
-        elements_with_time = self.driver.find_elements(
-            By.XPATH,
-            "//*[text()[contains(., ':') and (contains(., 'AM') or contains(., 'PM'))]]",
-        )
-
-        for element_with_time in elements_with_time:
-            element_text = element_with_time.text
-            element_text = re.sub(time_regex, "hh:mm AA", element_text)
-
-            self.driver.execute_script(
-                f"arguments[0].innerHTML='{element_text}';", element_with_time
-            )
+        self.censor_engine.censor(self.driver, TIME_RULES)
@@ -0,0 +1,249 @@
+import time
+from typing import Tuple, Union
+
+from selenium.common.exceptions import (
+    InvalidSelectorException,
+    JavascriptException,
+    StaleElementReferenceException,
+    TimeoutException,
+)
+from selenium.webdriver import Chrome, Edge, Firefox
+from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.webelement import WebElement
+from selenium.webdriver.support import expected_conditions
+from selenium.webdriver.support.wait import WebDriverWait
+
+Target = Union[Tuple[str, str], WebElement]
+
+WAIT_ENGINES = ("polling", "observer")
+
+# finding elements of a script locator and checking their condition inside the page
+ELEMENT_FUNCTIONS = """
+const matchesLinkText = (using, value) => (link) => {
+  const text = link.innerText.trim();
+  return using === "link text" ? text === value : text.includes(value);
+};
+const findElement = (using, value) => {
+  if (using === "xpath") {
+    return document.evaluate(
+      value, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null
+    ).singleNodeValue;
+  }
+  if (using === "link text" || using === "partial link text") {
+    return [...document.querySelectorAll("a")].find(matchesLinkText(using, value)) || null;
+  }
+  return document.querySelector(value);
+};
+const findElements = (using, value) => {
+  if (using === "xpath") {
+    const result = document.evaluate(
+      value, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null
+    );
+    return Array.from({length: result.snapshotLength}, (_, i) => result.snapshotItem(i));
+  }
+  if (using === "link text" || using === "partial link text") {
+    return [...document.querySelectorAll("a")].filter(matchesLinkText(using, value));
+  }
+  return [...document.querySelectorAll(value)];
+};
+const isVisible = (element) => {
+  if (element.checkVisibility && !element.checkVisibility({
+    checkOpacity: true, checkVisibilityCSS: true
+  })) return false;
+  const style = getComputedStyle(element);
+  if (style.display === "none" || style.visibility === "hidden") return false;
+  const rect = element.getBoundingClientRect();
+  return rect.width > 0 && rect.height > 0;
+};
+const conditionHolds = (condition, element) => {
+  if (condition === "present") return true;
+  if (condition === "visible") return isVisible(element);
+  return isVisible(element) && !element.matches(":disabled");
+};
+"""
+
+# waitFor() resolves with the element once the condition holds, re-checking on DOM
+# mutations, finished transitions/animations and a slow in-page timer for what observers
+# miss. Shared by the scripts waiting inside the page.
+WAIT_FOR_FUNCTION = (
+    ELEMENT_FUNCTIONS
+    + """
+const waitFor = (using, value, condition, timeout, target) => new Promise((resolve) => {
+  const EVENTS = ["transitionend", "animationend", "load"];
+  let finished = false, scheduled = false, observer, timer, poll;
+  const finish = (result) => {
+    if (finished) return;
+    finished = true;
+    observer.disconnect();
+    clearTimeout(timer);
+    clearInterval(poll);
+    EVENTS.forEach((type) => document.removeEventListener(type, schedule, true));
+    resolve(result);
+  };
+  const check = () => {
+    scheduled = false;
+    if (finished) return;
+    if (target && !target.isConnected) return finish({stale: true});
+    let element;
+    try {
+      element = target || findElement(using, value);
+    } catch (error) {
+      return finish({error: String(error)});
+    }
+    if (element && conditionHolds(condition, element)) finish({element: element});
+  };
+  const schedule = () => {
+    if (scheduled) return;
+    scheduled = true;
+    // animation frames are throttled in hidden windows
+    document.hidden ? setTimeout(check, 16) : requestAnimationFrame(check);
+  };
+  observer = new MutationObserver(schedule);
+  observer.observe(document, {
+    subtree: true, childList: true, attributes: true, characterData: true
+  });
+  EVENTS.forEach((type) => document.addEventListener(type, schedule, true));
+  poll = setInterval(schedule, 250);
+  timer = setTimeout(() => finish({timeout: true}), timeout);
+  check();
+});
+"""
+)
+
+OBSERVER_WAIT_SCRIPT = (
+    """
+const done = arguments[arguments.length - 1];
+if (typeof MutationObserver === "undefined") {
+  done({unsupported: true});
+  return;
+}
+"""
+    + WAIT_FOR_FUNCTION
+    + """
+waitFor(...Array.prototype.slice.call(arguments, 0, 5)).then(done);
+"""
+)
+
+# selenium sends these locators as css selectors as well
+CSS_LOCATORS = {
+    By.ID: '[id="{}"]',
+    By.NAME: '[name="{}"]',
+    By.CLASS_NAME: ".{}",
+    By.TAG_NAME: "{}",
+    By.CSS_SELECTOR: "{}",
+}
+
+
+def script_locator(locator: Tuple[str, str]) -> Tuple[str, str]:
+    """The locator as understood by the in-page ``findElement``: css selector,
+    xpath or link text."""
+    using, value = locator
+    if using in CSS_LOCATORS:
+        return By.CSS_SELECTOR, CSS_LOCATORS[using].format(value)
+    return using, value
+
+
+class PollingWaitEngine:
+    """Waits with ``WebDriverWait`` polling, one or more round trips every
+    500ms.
+
+    :param wait: The wait of the test.
+    """
+
+    def __init__(self, wait: WebDriverWait):
+        self.wait = wait
+        self.timeout: float = wait._timeout
+
+    def until(self, target: Target, condition: str) -> WebElement:
+        """Wait until the element of ``target`` is ``present``, ``visible`` or
+        ``clickable`` and return it."""
+        return self.wait.until(self._expected_condition(target, condition))
+
+    @staticmethod
+    def _expected_condition(target: Target, condition: str):
+        if isinstance(target, WebElement):
+            return {
+                "present": lambda driver: target,
+                "visible": expected_conditions.visibility_of(target),
+                "clickable": expected_conditions.element_to_be_clickable(target),
+            }[condition]
+        return {
+            "present": expected_conditions.presence_of_element_located(target),
+            "visible": expected_conditions.visibility_of_element_located(target),
+            "clickable": expected_conditions.element_to_be_clickable(target),
+        }[condition]
+
+
+class ObserverWaitEngine(PollingWaitEngine):
+    """Waits inside the page, a whole wait costs a single round trip.
+
+    One async script installs a ``MutationObserver`` and resolves as soon as
+    the condition holds, instead of polling the driver. A navigation
+    unloading the page during the wait re-installs the observer on the new
+    page. Browsers without ``MutationObserver`` fall back to polling.
+
+    :param driver: Driver of the test.
+    :param wait: The wait of the test, for its timeout and the fallback.
+    :param timeout: Seconds to wait, as the timeout of ``wait``.
+    :param max_script_wait: Seconds a single script waits, below the
+        driver's script timeout (30 seconds by default).
+    """
+
+    def __init__(
+        self,
+        driver: Union[Chrome, Firefox, Edge],
+        wait: WebDriverWait,
+        timeout: float,
+        max_script_wait: float = 25,
+    ):
+        super().__init__(wait)
+        self.driver = driver
+        self.timeout = timeout
+        self.max_script_wait = max_script_wait
+        self.supported = True
+
+    def until(self, target: Target, condition: str) -> WebElement:
+        if not self.supported:
+            return super().until(target, condition)
+        element, (using, value) = None, (None, None)
+        if isinstance(target, WebElement):
+            element = target
+        else:
+            using, value = script_locator(target)
+        deadline = time.monotonic() + self.timeout
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                result = self.driver.execute_async_script(
+                    OBSERVER_WAIT_SCRIPT,
+                    using,
+                    value,
+                    condition,
+                    int(min(remaining, self.max_script_wait) * 1000),
+                    element,
+                )
+            except JavascriptException as e:
+                # the page navigated away while waiting, wait on the new one
+                if "unload" in str(e).lower():
+                    continue
+                self.supported = False
+                return super().until(target, condition)
+            if result.get("unsupported"):
+                self.supported = False
+                return super().until(target, condition)
+            if result.get("stale"):
+                raise StaleElementReferenceException(f"{target} is no longer attached")
+            if result.get("error"):
+                raise InvalidSelectorException(result["error"])
+            if "element" in result:
+                return result["element"]
+        raise TimeoutException(
+            f"{target} was not {condition} within {self.timeout} seconds"
+        )
+
+
+def create_wait_engine(
+    name: str, driver: Union[Chrome, Firefox, Edge], wait: WebDriverWait, timeout: float
+) -> PollingWaitEngine:
+    if name == "observer":
+        return ObserverWaitEngine(driver, wait, timeout)
+    return PollingWaitEngine(wait)
@@ -1,5 +1,6 @@
-from typing import List, Union
+from typing import Union
 
+from selenium.common.exceptions import JavascriptException
 from selenium.webdriver import Chrome, Edge, Firefox
 from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.webelement import WebElement
@@ -7,21 +8,50 @@ from selenium.webdriver.support import expected_conditions
 from selenium.webdriver.support.abstract_event_listener import AbstractEventListener
 from selenium.webdriver.support.wait import WebDriverWait
 
+from utilities.wait_engine import ELEMENT_FUNCTIONS, script_locator
+
+# borders the displayed elements of the locator, the whole find is decorated in one
+# round trip
+HIGHLIGHT_SCRIPT = (
+    ELEMENT_FUNCTIONS
+    + """
+const [using, value, border] = arguments;
+const elements = findElements(using, value).filter(isVisible);
+elements.forEach((element) => { element.style.border = border; });
+return elements.length;
+"""
+)
+
 
 class DriverEventListener(AbstractEventListener):
+    """Decorates the driver: borders the displayed elements of every find and
+    waits for elements to be clickable before clicking them.
+
+    :param highlight: Border the found elements, pointless where nobody
+        watches the browser (headless or remote).
+    """
+
+    def __init__(self, highlight: bool = True):
+        self.highlight = highlight
+        # a listener decorates a single driver, its wait is created once
+        self._wait = None
+
     def after_find(
         self, by: By, value: str, driver: Union[Chrome, Firefox, Edge]
     ) -> None:
-        webelements: List[WebElement] = driver.find_elements(by=by, value=value)
-        for element in webelements:
-            if element.is_displayed():
-                driver.execute_script(
-                    "arguments[0].setAttribute('style', 'border: 2px solid red;');",
-                    element,
-                )
+        if not self.highlight:
+            return
+        try:
+            driver.execute_script(
+                HIGHLIGHT_SCRIPT, *script_locator((by, value)), "2px solid red"
+            )
+        except JavascriptException:
+            # an invalid locator already failed the find itself
+            pass
 
     def before_click(
         self, element: WebElement, driver: Union[Chrome, Firefox, Edge]
     ) -> None:
-        wait = WebDriverWait(driver, 10)
-        wait.until(expected_conditions.element_to_be_clickable(element))
+        if self._wait is None:
+            self._wait = WebDriverWait(driver, 10)
+        self._wait.until(expected_conditions.element_to_be_clickable(element))